@@ -0,0 +1,23 @@
+from typing import TYPE_CHECKING
+from utils.lazy_import import lazy_exports
+
+if TYPE_CHECKING:
+    from .base_agent import BaseAgent
+    from .memory import ConversationMemory
+    from .recorder import TrajectoryWriter
+    from .sessions import SessionManager
+    from .tools import Tool, ToolExecutor
+
+__all__ = ['BaseAgent', 'ConversationMemory', 'SessionManager', 'Tool', 'ToolExecutor', 'TrajectoryWriter']
+
+__getattr__, __dir__ = lazy_exports(
+    __name__,
+    {
+        'BaseAgent': '.base_agent',
+        'ConversationMemory': '.memory',
+        'SessionManager': '.sessions',
+        'Tool': '.tools',
+        'ToolExecutor': '.tools',
+        'TrajectoryWriter': '.recorder',
+    },
+)
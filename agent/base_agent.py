@@ -6,7 +6,6 @@
 - 并发调用接口
 """
 
-import json
 import openai
 import yaml
 import asyncio
@@ -15,10 +14,32 @@ import sys
 
 sys.path.append(os.getcwd())
 from datetime import datetime
+from agent.memory import ConversationMemory
+from agent.recorder import TrajectoryWriter
+from agent.tools import ToolExecutor
+from utils.llm_client import RateLimiter
 from utils.logger_config import get_logger
 from typing import List, Dict, Optional, Any
 
 
+def create_client(config_data: Dict) -> openai.AsyncOpenAI:
+    """
+    按 agent 配置创建客户端，多个 agent 可以共享同一个实例（连接池）
+
+    Args:
+        config_data (Dict): agent 配置
+
+    Returns:
+        openai.AsyncOpenAI: 客户端
+    """
+    return openai.AsyncOpenAI(
+        api_key=config_data.get("api_key", ""),
+        base_url=config_data.get("base_url", ""),
+        timeout=config_data.get("time_out", 600),
+        max_retries=3,
+    )
+
+
 class BaseAgent:
     """Design for base agent, supporting simple memory, tools and reasoning enhancement."""
 
@@ -26,15 +47,33 @@ class BaseAgent:
         self,
         experiment_name: str = None,
         config_path: str = "./config/agent_config.yaml",
+        config_data: Optional[Dict] = None,
+        client: Optional[openai.AsyncOpenAI] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        record_writer: Optional[TrajectoryWriter] = None,
+        tools: Optional[ToolExecutor] = None,
     ):
+        """
+        Args:
+            experiment_name (str): 实验（会话）名称，默认为带时间戳的名称
+            config_path (str): 配置文件路径
+            config_data (Dict): 已加载的配置，提供时不再读取 config_path
+            client (openai.AsyncOpenAI): 共享的客户端（连接池），默认新建
+            rate_limiter (RateLimiter): 共享的速率限制器，默认不限速
+            record_writer (TrajectoryWriter): 共享的轨迹写入器，默认每个 agent 按配置中的 recorder 字段
+                创建自己的写入器
+            tools (ToolExecutor): 可供模型调用的工具，默认不使用工具
+        """
         self.logger = get_logger(name="base-agent", log_file="agent.log")
         self.config_path = config_path
-        if not os.path.exists(self.config_path):
-            self.logger.error("Error, the config path does not exist.")
-            raise FileNotFoundError
+        if config_data is None:
+            if not os.path.exists(self.config_path):
+                self.logger.error("Error, the config path does not exist.")
+                raise FileNotFoundError
 
-        with open(self.config_path, "r", encoding="utf-8") as file:
-            self.config_data: Dict = yaml.safe_load(file)
+            with open(self.config_path, "r", encoding="utf-8") as file:
+                config_data = yaml.safe_load(file)
+        self.config_data: Dict = config_data
 
         self.api_key = self.config_data.get("api_key", "")
         self.base_url = self.config_data.get("base_url", "")
@@ -49,37 +88,100 @@ class BaseAgent:
         self.record_file_path = os.path.join(
             self.record_path, f"{self.model_name}_{self.experiment_name}.json"
         )
-        os.makedirs(self.record_path, exist_ok=True)
-
-        self.client = openai.AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url,
-            timeout=self.timeout,
-            max_retries=3,
+        # 共享写入器时用会话名区分不同会话的记录
+        self._shared_writer = record_writer is not None
+        self.record_writer = (
+            record_writer
+            if record_writer is not None
+            else TrajectoryWriter(self.record_file_path, **(self.config_data.get("recorder") or {}))
         )
 
+        self.client = client if client is not None else create_client(self.config_data)
+        self.rate_limiter = rate_limiter
+        self.tools = tools
+
         # initialize memory
         self.initialize_memory()
 
     def initialize_memory(self, system_prompt: str = "You are a helpful assistant"):
+        """
+        初始化对话记忆，token 预算和压缩方式来自配置中的 memory 字段：
+
+        memory:
+          max_tokens: 16000 # 不设置时不限制
+          strategy: sliding_window # sliding_window / summary
+          low_watermark: 0.6
+
+        Args:
+            system_prompt (str): 系统提示词
+        """
         # todo optimize agentic system prompt
-        self.memory = []
-        self.memory.append(
-            {
-                "role": "system",
-                "content": system_prompt,
-            }
+        memory_config: Dict = self.config_data.get("memory") or {}
+        strategy = memory_config.get("strategy", "sliding_window")
+        self.memory = ConversationMemory(
+            system_prompt=system_prompt,
+            max_tokens=memory_config.get("max_tokens"),
+            strategy=strategy,
+            low_watermark=memory_config.get("low_watermark", 0.6),
+            summarizer=self.summarize if strategy == "summary" else None,
         )
-        pass
 
     def append_context(self, input_message: str, role: str = "user"):
-        pass
+        """
+        向对话记忆追加一条消息
+
+        Args:
+            input_message (str): 消息内容
+            role (str): 消息角色
+        """
+        self.memory.append(input_message, role=role)
+
+    async def summarize(self, messages: List[Dict]) -> str:
+        """
+        把被压缩的历史消息总结为一段摘要（summary 记忆模式使用）
+
+        Args:
+            messages (List[Dict]): 被压缩的消息
+
+        Returns:
+            str: 摘要文本
+        """
+        transcript = "\n".join(
+            f"{message['role']}: {message['content']}" for message in messages
+        )
+        response = await self._create_response(
+            transcript,
+            {
+                "model": self.model_name,
+                "instructions": (
+                    "Summarize the conversation below for your own future reference. "
+                    "Keep facts, decisions, open questions and user preferences; be concise."
+                ),
+                "timeout": self.timeout,
+            },
+        )
+        return response.output_text
+
+    async def _create_response(self, input_messages: Any, request: Dict):
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+        return await self.client.responses.create(input=input_messages, **request)
 
     def update_records(self, record: Dict):
-        write_content = json.dumps(record, ensure_ascii=False)
-        with open(self.record_file_path, "a", encoding="utf-8") as file:
-            file.write(write_content + "\n")
-        self.logger.info(f"Writing records {write_content[:30]} to {self.record_file_path} successfully.")
+        """
+        写入一条响应记录（批量写入，见 TrajectoryWriter）
+
+        Args:
+            record (Dict): 响应的 model_dump()
+        """
+        if self._shared_writer:
+            record = {"session_id": self.experiment_name, **record}
+        self.record_writer.write(record)
+
+    def close(self):
+        """写入剩余记录（共享的写入器由创建者关闭）"""
+        if not self._shared_writer:
+            self.record_writer.close()
 
     async def chat(
         self,
@@ -88,24 +190,64 @@ class BaseAgent:
         append_message: bool = True,
         timeout: float = 3600,
         reasoning_efforts: str = "medium",
+        max_tool_rounds: int = 8,
     ):
+        """
+        进行一轮对话，配置了工具时会执行模型给出的工具调用，直到模型给出最终回复
+
+        Args:
+            input_message (str): 输入消息
+            role (str): 输入消息的角色
+            append_message (bool): 是否带上并更新对话记忆
+            timeout (float): 单次请求的超时秒数
+            reasoning_efforts (str): 推理强度
+            max_tool_rounds (int): 一轮对话中最多执行的工具调用轮数
+
+        Returns:
+            str: 模型的最终回复
+        """
         if append_message:
-            input_messages: list = self.memory.copy()
-            input_messages.append({"role": role, "content": input_message})
+            self.append_context(input_message, role)
+            await self.memory.compact()
+            input_messages: list = self.memory.to_input()
         else:
             input_messages: list = [{"role": role, "content": input_message}]
 
-        response = await self.client.responses.create(
-            model=self.model_name,
-            reasoning={"effort": reasoning_efforts, "summary": "auto"},
-            input=input_messages,
-            timeout=timeout,
-        )
+        request = {
+            "model": self.model_name,
+            "reasoning": {"effort": reasoning_efforts, "summary": "auto"},
+            "timeout": timeout,
+        }
+        if self.tools is not None and self.tools.tools:
+            request["tools"] = self.tools.schemas()
+        response = await self._create_response(input_messages, request)
+
+        # 工具调用循环：同一轮的多个调用并发执行，结果连同模型输出一起作为下一次请求的输入
+        tool_rounds = 0
+        while self.tools is not None and tool_rounds < max_tool_rounds:
+            calls = [item for item in response.output if item.type == "function_call"]
+            if not calls:
+                break
+            tool_rounds += 1
+            self.update_records(response.model_dump())
+            outputs = await self.tools.execute_all(calls)
+            input_messages = (
+                input_messages
+                + [item.model_dump(exclude_none=True) for item in response.output]
+                + outputs
+            )
+            response = await self._create_response(input_messages, request)
 
         # update memory
+        output_text = response.output_text
+        if append_message:
+            self.append_context(output_text, role="assistant")
+            self.logger.debug(
+                "Memory: %s messages, %s tokens", len(self.memory), self.memory.total_tokens
+            )
         response_json = response.model_dump()
         self.update_records(response_json)
-
+        return output_text
 
 
 async def main():
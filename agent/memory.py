@@ -0,0 +1,232 @@
+"""
+按 token 预算管理的多轮对话记忆
+"""
+
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from utils.logger_config import get_logger
+from utils.tokenizer import count_tokens
+
+MEMORY_STRATEGIES = ("sliding_window", "summary")
+# 每条消息在角色、分隔符等格式上的额外 token 开销（估算值）
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+_tokenizer_warned = False
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    不依赖分词器的 token 数估算：UTF-8 字节数的三分之一（向上取整），
+    英文约每 3 个字符、中文约每个字符计 1 个 token，比 cl100k_base 略偏多
+
+    Args:
+        text (str): 输入文本
+
+    Returns:
+        int: 估算的 token 数
+    """
+    return -(-len(text.encode("utf-8")) // 3)
+
+
+def count_message_tokens(content: Any) -> int:
+    """
+    估算一条消息的 token 数（cl100k_base 编码，tiktoken 在第一次调用时加载），
+    分词器无法加载（未安装 tiktoken 或离线时无法下载编码）时退回到 estimate_tokens
+
+    Args:
+        content (Any): 消息内容，非字符串内容按 JSON 计算
+
+    Returns:
+        int: token 数，包含每条消息的固定开销
+    """
+    global _tokenizer_warned
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False, default=str)
+    try:
+        return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+    except Exception as e:
+        if not _tokenizer_warned:
+            _tokenizer_warned = True
+            get_logger(name="base-agent", log_file="agent.log").warning(
+                f"Tokenizer unavailable ({e!r}), memory budget uses a byte-based token estimate"
+            )
+        return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+class ConversationMemory:
+    """
+    多轮对话记忆
+
+    每条消息在加入时计算一次 token 数（未设置 max_tokens 时不计算），之后只维护总数。超出 max_tokens 时按轮次
+    （从 user 消息开始）丢弃最早的对话，直到降到 max_tokens * low_watermark：
+
+    - sliding_window：直接丢弃
+    - summary：用 summarizer 把丢弃的部分（连同已有摘要）压缩为一条摘要消息
+
+    system prompt 和摘要始终位于最前面，并且只在压缩时变化；一次压缩到低水位线
+    而不是每轮丢一条消息，可以让前缀在多轮之间保持逐字节一致，从而命中 prompt cache。
+    """
+
+    def __init__(
+        self,
+        system_prompt: str = "You are a helpful assistant",
+        max_tokens: Optional[int] = None,
+        strategy: str = "sliding_window",
+        low_watermark: float = 0.6,
+        summarizer: Optional[Callable[[List[Dict[str, Any]]], Awaitable[str]]] = None,
+        count_tokens: Callable[[Any], int] = count_message_tokens,
+    ):
+        """
+        Args:
+            system_prompt (str): 系统提示词
+            max_tokens (Optional[int]): 记忆的 token 预算，None 表示不限制
+            strategy (str): 超出预算时的压缩方式，sliding_window 或 summary
+            low_watermark (float): 压缩后保留的 token 数占预算的比例
+            summarizer (Callable): summary 模式下的异步摘要函数，输入为被丢弃的消息，返回摘要文本
+            count_tokens (Callable): 计算单条消息内容 token 数的函数
+        """
+        if strategy not in MEMORY_STRATEGIES:
+            raise ValueError(f"Unknown memory strategy {strategy!r}, expected one of {MEMORY_STRATEGIES}")
+        if strategy == "summary" and summarizer is None:
+            raise ValueError("The summary strategy requires a summarizer")
+        self.max_tokens = max_tokens
+        self.strategy = strategy
+        self.low_watermark = low_watermark
+        self.summarizer = summarizer
+        self.count_tokens = count_tokens
+        self.logger = get_logger(name="base-agent", log_file="agent.log")
+        self.reset(system_prompt)
+
+    def reset(self, system_prompt: str) -> None:
+        """清空记忆，只保留新的系统提示词"""
+        self._messages: List[Dict[str, Any]] = []
+        self._tokens: List[int] = []
+        self._total_tokens = 0
+        # 前缀（系统提示词与摘要）的消息数，压缩不会丢弃这部分
+        self._prefix_size = 0
+        self._summary: Optional[str] = None
+        self.append(system_prompt, role="system")
+        self._prefix_size = 1
+
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """当前记忆中的消息（只读）"""
+        return self._messages
+
+    @property
+    def total_tokens(self) -> int:
+        """当前记忆的 token 数（估算值），未设置 max_tokens 时不计算，始终为 0"""
+        return self._total_tokens
+
+    def _count(self, content: Any) -> int:
+        # 不限制预算时 token 数用不到，也就不需要加载分词器
+        return self.count_tokens(content) if self.max_tokens is not None else 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def append(self, content: Any, role: str = "user") -> int:
+        """
+        追加一条消息
+
+        Args:
+            content (Any): 消息内容
+            role (str): 消息角色
+
+        Returns:
+            int: 该消息的 token 数（未设置 max_tokens 时为 0）
+        """
+        tokens = self._count(content)
+        self._messages.append({"role": role, "content": content})
+        self._tokens.append(tokens)
+        self._total_tokens += tokens
+        return tokens
+
+    def over_budget(self, reserve_tokens: int = 0) -> bool:
+        """加上 reserve_tokens 后是否超出预算"""
+        return self.max_tokens is not None and self._total_tokens + reserve_tokens > self.max_tokens
+
+    def to_input(self) -> List[Dict[str, Any]]:
+        """返回可以直接作为请求输入的消息列表（浅拷贝）"""
+        return list(self._messages)
+
+    def _droppable_end(self, target: int) -> int:
+        """计算需要丢弃到哪一条消息（不含），只在 user 消息处切分，并保留最后一轮"""
+        last_turn = len(self._messages)
+        for index in range(len(self._messages) - 1, self._prefix_size - 1, -1):
+            if self._messages[index]["role"] == "user":
+                last_turn = index
+                break
+
+        end = self._prefix_size
+        remaining = self._total_tokens
+        index = self._prefix_size
+        while index < last_turn and remaining > target:
+            remaining -= self._tokens[index]
+            index += 1
+            # 一轮对话（user 消息及其后的回复）整体丢弃
+            while index < last_turn and self._messages[index]["role"] != "user":
+                remaining -= self._tokens[index]
+                index += 1
+            end = index
+        return end
+
+    def _drop(self, end: int) -> List[Dict[str, Any]]:
+        dropped = self._messages[self._prefix_size:end]
+        self._total_tokens -= sum(self._tokens[self._prefix_size:end])
+        del self._messages[self._prefix_size:end]
+        del self._tokens[self._prefix_size:end]
+        return dropped
+
+    def _set_summary(self, summary: str) -> None:
+        content = SUMMARY_PREFIX + summary
+        tokens = self._count(content)
+        message = {"role": "system", "content": content}
+        if self._summary is None:
+            self._messages.insert(self._prefix_size, message)
+            self._tokens.insert(self._prefix_size, tokens)
+            self._prefix_size += 1
+        else:
+            self._total_tokens -= self._tokens[self._prefix_size - 1]
+            self._messages[self._prefix_size - 1] = message
+            self._tokens[self._prefix_size - 1] = tokens
+        self._total_tokens += tokens
+        self._summary = summary
+
+    async def compact(self, reserve_tokens: int = 0) -> int:
+        """
+        超出预算时压缩记忆，未超出时不做任何修改
+
+        Args:
+            reserve_tokens (int): 为即将加入的内容预留的 token 数
+
+        Returns:
+            int: 丢弃的消息数
+        """
+        if not self.over_budget(reserve_tokens):
+            return 0
+        target = int(self.max_tokens * self.low_watermark) - reserve_tokens
+        end = self._droppable_end(target)
+        if end <= self._prefix_size:
+            self.logger.warning(
+                f"Memory uses {self._total_tokens} tokens over the budget of {self.max_tokens}, "
+                "but only the prefix and the latest turn are left"
+            )
+            return 0
+
+        dropped = self._drop(end)
+        if self.strategy == "summary":
+            to_summarize = list(dropped)
+            if self._summary is not None:
+                to_summarize.insert(0, {"role": "system", "content": SUMMARY_PREFIX + self._summary})
+            try:
+                self._set_summary(await self.summarizer(to_summarize))
+            except Exception as e:
+                # 摘要失败时退化为滑动窗口，已丢弃的消息不再恢复
+                self.logger.error(f"Failed to summarize memory, falling back to sliding window: {e}")
+        self.logger.info(
+            f"Compacted memory: dropped {len(dropped)} messages, {self._total_tokens} tokens left"
+        )
+        return len(dropped)
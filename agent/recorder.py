@@ -0,0 +1,179 @@
+"""
+缓冲、轮转、可压缩的 agent 轨迹记录
+"""
+
+import atexit
+import os
+import threading
+import time
+import weakref
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from utils.compression import COMPRESSION_SUFFIXES, compressed_path, frame_compressor
+from utils.logger_config import get_logger
+from utils.serialization import dumps_bytes
+
+# 尚未关闭的写入器，进程退出时由同一个 atexit 回调写入剩余记录；
+# 弱引用不会让写入器在不再使用后一直留在内存中（被回收时由 __del__ 写入剩余记录）
+_open_writers: "weakref.WeakSet[TrajectoryWriter]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_writers() -> None:
+    for writer in list(_open_writers):
+        writer.close()
+
+
+class TrajectoryWriter:
+    """
+    轨迹（agent 响应记录）的 JSONL 写入器
+
+    - 文件句柄在第一次写入时打开并一直保持
+    - 记录先序列化到内存缓冲区，累计 batch_size 条或距上次写入超过 flush_interval 秒时批量写入
+    - 文件超过 max_bytes 或打开超过 rotate_interval 秒后轮转，旧文件重命名为 "<name>.<时间戳>.jsonl"
+    - compression="zstd" 时每批写入一个独立的 zstd 帧，崩溃时最多丢失一批记录
+
+    写入是线程安全的，可以由大量并发会话共享；进程正常退出或写入器被回收时会写入剩余记录。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_bytes: Optional[int] = None,
+        rotate_interval: Optional[float] = None,
+        compression: Optional[str] = None,
+        level: int = 3,
+    ):
+        """
+        Args:
+            path (str): 轨迹文件路径（JSONL），压缩时自动加上 .zst 后缀
+            batch_size (int): 每批写入的记录数
+            flush_interval (float): 缓冲区中的记录最多等待的秒数（在下一次写入时检查）
+            max_bytes (Optional[int]): 单个文件的大小上限，None 表示不按大小轮转
+            rotate_interval (Optional[float]): 单个文件的写入时长上限（秒），None 表示不按时间轮转
+            compression (Optional[str]): 压缩格式，None 或 "zstd"
+            level (int): 压缩级别
+        """
+        self.path = compressed_path(path, compression)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.compression = compression
+        self.logger = get_logger(name="base-agent", log_file="agent.log")
+        self.written = 0
+        self.rotations = 0
+        self._compress = frame_compressor(compression, level)
+        self._lock = threading.Lock()
+        self._buffer: List[bytes] = []
+        self._file = None
+        self._opened_at = 0.0
+        self._last_flush = time.monotonic()
+        self._closed = False
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        _open_writers.add(self)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """
+        写入一条记录（缓冲）
+
+        Args:
+            record (Dict[str, Any]): 单条记录
+        """
+        line = dumps_bytes(record) + b"\n"
+        with self._lock:
+            if self._closed:
+                # 关闭后继续写入时重新打开
+                self._closed = False
+                _open_writers.add(self)
+            self._buffer.append(line)
+            if (
+                len(self._buffer) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self._flush()
+
+    def flush(self) -> None:
+        """把缓冲区中的记录写入文件"""
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        data = self._compress(b"".join(self._buffer))
+        if self._should_rotate(len(data)):
+            self._rotate()
+        if self._file is None:
+            self._file = open(self.path, "ab")
+            self._opened_at = time.monotonic()
+        self._file.write(data)
+        self._file.flush()
+        self.written += len(self._buffer)
+        self._buffer.clear()
+
+    def _should_rotate(self, incoming: int) -> bool:
+        size = self._file.tell() if self._file is not None else _size(self.path)
+        if size == 0:
+            return False
+        if self.max_bytes is not None and size + incoming > self.max_bytes:
+            return True
+        return (
+            self.rotate_interval is not None
+            and self._file is not None
+            and time.monotonic() - self._opened_at >= self.rotate_interval
+        )
+
+    def _rotated_path(self) -> str:
+        suffix = COMPRESSION_SUFFIXES.get(self.compression, "")
+        root, ext = os.path.splitext(self.path[: len(self.path) - len(suffix)])
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        candidate = f"{root}.{stamp}{ext}{suffix}"
+        index = 1
+        while os.path.exists(candidate):
+            candidate = f"{root}.{stamp}-{index}{ext}{suffix}"
+            index += 1
+        return candidate
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        rotated = self._rotated_path()
+        os.replace(self.path, rotated)
+        self.rotations += 1
+        self.logger.info(f"Rotated {self.path} to {rotated}")
+
+    def close(self) -> None:
+        """写入剩余记录并关闭文件，可以重复调用"""
+        with self._lock:
+            if self._closed:
+                return
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._closed = True
+        _open_writers.discard(self)
+        if self.written:
+            self.logger.info(f"Wrote {self.written} records to {self.path}")
+
+    def __del__(self) -> None:
+        if not getattr(self, "_closed", True):
+            self.close()
+
+    def __enter__(self) -> "TrajectoryWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
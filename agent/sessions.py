@@ -0,0 +1,253 @@
+"""
+并发运行大量相互独立的 agent 会话（模拟用户、轨迹合成等）
+"""
+
+import asyncio
+import os
+import time
+import openai
+import yaml
+from collections.abc import Sized
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from agent.base_agent import BaseAgent, create_client
+from agent.recorder import TrajectoryWriter
+from agent.tools import ToolExecutor
+from utils.llm_client import RateLimiter
+from utils.logger_config import get_logger
+from utils.progress import ProgressReporter, ProgressTracker, create_reporters
+from utils.streaming import aenumerate, bounded_as_completed, ensure_no_running_loop
+
+SessionFunction = Callable[[BaseAgent, Any], Awaitable[Any]]
+
+
+async def run_script(agent: BaseAgent, session: Any) -> List[str]:
+    """
+    默认的会话函数：依次发送脚本中的用户消息
+
+    Args:
+        agent (BaseAgent): 本会话的 agent
+        session (Any): 单条用户消息、消息列表，或包含 messages 字段的字典
+
+    Returns:
+        List[str]: 每一轮的回复
+    """
+    if isinstance(session, dict):
+        session = session["messages"]
+    if isinstance(session, str):
+        session = [session]
+    return [await agent.chat(message) for message in session]
+
+
+class SessionManager:
+    """
+    多会话运行器
+
+    每个会话有独立的 BaseAgent 和记忆，所有会话共享同一个客户端（连接池）、
+    速率限制器和批量写入的轨迹文件，同时运行的会话数不超过 concurrency_limit。
+    """
+
+    def __init__(
+        self,
+        config_path: str = "./config/agent_config.yaml",
+        experiment_name: Optional[str] = None,
+        system_prompt: str = "You are a helpful assistant",
+        rate_limit: Optional[int] = None,
+        batch_size: int = 100,
+        tools: Optional[ToolExecutor] = None,
+    ):
+        """
+        Args:
+            config_path (str): agent 配置文件路径，只读取一次
+            experiment_name (str): 实验名称，决定轨迹文件名，默认为带时间戳的名称
+            system_prompt (str): 每个会话的系统提示词
+            rate_limit (int): 所有会话共享的每分钟请求数上限，默认使用配置中的 rate_limit，
+                都未设置时不限速
+            batch_size (int): 轨迹文件每批写入的记录数，配置中的 recorder 字段优先
+            tools (ToolExecutor): 所有会话共享的工具（线程池、进程池和幂等工具的结果缓存）
+        """
+        self.logger = get_logger(name="base-agent", log_file="agent.log")
+        with open(config_path, "r", encoding="utf-8") as file:
+            self.config_data: Dict = yaml.safe_load(file)
+        self.config_path = config_path
+        self.system_prompt = system_prompt
+        self.tools = tools
+        self.experiment_name = experiment_name or f"sessions_{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+        # 客户端和速率限制器绑定事件循环，每次运行时创建，同一个管理器的多次运行互不影响
+        self.rate_limit = rate_limit or self.config_data.get("rate_limit")
+
+        self.record_path = self.config_data.get("record_path", "./logs/agent_records")
+        model_name = self.config_data.get("model_name", "gpt-4o-mini")
+        self.trajectory_path = os.path.join(
+            self.record_path, f"{model_name}_{self.experiment_name}.jsonl"
+        )
+        recorder_config = dict(self.config_data.get("recorder") or {})
+        recorder_config.setdefault("batch_size", batch_size)
+        self.writer = TrajectoryWriter(self.trajectory_path, **recorder_config)
+
+        self.completed = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def create_session(
+        self,
+        session_id: str,
+        client: Optional[openai.AsyncOpenAI] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> BaseAgent:
+        """
+        创建一个共享客户端、速率限制器和轨迹写入器的 agent
+
+        Args:
+            session_id (str): 会话名称，写入每条轨迹记录的 session_id 字段
+            client (openai.AsyncOpenAI): 本次运行共享的客户端，默认由 agent 新建
+            rate_limiter (RateLimiter): 本次运行共享的速率限制器，默认不限速
+
+        Returns:
+            BaseAgent: 新会话的 agent
+        """
+        agent = BaseAgent(
+            experiment_name=session_id,
+            config_path=self.config_path,
+            config_data=self.config_data,
+            client=client,
+            rate_limiter=rate_limiter,
+            record_writer=self.writer,
+            tools=self.tools,
+        )
+        agent.initialize_memory(self.system_prompt)
+        return agent
+
+    async def astream(
+        self,
+        sessions,
+        session_function: SessionFunction = run_script,
+        concurrency_limit: int = 32,
+        tracker: Optional[ProgressTracker] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        异步生成器接口：并发运行会话，按完成顺序产出每个会话的结果
+
+        Args:
+            sessions: 会话数据，list / 可迭代对象 / 异步迭代器；字典中的 session_id 字段作为会话名称，
+                否则使用 "session_<序号>"
+            session_function (Callable): 运行单个会话的协程函数，输入为 agent 和会话数据，默认为 run_script
+            concurrency_limit (int): 同时运行的会话数
+            tracker (ProgressTracker): 进度指标收集器，设置后并发上限可以在运行中调整
+
+        Yields:
+            Dict[str, Any]: {"session_id", "output" 或 "error", "elapsed"}
+        """
+        client = create_client(self.config_data)
+        rate_limiter = RateLimiter(self.rate_limit) if self.rate_limit else None
+        limit = concurrency_limit
+        if tracker is not None:
+            if rate_limiter is not None:
+                tracker.attach_rate_limiter(rate_limiter)
+            limit = lambda: tracker.concurrency_limit
+
+        async def worker(item):
+            i, session = item
+            session_id = (
+                session.get("session_id") if isinstance(session, dict) else None
+            ) or f"session_{i}"
+            if tracker is not None:
+                tracker.task_started()
+            started = time.perf_counter()
+            result: Dict[str, Any] = {"session_id": session_id}
+            try:
+                agent = self.create_session(session_id, client, rate_limiter)
+                result["output"] = await session_function(agent, session)
+            except Exception as e:
+                self.logger.error(f"Error running session {session_id}: {e}")
+                result["error"] = str(e)
+            result["elapsed"] = time.perf_counter() - started
+            return result
+
+        started = time.perf_counter()
+        results = bounded_as_completed(aenumerate(sessions), worker, limit)
+        try:
+            async for result in results:
+                self.completed += 1
+                if "error" in result:
+                    self.errors += 1
+                if tracker is not None:
+                    tracker.task_finished(result)
+                yield result
+        finally:
+            await results.aclose()
+            await client.close()
+            self.elapsed += time.perf_counter() - started
+            self.writer.flush()
+
+    async def arun(
+        self,
+        sessions,
+        session_function: SessionFunction = run_script,
+        concurrency_limit: int = 32,
+        progress: Optional[List[ProgressReporter]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        异步运行全部会话并收集结果，其余参数与 astream 相同
+
+        Args:
+            progress (List[ProgressReporter]): 进度输出方式，默认按配置中的 progress 字段创建
+
+        Returns:
+            List[Dict[str, Any]]: 按完成顺序排列的会话结果
+        """
+        tracker = ProgressTracker(
+            total=len(sessions) if isinstance(sessions, Sized) else None,
+            reporters=(
+                progress
+                if progress is not None
+                else create_reporters(self.config_data.get("progress"), self.record_path)
+            ),
+            concurrency_limit=concurrency_limit,
+        )
+        tracker.start()
+        try:
+            return [
+                result
+                async for result in self.astream(
+                    sessions,
+                    session_function=session_function,
+                    concurrency_limit=concurrency_limit,
+                    tracker=tracker,
+                )
+            ]
+        finally:
+            tracker.close()
+
+    def run(self, sessions, **kwargs) -> List[Dict[str, Any]]:
+        """
+        运行全部会话（arun 的同步封装，不能在已有事件循环中调用），参数与 arun 相同
+        """
+        ensure_no_running_loop("manager.arun")
+        results = asyncio.run(self.arun(sessions, **kwargs))
+        stats = self.stats()
+        self.logger.info(
+            f"Sessions completed: {stats['sessions']} sessions, {stats['errors']} errors, "
+            f"{stats['sessions_per_second']:.2f} sessions/sec"
+        )
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        会话吞吐统计
+
+        Returns:
+            Dict[str, Any]: sessions、errors、elapsed（秒）、sessions_per_second 和轨迹记录数
+        """
+        return {
+            "sessions": self.completed,
+            "errors": self.errors,
+            "elapsed": self.elapsed,
+            "sessions_per_second": self.completed / self.elapsed if self.elapsed else 0.0,
+            "records": self.writer.written,
+        }
+
+    def close(self) -> None:
+        """写入剩余的轨迹记录"""
+        self.writer.close()
@@ -0,0 +1,250 @@
+"""
+agent 的工具注册与并行执行
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from utils.logger_config import get_logger
+
+TOOL_MODES = ("async", "thread", "process")
+
+
+class Tool:
+    """
+    单个工具的定义
+
+    mode 决定工具的执行方式：
+        - async：协程函数，直接在事件循环中运行
+        - thread：阻塞函数（I/O、调用外部服务），在线程池中运行
+        - process：CPU 密集的函数，在进程池中运行，函数和参数需要可以 pickle
+    """
+
+    def __init__(
+        self,
+        function: Callable[..., Any],
+        name: Optional[str] = None,
+        description: Optional[str] = None,
+        parameters: Optional[Dict[str, Any]] = None,
+        mode: Optional[str] = None,
+        timeout: Optional[float] = None,
+        idempotent: bool = False,
+    ):
+        """
+        Args:
+            function (Callable): 工具函数，模型给出的参数以关键字参数传入
+            name (str): 工具名，默认为函数名
+            description (str): 工具说明，默认为函数的 docstring
+            parameters (Dict): 参数的 JSON Schema，默认为不限制参数的 object
+            mode (str): async / thread / process，默认协程函数为 async，其余为 thread
+            timeout (float): 单次调用的超时秒数，默认使用执行器的 default_timeout
+            idempotent (bool): 是否幂等，幂等工具相同参数的调用结果会被缓存
+        """
+        self.function = function
+        self.name = name or function.__name__
+        self.description = description or inspect.getdoc(function) or ""
+        self.parameters = parameters or {"type": "object", "properties": {}}
+        self.mode = mode or ("async" if inspect.iscoroutinefunction(function) else "thread")
+        if self.mode not in TOOL_MODES:
+            raise ValueError(f"Unknown tool mode {self.mode!r}, expected one of {TOOL_MODES}")
+        self.timeout = timeout
+        self.idempotent = idempotent
+
+    def schema(self) -> Dict[str, Any]:
+        """Responses API 的工具定义"""
+        return {
+            "type": "function",
+            "name": self.name,
+            "description": self.description,
+            "parameters": self.parameters,
+        }
+
+
+def _field(call: Any, name: str) -> Any:
+    return call[name] if isinstance(call, dict) else getattr(call, name)
+
+
+def _format_output(result: Any) -> str:
+    if isinstance(result, str):
+        return result
+    return json.dumps(result, ensure_ascii=False, default=str)
+
+
+class ToolExecutor:
+    """
+    工具执行器
+
+    同一轮中模型给出的多个工具调用并发执行，一轮的耗时取决于最慢的工具而不是所有工具耗时之和。
+    每次调用有超时限制；幂等工具按 (工具名, 参数) 缓存结果，并发的相同调用只执行一次。
+    工具出错或超时时返回错误信息给模型，而不是中断对话。
+    """
+
+    def __init__(
+        self,
+        tools: Optional[List[Tool]] = None,
+        default_timeout: float = 60,
+        max_workers: Optional[int] = None,
+        max_processes: Optional[int] = None,
+        cache_size: int = 1024,
+    ):
+        """
+        Args:
+            tools (List[Tool]): 初始的工具列表
+            default_timeout (float): 工具未指定超时时使用的超时秒数
+            max_workers (int): 线程池大小，默认为 ThreadPoolExecutor 的默认值
+            max_processes (int): 进程池大小，默认为 CPU 核数
+            cache_size (int): 幂等工具结果缓存的最大条数
+        """
+        self.logger = get_logger(name="base-agent", log_file="agent.log")
+        self.tools: Dict[str, Tool] = {}
+        self.default_timeout = default_timeout
+        self.max_workers = max_workers
+        self.max_processes = max_processes
+        self.cache_size = cache_size
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.cache_hits = 0
+        self.timeouts = 0
+        self.errors = 0
+        for tool in tools or []:
+            self.add(tool)
+
+    def add(self, tool: Tool) -> Tool:
+        """注册工具"""
+        self.tools[tool.name] = tool
+        return tool
+
+    def register(self, function: Optional[Callable[..., Any]] = None, **kwargs):
+        """
+        注册函数为工具，可以直接调用或作为装饰器使用，参数与 Tool 相同：
+
+            @executor.register(timeout=5, idempotent=True)
+            async def search(query: str): ...
+        """
+        if function is None:
+            return lambda f: self.register(f, **kwargs)
+        self.add(Tool(function, **kwargs))
+        return function
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """全部工具的定义，作为请求的 tools 参数"""
+        return [tool.schema() for tool in self.tools.values()]
+
+    def _executor(self, mode: str) -> Executor:
+        if mode == "process":
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.max_processes)
+            return self._process_pool
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="agent-tool"
+            )
+        return self._thread_pool
+
+    async def _invoke(self, tool: Tool, arguments: Dict[str, Any]) -> Any:
+        if tool.mode == "async":
+            return await tool.function(**arguments)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor(tool.mode), functools.partial(tool.function, **arguments)
+        )
+
+    async def _run_with_timeout(self, tool: Tool, arguments: Dict[str, Any]) -> Any:
+        timeout = tool.timeout if tool.timeout is not None else self.default_timeout
+        # 线程池和进程池中的任务超时后无法中断，只是不再等待其结果
+        return await asyncio.wait_for(self._invoke(tool, arguments), timeout)
+
+    async def _run_cached(self, tool: Tool, arguments: Dict[str, Any]) -> Any:
+        key = f"{tool.name}:{json.dumps(arguments, ensure_ascii=False, sort_keys=True, default=str)}"
+        if key in self._cache:
+            self.cache_hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        # 相同参数的调用正在执行时等待同一个结果
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.cache_hits += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._run_with_timeout(tool, arguments))
+        self._in_flight[key] = task
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            self._in_flight.pop(key, None)
+        # 出错的调用不会走到这里，因此不会被缓存
+        self._cache[key] = result
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    async def execute(self, call: Any) -> Dict[str, Any]:
+        """
+        执行单个工具调用
+
+        Args:
+            call (Any): 响应中的 function_call 项（对象或字典），包含 name / arguments / call_id
+
+        Returns:
+            Dict[str, Any]: 作为下一次请求输入的 function_call_output 项
+        """
+        name = _field(call, "name")
+        call_id = _field(call, "call_id")
+        self.calls += 1
+        try:
+            tool = self.tools.get(name)
+            if tool is None:
+                raise KeyError(f"unknown tool {name!r}")
+            raw_arguments = _field(call, "arguments")
+            arguments = json.loads(raw_arguments) if raw_arguments else {}
+            if tool.idempotent:
+                result = await self._run_cached(tool, arguments)
+            else:
+                result = await self._run_with_timeout(tool, arguments)
+            output = _format_output(result)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.logger.warning(f"Tool {name} timed out")
+            output = f"Error: tool {name} timed out"
+        except Exception as e:
+            self.errors += 1
+            self.logger.error(f"Error running tool {name}: {e}")
+            output = f"Error: {e}"
+        return {"type": "function_call_output", "call_id": call_id, "output": output}
+
+    async def execute_all(self, calls: List[Any]) -> List[Dict[str, Any]]:
+        """
+        并发执行同一轮中的全部工具调用，结果顺序与 calls 一致
+
+        Args:
+            calls (List[Any]): function_call 项列表
+
+        Returns:
+            List[Dict[str, Any]]: function_call_output 项列表
+        """
+        return list(await asyncio.gather(*(self.execute(call) for call in calls)))
+
+    def stats(self) -> Dict[str, int]:
+        """调用次数、缓存命中、超时和出错次数"""
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+    def close(self) -> None:
+        """关闭线程池和进程池"""
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
@@ -0,0 +1,242 @@
+"""
+本地 OpenAI 兼容的 mock 服务，用于测量工具包自身的开销
+
+- 支持 POST /v1/chat/completions（以及 /chat/completions）
+- 可配置延迟分布：none / constant:MS / uniform:LO:HI / lognormal:MEDIAN:SIGMA
+- 按比例注入 429 Too Many Requests
+- 可配置回复长度，回复内容同时包含 <draft> 和评判标签，生成与评判 pipeline 都可以直接解析
+- 响应中带有 mock_latency_ms 字段，记录服务端注入的延迟
+
+用法：
+    python -m benchmark.mock_server --port 8765 --latency lognormal:200:0.5 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+JUDGE_TAGS = ("accuracy", "relevance", "clarity", "completeness", "overall")
+
+
+def parse_latency_spec(spec: str):
+    """
+    解析延迟分布描述，返回一个采样函数（单位：秒）
+
+    示例：
+        parse_latency_spec("constant:50")       -> 固定 50ms
+        parse_latency_spec("uniform:20:200")    -> 20~200ms 均匀分布
+        parse_latency_spec("lognormal:200:0.5") -> 中位数 200ms、sigma=0.5 的对数正态分布
+    """
+    parts = spec.split(":")
+    kind = parts[0]
+    if kind == "none":
+        return lambda rng: 0.0
+    if kind == "constant":
+        value = float(parts[1]) / 1000
+        return lambda rng: value
+    if kind == "uniform":
+        low, high = float(parts[1]) / 1000, float(parts[2]) / 1000
+        return lambda rng: rng.uniform(low, high)
+    if kind == "lognormal":
+        mu, sigma = math.log(float(parts[1]) / 1000), float(parts[2])
+        return lambda rng: rng.lognormvariate(mu, sigma)
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+class MockOpenAIServer:
+    """
+    基于 asyncio 的 OpenAI 兼容 mock 服务，支持 HTTP/1.1 keep-alive，
+    在后台线程中运行自己的事件循环
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: str = "none",
+        error_rate: float = 0.0,
+        response_chars: int = 800,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            host (str): 监听地址
+            port (int): 监听端口，0 表示随机端口
+            latency (str): 延迟分布描述
+            error_rate (float): 返回 429 的概率
+            response_chars (int): 回复内容中填充文本的字符数
+            seed (int): 随机种子
+        """
+        self.host = host
+        self.port = port
+        self.latency_spec = latency
+        self.sample_latency = parse_latency_spec(latency)
+        self.error_rate = error_rate
+        self.response_chars = response_chars
+        self.rng = random.Random(seed)
+        self.stats: Dict[str, int] = {"requests": 0, "rate_limited": 0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def _build_completion(self, request: Dict, latency: float) -> Dict:
+        n = int(request.get("n") or 1)
+        filler = ("lorem ipsum " * (self.response_chars // 12 + 1))[: self.response_chars]
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in request.get("messages", []))
+        choices = []
+        for index in range(n):
+            score = self.rng.randint(1, 10)
+            judge = "".join(f"<{tag}>{score}</{tag}>" for tag in JUDGE_TAGS)
+            content = f"{judge}<comment>mock</comment><draft>{index} {filler}</draft>"
+            choices.append(
+                {
+                    "index": index,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            )
+        completion_tokens = n * (self.response_chars // 4 + 40)
+        prompt_tokens = prompt_chars // 4 + 1
+        return {
+            "id": f"chatcmpl-mock-{self.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": choices,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": 0},
+            },
+            "mock_latency_ms": latency * 1000,
+        }
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict, bytes]]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        method, path, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+        return method, path, headers, body
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: str, payload: Dict, extra_headers: str = "") -> None:
+        body = json.dumps(payload).encode("utf-8")
+        writer.write(
+            (
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"{extra_headers}"
+                "Connection: keep-alive\r\n\r\n"
+            ).encode("latin-1")
+            + body
+        )
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, _, body = request
+                self.stats["requests"] += 1
+                if method != "POST" or not path.rstrip("/").endswith("/chat/completions"):
+                    self._write_response(writer, "404 Not Found", {"error": {"message": "not found"}})
+                elif self.rng.random() < self.error_rate:
+                    self.stats["rate_limited"] += 1
+                    self._write_response(
+                        writer,
+                        "429 Too Many Requests",
+                        {"error": {"message": "mock rate limit", "type": "rate_limit_error"}},
+                        extra_headers="Retry-After: 0\r\n",
+                    )
+                else:
+                    latency = self.sample_latency(self.rng)
+                    if latency > 0:
+                        await asyncio.sleep(latency)
+                    payload = self._build_completion(json.loads(body or b"{}"), latency)
+                    self._write_response(writer, "200 OK", payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _serve(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._server.close()
+        self._loop.run_until_complete(self._server.wait_closed())
+        self._loop.close()
+
+    def start(self) -> "MockOpenAIServer":
+        """在后台线程中启动服务，返回自身"""
+        self._thread = threading.Thread(target=self._serve, name="mock-openai", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self) -> None:
+        """停止服务"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible mock server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="none")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--response-chars", type=int, default=800)
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        response_chars=args.response_chars,
+    ).start()
+    print(f"Mock OpenAI server listening on {server.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
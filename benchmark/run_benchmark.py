@@ -0,0 +1,709 @@
+"""
+工具包自身开销的基准测试
+
+通过本地 mock OpenAI 服务驱动 DataGenerationPipeline、JudgementPipeline 以及统计模块，
+报告 rows/sec、每行额外开销（p50/p99，扣除服务端注入的延迟）、峰值内存和每行 CPU 时间，
+结果保存为可对比的 JSON 文件。
+
+用法：
+    python -m benchmark.run_benchmark run --sizes 1k,100k --latency lognormal:200:0.5
+    python -m benchmark.run_benchmark compare benchmark/results/old.json benchmark/results/new.json
+    python -m benchmark.run_benchmark imports
+    python -m benchmark.run_benchmark serialization output/initial_test/result.jsonl
+    python -m benchmark.run_benchmark dedup --sizes 100k,1m
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Any, Dict, List
+
+sys.path.append(os.getcwd())
+
+SCENARIOS = ("generation", "judgement", "generation_stats", "judgement_stats")
+
+# 当前行由 mock 服务注入的延迟（秒），在 run_single_task 内部累加
+_ROW_LATENCY: contextvars.ContextVar = contextvars.ContextVar("row_latency", default=None)
+
+JUDGEMENT_NUMERIC_FIELDS = [
+    "model_based_judgement.accuracy",
+    "model_based_judgement.relevance",
+    "model_based_judgement.clarity",
+    "model_based_judgement.completeness",
+    "model_based_judgement.overall",
+    "rule_based_judgement.answer-token-count",
+    "rule_based_judgement.query-token-count",
+]
+JUDGEMENT_DISTRIBUTION_FIELDS = ["model_based_judgement.overall"]
+
+# 冷启动导入耗时预算（毫秒）：统计报告、CLI 和新启动的 worker 进程只应导入自己用到的依赖
+IMPORT_BUDGETS_MS = {
+    "judgement.stats": 150,
+    "data_generation.stats": 150,
+    "utils.result_index": 150,
+    "judgement": 100,
+    "data_generation": 100,
+    "workflow": 100,
+    "judgement.pipeline": 300,
+    "data_generation.pipeline": 300,
+}
+# 这些依赖只应在真正用到时才导入
+LAZY_DEPENDENCIES = ("openai", "tiktoken", "yaml", "tqdm", "dotenv", "numpy")
+
+
+def parse_size(text: str) -> int:
+    """解析 1k / 100k / 1m 这样的规模描述"""
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """最近秩法计算分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值常驻内存（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def write_config(workdir: str, base_url: str, prompt_suffix: str = "") -> str:
+    """写入指向 mock 服务的临时配置，prompt_suffix 选择生成或评判的提示词模板"""
+    import yaml
+
+    config = {
+        "model": {
+            "provider": "openai",
+            "api_key": "mock-key",
+            "base_url": base_url,
+            "model_name": "mock-model",
+            "rate_limit": 10_000_000,
+            "max_tokens": 512,
+            "temperature": 0.7,
+        },
+        "prompts": {
+            "system_prompt_path": os.path.abspath(f"prompt/system_prompts/default.prompt{prompt_suffix}.txt"),
+            "user_prompt_path": os.path.abspath(f"prompt/user_prompts/default.prompt{prompt_suffix}.txt"),
+        },
+        "output_data": {
+            "output_dir": os.path.join(workdir, "output"),
+            "experiment_name": "benchmark",
+            "need_time_stamp": True,
+        },
+    }
+    config_path = os.path.join(workdir, "benchmark_config.yaml")
+    with open(config_path, "w", encoding="utf-8") as file:
+        yaml.safe_dump(config, file)
+    return config_path
+
+
+def generation_input(i: int) -> Dict[str, Any]:
+    return {
+        "user_prompt_kwargs": {"topic": f"topic-{i}", "word_count": "100字"},
+        "system_prompt_kwargs": {"tone": "专业"},
+    }
+
+
+def judgement_input(i: int) -> Dict[str, Any]:
+    answer = f"answer {i} " + "detail " * 40
+    return {
+        "query": f"question {i}",
+        "answer": answer,
+        "GT": f"reference {i}",
+        "meta_info": {"model_name": f"model-{i % 2}"},
+        "system_prompt_kwargs": {"role": "evaluator"},
+        "user_prompt_kwargs": {
+            "question": f"question {i}",
+            "reference_answer": f"reference {i}",
+            "model_response": answer,
+        },
+    }
+
+
+def generation_pool(rows: int) -> List[Dict[str, Any]]:
+    return [generation_input(i) for i in range(rows)]
+
+
+def judgement_pool(rows: int) -> List[Dict[str, Any]]:
+    return [judgement_input(i) for i in range(rows)]
+
+
+def _timed_pipeline(pipeline_cls):
+    """为 pipeline 增加每行耗时记录（扣除 mock 服务注入的延迟）"""
+
+    class TimedPipeline(pipeline_cls):
+        async def run_single_task(self, i, input_data, *args, **kwargs):
+            injected = []
+            token = _ROW_LATENCY.set(injected)
+            start = time.perf_counter()
+            try:
+                return await super().run_single_task(i, input_data, *args, **kwargs)
+            finally:
+                self.row_overheads.append(time.perf_counter() - start - sum(injected))
+                _ROW_LATENCY.reset(token)
+
+    TimedPipeline.row_overheads = []
+    return TimedPipeline
+
+
+def _timed_client(config: Dict[str, Any]):
+    """记录 mock 服务注入延迟的客户端"""
+    from utils.llm_client import OpenAIClient
+
+    class TimedClient(OpenAIClient):
+        async def chat_completion(self, *args, **kwargs):
+            completion = await super().chat_completion(*args, **kwargs)
+            injected = _ROW_LATENCY.get()
+            if completion and injected is not None:
+                injected.append((completion[1] or {}).get("mock_latency_ms", 0.0) / 1000)
+            return completion
+
+    return TimedClient(config)
+
+
+def _run_pipeline_scenario(scenario: str, rows: int, base_url: str, concurrency: int, workdir: str) -> Dict[str, Any]:
+    os.makedirs("logs", exist_ok=True)
+    config_path = write_config(
+        workdir, base_url, "" if scenario == "generation" else "_evaluation"
+    )
+
+    if scenario == "generation":
+        from data_generation import DataGenerationPipeline
+
+        pipeline = _timed_pipeline(DataGenerationPipeline)(config_path=config_path)
+        pool = generation_pool(rows)
+        run_kwargs = {"extract_function": pipeline.make_default_extractor(pattern_name="draft")}
+    else:
+        from judgement import JudgementPipeline
+
+        pipeline = _timed_pipeline(JudgementPipeline)(
+            job_name="benchmark", experiment_name="judgement", config_path=config_path
+        )
+        pool = judgement_pool(rows)
+        run_kwargs = {"model_judgement_function": pipeline.make_judgement_extractor()}
+
+    client = _timed_client(pipeline.config_for_client)
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    results = asyncio.run(
+        pipeline.arun(pool, concurrency_limit=concurrency, client=client, **run_kwargs)
+    )
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+    overheads = [value * 1000 for value in pipeline.row_overheads]
+    return {
+        "wall_seconds": wall,
+        "rows_per_sec": rows / wall if wall else 0.0,
+        "overhead_ms": {"p50": percentile(overheads, 50), "p99": percentile(overheads, 99)},
+        "cpu_ms_per_row": cpu * 1000 / rows,
+        "peak_rss_mb": peak_rss_mb(),
+        "errors": sum(1 for result in results if "error" in result),
+    }
+
+
+def write_synthetic_results(path: str, scenario: str, rows: int, seed: int = 0) -> None:
+    """生成与真实结果格式一致的合成结果文件"""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as file:
+        for i in range(rows):
+            if scenario == "judgement_stats":
+                row = {
+                    "input": judgement_input(i),
+                    "model_based_judgement": {
+                        tag: rng.randint(1, 10)
+                        for tag in ("accuracy", "relevance", "clarity", "completeness", "overall")
+                    },
+                    "rule_based_judgement": {
+                        "answer-token-count": rng.randint(10, 500),
+                        "query-token-count": rng.randint(5, 50),
+                    },
+                    "timestamp": datetime.now().isoformat(),
+                }
+            else:
+                response = "lorem ipsum " * rng.randint(10, 100)
+                row = {
+                    "input": generation_input(i),
+                    "response": response,
+                    "naive_response": {
+                        "choices": [{"message": {"role": "assistant", "content": response}}],
+                        "usage": {"prompt_tokens": 100, "completion_tokens": len(response) // 4},
+                    },
+                    "timestamp": datetime.now().isoformat(),
+                }
+            file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def _run_stats_scenario(scenario: str, rows: int, workdir: str) -> Dict[str, Any]:
+    os.makedirs("logs", exist_ok=True)
+    path = os.path.join(workdir, f"{scenario}.jsonl")
+    write_synthetic_results(path, scenario, rows)
+
+    if scenario == "judgement_stats":
+        from judgement import JudgementStats
+
+        stats = JudgementStats()
+        numeric_fields, distribution_fields = JUDGEMENT_NUMERIC_FIELDS, JUDGEMENT_DISTRIBUTION_FIELDS
+    else:
+        from data_generation import DataGenerationStats
+
+        stats = DataGenerationStats()
+        numeric_fields, distribution_fields = ["response.length"], ["response.length"]
+
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    stats.generate_report(path, numeric_fields, distribution_fields)
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+    return {
+        "wall_seconds": wall,
+        "rows_per_sec": rows / wall if wall else 0.0,
+        "cpu_ms_per_row": cpu * 1000 / rows,
+        "peak_rss_mb": peak_rss_mb(),
+        "file_mb": os.path.getsize(path) / 1024 / 1024,
+    }
+
+
+def run_scenario(scenario: str, rows: int, base_url: str, concurrency: int) -> Dict[str, Any]:
+    """在独立子进程中执行的单个场景（保证峰值内存和 CPU 统计互不干扰）"""
+    with tempfile.TemporaryDirectory(prefix="agent-benchmark-") as workdir:
+        if scenario in ("generation", "judgement"):
+            return _run_pipeline_scenario(scenario, rows, base_url, concurrency, workdir)
+        return _run_stats_scenario(scenario, rows, workdir)
+
+
+def measure_import(module: str, repeat: int = 5) -> Dict[str, Any]:
+    """
+    在新的解释器进程中测量导入单个模块的耗时，取多次运行的中位数
+
+    Args:
+        module (str): 模块名
+        repeat (int): 重复次数
+
+    Returns:
+        Dict[str, Any]: import_ms（模块导入耗时）、process_ms（含解释器启动的进程总耗时）、
+            eager_dependencies（导入后已加载的重依赖）、budget_ms 和 within_budget
+    """
+    code = (
+        "import json, sys, time; sys.path.insert(0, sys.argv[1]); start = time.perf_counter(); "
+        f"import {module}; elapsed = (time.perf_counter() - start) * 1000; "
+        f"print(json.dumps({{'ms': elapsed, 'loaded': sorted({{name.split('.')[0] for name in sys.modules}} & set({list(LAZY_DEPENDENCIES)!r}))}}))"
+    )
+    import_times, process_times = [], []
+    loaded: List[str] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.check_output([sys.executable, "-c", code, os.getcwd()], text=True)
+        process_times.append((time.perf_counter() - start) * 1000)
+        result = json.loads(output.strip().splitlines()[-1])
+        import_times.append(result["ms"])
+        loaded = result["loaded"]
+    budget = IMPORT_BUDGETS_MS.get(module)
+    import_ms = percentile(import_times, 50)
+    return {
+        "import_ms": import_ms,
+        "process_ms": percentile(process_times, 50),
+        "eager_dependencies": loaded,
+        "budget_ms": budget,
+        "within_budget": budget is None or import_ms <= budget,
+    }
+
+
+def measure_imports(repeat: int = 5) -> Dict[str, Dict[str, Any]]:
+    """测量 IMPORT_BUDGETS_MS 中全部模块的冷启动导入耗时"""
+    return {module: measure_import(module, repeat) for module in IMPORT_BUDGETS_MS}
+
+
+def print_imports(imports: Dict[str, Dict[str, Any]]) -> int:
+    """打印导入耗时，返回超出预算的模块数"""
+    over_budget = 0
+    print(f"{'module':<28}{'import ms':>12}{'process ms':>12}{'budget ms':>12}  eager dependencies")
+    for module, result in imports.items():
+        flag = "" if result["within_budget"] else " !"
+        over_budget += bool(flag)
+        print(
+            f"{module:<28}{result['import_ms']:>12.1f}{result['process_ms']:>12.1f}"
+            f"{result['budget_ms'] or '-':>12}  {', '.join(result['eager_dependencies']) or '-'}{flag}"
+        )
+    return over_budget
+
+
+def command_imports(args) -> None:
+    over_budget = print_imports(measure_imports(args.repeat))
+    if over_budget:
+        print(f"{over_budget} module(s) exceeded the import budget")
+        sys.exit(1)
+    print("All imports within budget")
+
+
+def _best_of(repeat: int, function) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure_serialization(lines: List[bytes], repeat: int = 3, kind: str = None) -> List[Dict[str, Any]]:
+    """
+    测量各个已安装 JSON 后端对同一批结果行的编码/解码吞吐，每项取多次运行中最快的一次
+
+    Args:
+        lines (List[bytes]): 结果文件中的行（不含换行符）
+        repeat (int): 重复次数
+        kind (str): generation / judgement，安装 msgspec 时额外测量按已知格式的类型化解码
+
+    Returns:
+        List[Dict[str, Any]]: 每个后端的 encode/decode rows_per_sec 和 MB/s
+    """
+    from utils.serialization import JSON_BACKENDS, create_serializer, typed_decoder
+
+    rows = [json.loads(line) for line in lines]
+    megabytes = sum(len(line) for line in lines) / 1024 / 1024
+    results = []
+    for backend in JSON_BACKENDS:
+        try:
+            serializer = create_serializer(backend)
+        except ImportError:
+            continue
+        encode, decode = serializer.encode, serializer.decode
+        encode_seconds = _best_of(repeat, lambda: [encode(row) for row in rows])
+        decode_seconds = _best_of(repeat, lambda: [decode(line) for line in lines])
+        results.append({
+            "backend": backend,
+            "encode_rows_per_sec": len(rows) / encode_seconds,
+            "encode_mb_per_sec": megabytes / encode_seconds,
+            "decode_rows_per_sec": len(lines) / decode_seconds,
+            "decode_mb_per_sec": megabytes / decode_seconds,
+        })
+    if kind is not None:
+        try:
+            typed_decode = typed_decoder(kind)
+        except ImportError:
+            typed_decode = None
+        if typed_decode is not None:
+            decode_seconds = _best_of(repeat, lambda: [typed_decode(line) for line in lines])
+            results.append({
+                "backend": f"msgspec typed ({kind})",
+                "encode_rows_per_sec": None,
+                "encode_mb_per_sec": None,
+                "decode_rows_per_sec": len(lines) / decode_seconds,
+                "decode_mb_per_sec": megabytes / decode_seconds,
+            })
+    return results
+
+
+def _guess_kind(row: Dict[str, Any]) -> str:
+    return "judgement" if "model_based_judgement" in row else "generation"
+
+
+def command_serialization(args) -> None:
+    from utils.compression import iter_lines
+
+    sources = []
+    if args.files:
+        for path in args.files:
+            lines = []
+            for line in iter_lines(path):
+                line = line.strip()
+                if line:
+                    lines.append(line.encode("utf-8"))
+                if len(lines) >= args.rows:
+                    break
+            sources.append((path, lines))
+    else:
+        with tempfile.TemporaryDirectory(prefix="agent-benchmark-") as workdir:
+            for scenario in ("generation_stats", "judgement_stats"):
+                path = os.path.join(workdir, f"{scenario}.jsonl")
+                write_synthetic_results(path, scenario, args.rows)
+                with open(path, "rb") as file:
+                    sources.append((f"synthetic {scenario}", [line.rstrip(b"\n") for line in file]))
+
+    report = {}
+    for name, lines in sources:
+        if not lines:
+            print(f"{name}: no rows")
+            continue
+        average_bytes = sum(len(line) for line in lines) / len(lines)
+        print(f"{name}: {len(lines)} rows, {average_bytes:.0f} bytes/row")
+        results = measure_serialization(lines, args.repeat, _guess_kind(json.loads(lines[0])))
+        print(f"{'backend':<28}{'encode rows/s':>16}{'encode MB/s':>14}{'decode rows/s':>16}{'decode MB/s':>14}")
+        for result in results:
+            cells = [
+                f"{result[key]:.0f}" if result[key] is not None else "-"
+                for key in ("encode_rows_per_sec", "encode_mb_per_sec", "decode_rows_per_sec", "decode_mb_per_sec")
+            ]
+            print(f"{result['backend']:<28}{cells[0]:>16}{cells[1]:>14}{cells[2]:>16}{cells[3]:>14}")
+        report[name] = results
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"Serialization results saved to {args.output}")
+
+
+_WORDS = [
+    "model", "data", "answer", "question", "reason", "step", "result", "value", "system", "token",
+    "prompt", "sample", "score", "metric", "batch", "cache", "graph", "vector", "index", "query",
+]
+
+
+def synthetic_texts(rows: int, duplicate_rate: float, edit_rate: float = 0.05, seed: int = 0):
+    """
+    生成带近重复的合成文本：每条以 duplicate_rate 的概率改写一条已有文本（按 edit_rate 替换单词），
+    否则生成新文本
+
+    Yields:
+        Tuple[str, bool]: (文本, 是否为改写出的近重复)
+    """
+    rng = random.Random(seed)
+    pool: List[List[str]] = []
+    for _ in range(rows):
+        if pool and rng.random() < duplicate_rate:
+            words = list(rng.choice(pool))
+            for position in range(len(words)):
+                if rng.random() < edit_rate:
+                    words[position] = rng.choice(_WORDS)
+            yield " ".join(words), True
+        else:
+            words = [rng.choice(_WORDS) + str(rng.randint(0, 999)) for _ in range(rng.randint(40, 160))]
+            if len(pool) < 10_000:
+                pool.append(words)
+            else:
+                pool[rng.randrange(len(pool))] = words
+            yield " ".join(words), False
+
+
+def measure_dedup(rows: int, duplicate_rate: float = 0.2, threshold: float = 0.8, num_perm: int = 64) -> Dict[str, Any]:
+    """
+    测量近重复过滤器的吞吐、内存和检出效果（以改写出的近重复为正样本）
+
+    Args:
+        rows (int): 行数
+        duplicate_rate (float): 近重复所占比例
+        threshold (float): Jaccard 阈值
+        num_perm (int): 签名长度
+
+    Returns:
+        Dict[str, Any]: rows_per_sec、precision、recall、index_mb、peak_rss_mb
+    """
+    from data_generation.dedup import NearDuplicateFilter
+
+    dedup = NearDuplicateFilter(threshold=threshold, num_perm=num_perm, capacity=rows)
+    true_positive = false_positive = positives = 0
+    # 只计入过滤器本身的耗时，不含合成文本的生成
+    wall = 0.0
+    for i, (text, is_duplicate) in enumerate(synthetic_texts(rows, duplicate_rate)):
+        result = {"input": {"i": i}, "response": text}
+        start = time.perf_counter()
+        flagged = dedup.check(result) is not None
+        wall += time.perf_counter() - start
+        positives += is_duplicate
+        true_positive += flagged and is_duplicate
+        false_positive += flagged and not is_duplicate
+    flagged = true_positive + false_positive
+    return {
+        "rows": rows,
+        "rows_per_sec": rows / wall if wall else 0.0,
+        "precision": true_positive / flagged if flagged else 1.0,
+        "recall": true_positive / positives if positives else 1.0,
+        "bands": dedup.index.bands,
+        "index_mb": dedup.index.memory_bytes / 1024 / 1024,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def command_dedup(args) -> None:
+    results = []
+    for rows in [parse_size(size) for size in args.sizes.split(",")]:
+        print(f"Running dedup with {rows} rows ...", flush=True)
+        # 每个规模在独立子进程中运行，保证峰值内存互不干扰
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            result = executor.submit(
+                measure_dedup, rows, args.duplicate_rate, args.threshold, args.num_perm
+            ).result()
+        results.append(result)
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f"Dedup results saved to {args.output}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def command_run(args) -> None:
+    from benchmark.mock_server import MockOpenAIServer
+    from utils.serialization import get_serializer
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {sorted(unknown)}")
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "json_backend": get_serializer().name,
+        },
+        "config": {
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "response_chars": args.response_chars,
+            "concurrency": args.concurrency,
+        },
+        "results": [],
+    }
+
+    print("Measuring cold import times ...", flush=True)
+    report["imports"] = measure_imports()
+    print_imports(report["imports"])
+
+    with MockOpenAIServer(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        response_chars=args.response_chars,
+    ) as server:
+        for scenario in scenarios:
+            for rows in sizes:
+                print(f"Running {scenario} with {rows} rows ...", flush=True)
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                    metrics = executor.submit(
+                        run_scenario, scenario, rows, server.base_url, args.concurrency
+                    ).result()
+                report["results"].append({"scenario": scenario, "rows": rows, **metrics})
+                print(json.dumps(report["results"][-1], ensure_ascii=False), flush=True)
+        report["meta"]["mock_server"] = dict(server.stats)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Benchmark results saved to {args.output}")
+
+
+def command_compare(args) -> None:
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(args.candidate, "r", encoding="utf-8") as file:
+        candidate = json.load(file)
+
+    baseline_rows = {(r["scenario"], r["rows"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"{'scenario':<18}{'rows':>10}{'rows/sec':>24}{'cpu ms/row':>24}{'peak MB':>22}")
+    for result in candidate["results"]:
+        key = (result["scenario"], result["rows"])
+        if key not in baseline_rows:
+            continue
+        old = baseline_rows[key]
+        # rows/sec 越大越好，其余指标越小越好
+        checks = [
+            ("rows_per_sec", old["rows_per_sec"], result["rows_per_sec"], True),
+            ("cpu_ms_per_row", old["cpu_ms_per_row"], result["cpu_ms_per_row"], False),
+            ("peak_rss_mb", old["peak_rss_mb"], result["peak_rss_mb"], False),
+        ]
+        cells = []
+        for _, old_value, new_value, higher_is_better in checks:
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            worse = -change if higher_is_better else change
+            flag = " !" if worse > args.threshold else ""
+            regressions += bool(flag)
+            cells.append(f"{new_value:.2f} ({change:+.1%}){flag}")
+        print(f"{key[0]:<18}{key[1]:>10}" + "".join(f"{cell:>24}" for cell in cells))
+
+    baseline_imports = baseline.get("imports", {})
+    for module, result in candidate.get("imports", {}).items():
+        if module not in baseline_imports:
+            continue
+        old_value = baseline_imports[module]["import_ms"]
+        change = (result["import_ms"] - old_value) / old_value if old_value else 0.0
+        flag = " !" if change > args.threshold or not result["within_budget"] else ""
+        regressions += bool(flag)
+        print(f"{'import ' + module:<28}{result['import_ms']:>14.1f} ms ({change:+.1%}){flag}")
+
+    if regressions:
+        print(f"{regressions} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print("No regressions found")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the toolkit's own overhead")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run benchmarks against a local mock server")
+    run_parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    run_parser.add_argument("--sizes", default="1k", help="comma separated sizes, e.g. 1k,100k,1m")
+    run_parser.add_argument("--latency", default="none", help="none / constant:MS / uniform:LO:HI / lognormal:MEDIAN:SIGMA")
+    run_parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    run_parser.add_argument("--response-chars", type=int, default=800)
+    run_parser.add_argument("--concurrency", type=int, default=64)
+    run_parser.add_argument(
+        "--output",
+        default=os.path.join("benchmark", "results", f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"),
+    )
+    run_parser.set_defaults(func=command_run)
+
+    compare_parser = subparsers.add_parser("compare", help="compare two benchmark result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="relative change treated as regression")
+    compare_parser.set_defaults(func=command_compare)
+
+    imports_parser = subparsers.add_parser("imports", help="check cold import times against the budgets")
+    imports_parser.add_argument("--repeat", type=int, default=5)
+    imports_parser.set_defaults(func=command_imports)
+
+    serialization_parser = subparsers.add_parser(
+        "serialization", help="compare JSON backends on result files"
+    )
+    serialization_parser.add_argument(
+        "files", nargs="*", help="result files (.jsonl / .gz / .zst), synthetic rows when omitted"
+    )
+    serialization_parser.add_argument("--rows", type=int, default=20_000, help="rows read from each file")
+    serialization_parser.add_argument("--repeat", type=int, default=3)
+    serialization_parser.add_argument("--output", default=None)
+    serialization_parser.set_defaults(func=command_serialization)
+
+    dedup_parser = subparsers.add_parser("dedup", help="measure near-duplicate detection throughput")
+    dedup_parser.add_argument("--sizes", default="100k", help="comma separated sizes, e.g. 100k,1m")
+    dedup_parser.add_argument("--duplicate-rate", type=float, default=0.2)
+    dedup_parser.add_argument("--threshold", type=float, default=0.8)
+    dedup_parser.add_argument("--num-perm", type=int, default=64)
+    dedup_parser.add_argument("--output", default=None)
+    dedup_parser.set_defaults(func=command_dedup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
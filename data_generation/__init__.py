@@ -1,4 +1,18 @@
-from .pipeline import DataGenerationPipeline
-from .stats import DataGenerationStats
+from typing import TYPE_CHECKING
+from utils.lazy_import import lazy_exports
 
-__all__ = ['DataGenerationPipeline', 'DataGenerationStats']
\ No newline at end of file
+if TYPE_CHECKING:
+    from .dedup import NearDuplicateFilter
+    from .pipeline import DataGenerationPipeline
+    from .stats import DataGenerationStats
+
+__all__ = ['DataGenerationPipeline', 'DataGenerationStats', 'NearDuplicateFilter']
+
+__getattr__, __dir__ = lazy_exports(
+    __name__,
+    {
+        'DataGenerationPipeline': '.pipeline',
+        'DataGenerationStats': '.stats',
+        'NearDuplicateFilter': '.dedup',
+    },
+)
@@ -0,0 +1,448 @@
+"""
+生成数据的流式近重复检测（MinHash + LSH）
+"""
+
+import json
+import random
+import re
+import zlib
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+from utils.field_access import compile_path
+from utils.logger_config import get_logger
+from utils.records import hash_input
+
+logger = get_logger(name="dedup", log_file="dedup.log")
+
+DEDUP_MODES = ("flag", "drop")
+_MASK64 = (1 << 64) - 1
+# n-gram 多项式哈希的基数和混合常数
+_BASE = 1_000_003
+_MIX = 0x9E3779B97F4A7C15
+_WHITESPACE = re.compile(r"\s+")
+
+
+class MinHasher:
+    """
+    文本的 MinHash 签名
+
+    文本归一化（小写、合并空白）后取字符 n-gram，每个 n-gram 用多项式哈希映射为 32 位整数，
+    再用 num_perm 个 multiply-shift 哈希函数 ((a * x + b) mod 2^64) >> 32 模拟随机排列，
+    签名为每个哈希函数下的最小值。两个签名中相等位置的比例是 n-gram 集合 Jaccard 相似度的无偏估计。
+    安装 numpy 时向量化计算，否则退回到纯 Python，两者结果相同；结果只取决于 seed，跨进程稳定。
+    """
+
+    def __init__(self, num_perm: int = 64, ngram: int = 5, seed: int = 1):
+        """
+        Args:
+            num_perm (int): 哈希函数个数（签名长度），越大估计越准，计算和内存开销也越大
+            ngram (int): 字符 n-gram 的长度
+            seed (int): 哈希函数的随机种子
+        """
+        self.num_perm = num_perm
+        self.ngram = ngram
+        rng = random.Random(seed)
+        self._a = [rng.getrandbits(64) | 1 for _ in range(num_perm)]
+        self._b = [rng.getrandbits(64) for _ in range(num_perm)]
+        try:
+            import numpy
+        except ImportError:
+            self._numpy = None
+        else:
+            self._numpy = numpy
+            self._a_array = numpy.array(self._a, dtype=numpy.uint64)
+            self._b_array = numpy.array(self._b, dtype=numpy.uint64)
+
+    def shingles(self, text: str):
+        """
+        归一化文本的字符 n-gram 哈希（去重后），短于 ngram 的文本整体作为一个 n-gram
+
+        n-gram 的哈希为码点的多项式哈希（mod 2^64）经过混合后的高 32 位，
+        安装 numpy 时对整段文本向量化计算，返回 numpy 数组（可能含重复值，不影响最小值），否则返回 list
+        """
+        codes = _WHITESPACE.sub(" ", text.lower()).strip().encode("utf-32-le")
+        width = min(self.ngram, max(len(codes) // 4, 1))
+        if self._numpy is not None:
+            np = self._numpy
+            points = np.frombuffer(codes, dtype=np.uint32).astype(np.uint64)
+            count = max(len(points) - width + 1, 1)
+            hashed = np.zeros(count, dtype=np.uint64)
+            for offset in range(min(width, len(points))):
+                hashed = hashed * np.uint64(_BASE) + points[offset:offset + count]
+            hashed ^= hashed >> np.uint64(29)
+            hashed *= np.uint64(_MIX)
+            return hashed >> np.uint64(32)
+        points = [int.from_bytes(codes[i:i + 4], "little") for i in range(0, len(codes), 4)]
+        values = set()
+        for start in range(max(len(points) - width + 1, 1)):
+            hashed = 0
+            for point in points[start:start + width]:
+                hashed = (hashed * _BASE + point) & _MASK64
+            hashed ^= hashed >> 29
+            values.add(((hashed * _MIX) & _MASK64) >> 32)
+        return list(values)
+
+    def signature(self, text: str) -> array:
+        """
+        计算 MinHash 签名
+
+        Args:
+            text (str): 文本
+
+        Returns:
+            array: 长度为 num_perm 的 32 位无符号整数数组
+        """
+        values = self.shingles(text)
+        if self._numpy is not None:
+            np = self._numpy
+            # uint64 乘法按 2^64 取模回绕，正是 multiply-shift 需要的运算；
+            # 右移是单调的，先取最小值再右移与先右移再取最小值相同
+            hashed = np.multiply.outer(values, self._a_array)
+            hashed += self._b_array
+            minimum = hashed.min(axis=0) >> np.uint64(32)
+            return array("I", minimum.astype(np.uint32).tobytes())
+        return array(
+            "I",
+            (
+                min((a * x + b) & _MASK64 for x in values) >> 32
+                for a, b in zip(self._a, self._b)
+            ),
+        )
+
+
+def choose_bands(num_perm: int, threshold: float) -> int:
+    """
+    选择 LSH 的分段数 b（每段 r = num_perm / b 行）
+
+    两个签名至少有一段完全相同的概率在 Jaccard 约为 (1/b)^(1/r) 处陡增，
+    取该值不超过 threshold 的最大者，使相似度达到阈值的文本大概率成为候选（召回优先），
+    多出的候选再按签名相似度过滤。
+
+    Args:
+        num_perm (int): 签名长度
+        threshold (float): Jaccard 阈值
+
+    Returns:
+        int: 分段数
+    """
+    options = [bands for bands in range(1, num_perm + 1) if num_perm % bands == 0]
+    below = [bands for bands in options if (1 / bands) ** (bands / num_perm) <= threshold]
+    if not below:
+        return options[-1]
+    return min(below, key=lambda bands: threshold - (1 / bands) ** (bands / num_perm))
+
+
+class LSHIndex:
+    """
+    容量有上限的 MinHash LSH 索引
+
+    内存随索引的签名数按需翻倍增长，最多到 capacity，适合数百万行的流式数据：
+        - 签名保存在最多 capacity 个槽位的环形缓冲区中，写满后覆盖最早的签名（同时从各段删除）
+        - 每一段是一个线性探测的开放寻址哈希表，大小为已分配槽位数的 2 倍（负载不超过 0.5），
+          每个表项记录段哈希和槽位，段哈希相同的签名各占一个表项，桶冲突不会挤掉已有签名
+    因此只有被环形缓冲区覆盖的旧样本会被漏掉，召回率只受 LSH 本身的概率影响；
+    段哈希相同的假候选按签名相似度过滤，不会误报。
+    总内存最多约为 capacity * (num_perm * 4 + bands * 16 + 16) 字节。
+    """
+
+    # 第一次分配的槽位数，之后按需翻倍
+    INITIAL_SLOTS = 1024
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        capacity: int = 1_000_000,
+        bands: Optional[int] = None,
+    ):
+        """
+        Args:
+            threshold (float): 判定为近重复的 Jaccard 相似度阈值
+            num_perm (int): 签名长度
+            capacity (int): 最多保留的签名数
+            bands (Optional[int]): LSH 分段数，默认按 threshold 自动选择
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.capacity = capacity
+        self.bands = bands or choose_bands(num_perm, threshold)
+        if num_perm % self.bands:
+            raise ValueError(f"num_perm {num_perm} is not divisible by bands {self.bands}")
+        self.rows = num_perm // self.bands
+        self._signatures = array("I")
+        self._keys = bytearray()
+        self._hashes = array("I")
+        self._slots = array("I")
+        self.allocated = 0
+        self.table_size = 0
+        self.size = 0
+        self.inserted = 0
+        self._allocate(min(capacity, self.INITIAL_SLOTS))
+
+    @property
+    def memory_bytes(self) -> int:
+        """索引占用的内存（字节）"""
+        return (
+            self._signatures.itemsize * len(self._signatures)
+            + len(self._keys)
+            + self._hashes.itemsize * len(self._hashes)
+            + self._slots.itemsize * len(self._slots)
+        )
+
+    def _allocate(self, slots: int) -> None:
+        """把槽位扩充到 slots 个，并按新的表大小重建各段的哈希表"""
+        self._signatures.extend(array("I", bytes(4 * (slots - self.allocated) * self.num_perm)))
+        self._keys.extend(bytes(16 * (slots - self.allocated)))
+        self.allocated = slots
+        old_hashes, old_slots, old_size = self._hashes, self._slots, self.table_size
+        self.table_size = 2 * slots
+        # 表项的槽位保存为 slot + 1，0 表示空
+        self._hashes = array("I", bytes(4 * self.bands * self.table_size))
+        self._slots = array("I", bytes(4 * self.bands * self.table_size))
+        for band in range(self.bands):
+            for position in range(band * old_size, (band + 1) * old_size):
+                if old_slots[position]:
+                    self._put(band, old_hashes[position], old_slots[position])
+
+    def _band_hashes(self, signature: array) -> List[int]:
+        raw = signature.tobytes()
+        width = 4 * self.rows
+        return [zlib.crc32(raw[band * width:(band + 1) * width], band) for band in range(self.bands)]
+
+    def _put(self, band: int, value: int, entry: int) -> None:
+        base = band * self.table_size
+        position = value % self.table_size
+        while self._slots[base + position]:
+            position = (position + 1) % self.table_size
+        self._hashes[base + position] = value
+        self._slots[base + position] = entry
+
+    def _remove(self, band: int, value: int, entry: int) -> None:
+        """删除表项并把后面探测链上的表项前移（backward shift），不留墓碑"""
+        base = band * self.table_size
+        size = self.table_size
+        hole = value % size
+        while self._slots[base + hole] and self._slots[base + hole] != entry:
+            hole = (hole + 1) % size
+        if not self._slots[base + hole]:
+            return
+        position = hole
+        while True:
+            position = (position + 1) % size
+            if not self._slots[base + position]:
+                break
+            # 表项的初始桶不在 (hole, position] 之间时，才可以移到空出来的位置
+            home = self._hashes[base + position] % size
+            if (position - home) % size >= (position - hole) % size:
+                self._hashes[base + hole] = self._hashes[base + position]
+                self._slots[base + hole] = self._slots[base + position]
+                hole = position
+        self._slots[base + hole] = 0
+
+    def _similarity(self, signature: array, slot: int) -> float:
+        start = slot * self.num_perm
+        stored = self._signatures[start:start + self.num_perm]
+        return sum(1 for x, y in zip(signature, stored) if x == y) / self.num_perm
+
+    def query(self, signature: array) -> Optional[Tuple[bytes, float]]:
+        """
+        查找与签名最相似、且估计相似度不低于阈值的已索引样本
+
+        Args:
+            signature (array): MinHash 签名
+
+        Returns:
+            Optional[Tuple[bytes, float]]: (插入时的 16 字节键, 估计的 Jaccard 相似度)，没有时返回 None
+        """
+        best_slot, best_similarity = -1, 0.0
+        seen = set()
+        for band, value in enumerate(self._band_hashes(signature)):
+            base = band * self.table_size
+            position = value % self.table_size
+            while self._slots[base + position]:
+                slot = self._slots[base + position] - 1
+                if self._hashes[base + position] == value and slot not in seen:
+                    seen.add(slot)
+                    similarity = self._similarity(signature, slot)
+                    if similarity > best_similarity:
+                        best_slot, best_similarity = slot, similarity
+                position = (position + 1) % self.table_size
+        if best_slot < 0 or best_similarity < self.threshold:
+            return None
+        return bytes(self._keys[16 * best_slot:16 * best_slot + 16]), best_similarity
+
+    def insert(self, signature: array, key: bytes = bytes(16)) -> int:
+        """
+        插入签名，容量已满时覆盖最早的签名
+
+        Args:
+            signature (array): MinHash 签名
+            key (bytes): 16 字节的键，query 命中时原样返回
+
+        Returns:
+            int: 使用的槽位
+        """
+        slot = self.inserted % self.capacity
+        if self.inserted >= self.capacity:
+            oldest = self._signatures[slot * self.num_perm:(slot + 1) * self.num_perm]
+            for band, value in enumerate(self._band_hashes(oldest)):
+                self._remove(band, value, slot + 1)
+        elif slot >= self.allocated:
+            self._allocate(min(2 * self.allocated, self.capacity))
+        self._signatures[slot * self.num_perm:(slot + 1) * self.num_perm] = signature
+        self._keys[16 * slot:16 * slot + 16] = key[:16].ljust(16, b"\0")
+        for band, value in enumerate(self._band_hashes(signature)):
+            self._put(band, value, slot + 1)
+        self.inserted += 1
+        self.size = min(self.inserted, self.capacity)
+        return slot
+
+
+class NearDuplicateFilter:
+    """
+    生成结果的流式近重复过滤器
+
+    每条结果保存前计算输出文本的 MinHash 签名并查询 LSH 索引：
+        - 与已保存的结果估计 Jaccard 相似度不低于 threshold 时视为近重复，
+          结果中加入 near_duplicate 字段（similarity 和被重复结果的 input_hash）；
+          mode 为 drop 时不写入结果文件
+        - 否则加入索引
+    设置 max_duplicates_per_prompt 时，同一输入累计产生这么多条近重复后，
+    数据池中之后相同的输入不再请求（exhausted 返回 True）。
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        ngram: int = 5,
+        capacity: int = 1_000_000,
+        mode: str = "flag",
+        field: Optional[str] = None,
+        max_duplicates_per_prompt: Optional[int] = None,
+        bands: Optional[int] = None,
+        seed: int = 1,
+    ):
+        """
+        Args:
+            threshold (float): 判定为近重复的 Jaccard 相似度阈值
+            num_perm (int): MinHash 签名长度
+            ngram (int): 字符 n-gram 的长度
+            capacity (int): 索引最多保留的结果数，决定内存上限
+            mode (str): flag（标记后照常保存）或 drop（不保存）
+            field (Optional[str]): 参与比较的字段路径，默认优先使用 extracted，没有时使用 response
+            max_duplicates_per_prompt (Optional[int]): 同一输入的近重复上限，达到后跳过该输入，None 表示不限制
+            bands (Optional[int]): LSH 分段数，默认按 threshold 自动选择
+            seed (int): 哈希函数的随机种子
+        """
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode {mode!r}, expected one of {DEDUP_MODES}")
+        self.mode = mode
+        self.field = field
+        self.max_duplicates_per_prompt = max_duplicates_per_prompt
+        self.hasher = MinHasher(num_perm=num_perm, ngram=ngram, seed=seed)
+        self.index = LSHIndex(threshold=threshold, num_perm=num_perm, capacity=capacity, bands=bands)
+        self._extract = compile_path(field) if field else None
+        # 只记录出现过近重复的输入
+        self._prompt_duplicates: Dict[str, int] = {}
+        self.checked = 0
+        self.duplicates = 0
+        self.skipped = 0
+
+    @property
+    def drop(self) -> bool:
+        return self.mode == "drop"
+
+    def text_of(self, result: Dict[str, Any]) -> Optional[str]:
+        """取出结果中参与比较的文本，列表按行拼接，其他非字符串值按 JSON 序列化"""
+        if self._extract is not None:
+            value = self._extract(result)
+        else:
+            value = result.get("extracted")
+            if value in (None, "", []):
+                value = result.get("response")
+        if value in (None, "", []):
+            return None
+        if isinstance(value, list) and all(isinstance(item, str) for item in value):
+            return "\n".join(value)
+        if not isinstance(value, str):
+            return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+        return value
+
+    def check(self, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        检查单条结果，不是近重复时把它加入索引；出错或没有文本的结果直接跳过
+
+        Args:
+            result (Dict[str, Any]): 单条生成结果
+
+        Returns:
+            Optional[Dict[str, Any]]: 近重复时返回 {"similarity", "of"}（of 为被重复结果的 input_hash），否则为 None
+        """
+        if "error" in result:
+            return None
+        text = self.text_of(result)
+        if text is None:
+            return None
+        self.checked += 1
+        input_key = result.get("input_hash") or hash_input(result.get("input"))
+        signature = self.hasher.signature(text)
+        match = self.index.query(signature)
+        if match is None:
+            self.index.insert(signature, bytes.fromhex(input_key))
+            return None
+
+        self.duplicates += 1
+        if self.max_duplicates_per_prompt is not None:
+            self._prompt_duplicates[input_key] = self._prompt_duplicates.get(input_key, 0) + 1
+        key, similarity = match
+        return {"similarity": round(similarity, 4), "of": key.hex()}
+
+    def exhausted(self, input_data: Any) -> bool:
+        """该输入产生的近重复是否已达到上限，达到时调用方应跳过这次生成"""
+        if self.max_duplicates_per_prompt is None or not self._prompt_duplicates:
+            return False
+        if self._prompt_duplicates.get(hash_input(input_data), 0) < self.max_duplicates_per_prompt:
+            return False
+        self.skipped += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        过滤统计
+
+        Returns:
+            Dict[str, Any]: checked、duplicates、duplicate_rate、skipped（跳过的输入数）、indexed 和 memory_mb
+        """
+        return {
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+            "duplicate_rate": self.duplicates / self.checked if self.checked else 0.0,
+            "skipped": self.skipped,
+            "indexed": self.index.size,
+            "memory_mb": self.index.memory_bytes / 1024 / 1024,
+        }
+
+
+def create_dedup(dedup_config: Optional[Dict[str, Any]]) -> Optional[NearDuplicateFilter]:
+    """
+    根据配置中的 dedup 字段创建近重复过滤器
+
+    示例配置：
+        dedup:
+          enabled: true
+          threshold: 0.8
+          mode: flag        # flag / drop
+          capacity: 100000
+          max_duplicates_per_prompt: 3
+
+    Args:
+        dedup_config (Optional[Dict[str, Any]]): 配置中的 dedup 字段
+
+    Returns:
+        Optional[NearDuplicateFilter]: 未开启时返回 None
+    """
+    dedup_config = dict(dedup_config or {})
+    if not dedup_config.pop("enabled", False):
+        return None
+    return NearDuplicateFilter(**dedup_config)
@@ -1,19 +1,23 @@
-import json
 import os
-import yaml
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Union, Callable
-import dotenv
+from typing import List, Dict, Any, Optional, Union, Callable, Tuple, AsyncIterator
+from collections.abc import Sequence, Sized
 import re
 import asyncio
-from tqdm import tqdm
-from utils.llm_client import OpenAIClient
+import inspect
+import time
+import uuid
+from data_generation.dedup import create_dedup
+from utils.llm_client import OpenAIClient, extract_usage, load_env, summarize_cache_usage
 from utils.logger_config import get_logger
+from utils.profiling import create_profiler
+from utils.progress import ProgressReporter, ProgressTracker, create_reporters
+from utils.result_store import ResultStore, finish_reason_of
+from utils.scheduler import FairScheduler, job_slot
+from utils.streaming import aenumerate, bounded_as_completed, ensure_no_running_loop
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 
-dotenv.load_dotenv(override=True)
-
 
 class DataGenerationPipeline:
     """
@@ -29,6 +33,7 @@ class DataGenerationPipeline:
             **kwargs: 用于覆盖配置文件中的参数
         """
         self.logger = get_logger(name="data_generation", log_file="data_generation.log")
+        load_env()
         self.config_path = config_path
         self.config = self._load_config()
         self.timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
@@ -48,6 +53,27 @@ class DataGenerationPipeline:
         # 初始化文件锁和结果存储
         self.file_lock = threading.Lock()
         self.results = []
+        output_config = self.config.get("output_data", {})
+        self.result_store = ResultStore(
+            self.experiment_path,
+            schema=output_config.get("result_schema", "full"),
+            raw_responses=output_config.get("raw_responses", False),
+            compression=output_config.get("compression"),
+        )
+        # 压缩时结果文件带有 .gz / .zst 后缀
+        self.experiment_path = self.result_store.result_path
+        # 组合 pipeline 统一落盘时会关闭单个 pipeline 的结果保存
+        self.save_enabled = True
+        # 每个提示词的采样数（model.n），大于 1 时每次调用返回多个回复
+        self.samples_per_prompt = self.config.get("model", {}).get("n", 1)
+        # 近重复过滤（默认关闭，通过配置中的 dedup 字段开启）
+        self.dedup = create_dedup(self.config.get("dedup"))
+
+        # 提示词模板缓存，保证同一次运行中渲染出的前缀逐字节一致
+        self._prompt_templates: Dict[str, str] = {}
+
+        # 性能剖析（默认关闭，通过配置中的 profiling 字段开启）
+        self.profiler = create_profiler(self.config.get("profiling"), self.experiment_dir)
 
     def _update_config_with_kwargs(
         self, config: Dict[str, Any], kwargs: Dict[str, Any]
@@ -90,6 +116,8 @@ class DataGenerationPipeline:
         Returns:
             Dict[str, Any]: 配置字典
         """
+        import yaml
+
         with open(self.config_path, "r", encoding="utf-8") as file:
             return yaml.safe_load(file)
 
@@ -125,33 +153,103 @@ class DataGenerationPipeline:
         Returns:
             str: 提示词内容
         """
-        if file_path and os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf-8") as file:
-                prompt = file.read().strip()
-                try:
-                    # formatting prompt
-                    prompt = prompt.format(**format_variables)
-                except KeyError as e:
-                    self.logger.warning(
-                        f"Prompt formatting error, missing key: {e}. Using original prompt."
-                    )
-                except Exception as e:
-                    self.logger.error(f"Error occurred while formatting strings: {e}")
-                return prompt
+        if file_path in self._prompt_templates or (
+            file_path and os.path.exists(file_path)
+        ):
+            if file_path not in self._prompt_templates:
+                with open(file_path, "r", encoding="utf-8") as file:
+                    self._prompt_templates[file_path] = file.read().strip()
+            prompt = self._prompt_templates[file_path]
+            try:
+                # formatting prompt
+                prompt = prompt.format(**format_variables)
+            except KeyError as e:
+                self.logger.warning(
+                    f"Prompt formatting error, missing key: {e}. Using original prompt."
+                )
+            except Exception as e:
+                self.logger.error(f"Error occurred while formatting strings: {e}")
+            return prompt
 
         self.logger.error(f"Error, failed to load prompt file from {file_path}")
         return ""
 
-    def save_result(self, result: Dict[str, Any]) -> None:
+    def _render_prompts(self, input_data: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        根据输入数据渲染系统提示词和用户提示词
+
+        Args:
+            input_data (Dict[str, Any]): 输入数据
+
+        Returns:
+            Tuple[str, str]: (system_prompt, user_prompt)
+        """
+        system_prompt_kwargs = input_data.get("system_prompt_kwargs", {})
+        system_prompt = self._load_prompt_from_file(
+            self.system_prompt_path, **system_prompt_kwargs
+        )
+        user_prompt_kwargs = input_data.get("user_prompt_kwargs", {})
+        user_prompt = self._load_prompt_from_file(
+            self.user_prompt_path, **user_prompt_kwargs
+        )
+        return system_prompt, user_prompt
+
+    def order_by_prompt_prefix(
+        self, indexed_pool: List[Tuple[int, Dict[str, Any]]]
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        按渲染后的 (system_prompt, user_prompt) 排序调度顺序，
+        使共享前缀的请求相邻发出，从而命中提供方的 prompt cache
+
+        Args:
+            indexed_pool: (index, input_data) 列表
+
+        Returns:
+            List: 排序后的 (index, input_data) 列表，原始 index 保持不变
+        """
+        return sorted(indexed_pool, key=lambda item: self._render_prompts(item[1]))
+
+    def drop_near_duplicate(self, result: Dict[str, Any]) -> bool:
+        """
+        开启 dedup 时做近重复检测：近重复结果加入 near_duplicate 字段，
+        drop 模式下再加入 skipped: near_duplicate，表示该结果不写入结果文件
+
+        Args:
+            result (Dict[str, Any]): 单个生成结果（原地修改）
+
+        Returns:
+            bool: 是否应当丢弃
+        """
+        if self.dedup is None:
+            return False
+        with self.file_lock, self.profiler.stage("dedup"):
+            duplicate = self.dedup.check(result)
+        if duplicate is None:
+            return False
+        result["near_duplicate"] = duplicate
+        if self.dedup.drop:
+            result["skipped"] = "near_duplicate"
+            return True
+        return False
+
+    def save_result(
+        self, result: Dict[str, Any], naive_response: Any = None, check_duplicate: bool = True
+    ) -> None:
         """
-        持续保存单个生成结果到jsonl文件
+        持续保存单个生成结果到jsonl文件，写入格式由 output_data.result_schema 决定；
+        开启 dedup 时先做近重复检测（见 drop_near_duplicate），被丢弃的结果不写入
 
         Args:
             result (Dict[str, Any]): 单个生成结果
+            naive_response (Any): 原始响应，compact 格式下按配置写入压缩的旁路文件
+            check_duplicate (bool): 是否做近重复检测，调用方已经检测过时为 False
         """
+        if check_duplicate and self.drop_near_duplicate(result):
+            return
+        if not self.save_enabled:
+            return
         with self.file_lock:
-            with open(self.experiment_path, "a", encoding="utf-8") as file:
-                file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.result_store.write(result, naive_response)
             self.results.append(result)
 
     def extract_all(self, pattern_name: str, text: str) -> List[str]:
@@ -203,51 +301,150 @@ class DataGenerationPipeline:
         extract_function=None,
         input_data=None,
         client=None,
+        score_function=None,
     ):
         # 如果提供了client参数，则使用它；否则使用实例的client
         client_to_use: OpenAIClient = client if client is not None else self.client
-        response, naive_response = await client_to_use.safe_chat_completion(
-            prompt=user_prompt, system_prompt=system_prompt
-        )
+        n = self.samples_per_prompt
+        with self.profiler.stage("api_call"):
+            started = time.perf_counter()
+            response, naive_response = await client_to_use.safe_chat_completion(
+                prompt=user_prompt, system_prompt=system_prompt, n=n
+            )
+            latency_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        if n > 1:
+            return await self._save_samples(
+                response, naive_response, latency_ms, input_data, extract_function, score_function
+            )
 
-        # 构造结果字典
+        # 构造结果字典，compact 格式只保留内容、用量、finish_reason 和耗时
         result = {
             "input": input_data,
             "response": response,
-            "naive_response": naive_response,
+            "usage": extract_usage(naive_response),
+            "finish_reason": finish_reason_of(naive_response),
+            "latency_ms": latency_ms,
             "timestamp": datetime.now().isoformat(),
         }
+        if not self.result_store.compact:
+            result["naive_response"] = naive_response
 
         # extract answer
         if extract_function:
-            result["extracted"] = extract_function(response)
+            with self.profiler.stage("extraction"):
+                result["extracted"] = extract_function(response)
 
         # 持续保存结果
-        self.save_result(result)
+        with self.profiler.stage("save_result"):
+            self.save_result(result, naive_response)
 
         return result
 
+    async def _score_samples(self, samples: List[Dict[str, Any]], score_function) -> List[Optional[float]]:
+        """为每个采样打分，评分函数可以是同步函数（规则）或协程函数（调用评判模型）"""
+
+        async def score(sample):
+            try:
+                value = score_function(sample)
+                if inspect.isawaitable(value):
+                    value = await value
+                return None if value is None else float(value)
+            except Exception as e:
+                self.logger.error(f"Error scoring sample {sample['sample']['index']}: {e}")
+                return None
+
+        with self.profiler.stage("sample_scoring"):
+            return list(await asyncio.gather(*(score(sample) for sample in samples)))
+
+    async def _save_samples(
+        self,
+        responses: List[str],
+        naive_response: Any,
+        latency_ms: float,
+        input_data: Any,
+        extract_function=None,
+        score_function=None,
+    ) -> Dict[str, Any]:
+        """
+        把一次 n 采样调用的每个回复保存为独立的记录
+
+        同一次调用的记录通过 sample.group 关联，sample.index 为 choice 序号。
+        开启 dedup 的 drop 模式时先丢弃近重复的采样，只对保留的采样评分和保存。
+        用量和原始响应只记录在第一个保留的采样上，避免重复计数。设置 score_function 时
+        每个采样的分数写入 sample.score，分数最高的采样标记 sample.best。
+
+        Returns:
+            Dict[str, Any]: 最佳采样（未评分时为第一个保留的采样，全部被丢弃时带有 skipped），
+                usage 为整次调用的用量，samples 字段包含全部采样
+        """
+        group = uuid.uuid4().hex
+        timestamp = datetime.now().isoformat()
+        samples = []
+        for index, response in enumerate(responses):
+            sample = {
+                "input": input_data,
+                "response": response,
+                "usage": None,
+                "finish_reason": finish_reason_of(naive_response, index),
+                "latency_ms": latency_ms,
+                "sample": {"group": group, "index": index, "count": len(responses)},
+                "timestamp": timestamp,
+            }
+            if extract_function:
+                with self.profiler.stage("extraction"):
+                    sample["extracted"] = extract_function(response)
+            samples.append(sample)
+
+        kept = [index for index, sample in enumerate(samples) if not self.drop_near_duplicate(sample)]
+        best = kept[0] if kept else 0
+        if kept:
+            samples[best]["usage"] = extract_usage(naive_response)
+            if not self.result_store.compact:
+                samples[best]["naive_response"] = naive_response
+        if score_function is not None and kept:
+            scores = dict(zip(kept, await self._score_samples([samples[index] for index in kept], score_function)))
+            scored = [index for index in kept if scores[index] is not None]
+            if scored:
+                best = max(scored, key=scores.get)
+            for index in kept:
+                samples[index]["sample"]["score"] = scores[index]
+                samples[index]["sample"]["best"] = index == best and bool(scored)
+
+        with self.profiler.stage("save_result"):
+            for position, index in enumerate(kept):
+                self.save_result(
+                    samples[index], naive_response if position == 0 else None, check_duplicate=False
+                )
+
+        # 返回值代表整个提示词，用量按整次调用计算
+        return dict(samples[best], usage=extract_usage(naive_response), samples=samples)
+
     async def run_single_task(
-        self, i: int, input_data: Dict[str, Any], extract_function=None, client=None
+        self,
+        i: int,
+        input_data: Dict[str, Any],
+        extract_function=None,
+        client=None,
+        score_function=None,
     ):
         """处理单个任务"""
         try:
-            self.logger.debug(f"Processing task {i+1}")
-            self.logger.debug(f"Input data: {input_data}")
-
-            self.logger.debug("Loading system prompt")
-            system_prompt_kwargs = input_data.get("system_prompt_kwargs", {})
-            system_prompt = self._load_prompt_from_file(
-                self.system_prompt_path, **system_prompt_kwargs
-            )
-            self.logger.debug(f"System prompt: {system_prompt}")
-
-            self.logger.debug("Loading user prompt")
-            user_prompt_kwargs = input_data.get("user_prompt_kwargs", {})
-            user_prompt = self._load_prompt_from_file(
-                self.user_prompt_path, **user_prompt_kwargs
-            )
-            self.logger.debug(f"user prompt: {user_prompt}")
+            self.logger.debug("Processing task %s", i + 1)
+            self.logger.debug("Input data: %s", input_data)
+            if self.dedup is not None and self.dedup.exhausted(input_data):
+                # 该输入已经产生了足够多的近重复，不再请求，也不写入结果文件
+                return {
+                    "input": input_data,
+                    "skipped": "near_duplicate_limit",
+                    "timestamp": datetime.now().isoformat(),
+                }
+
+            self.logger.debug("Loading system prompt and user prompt")
+            with self.profiler.stage("prompt_load"):
+                system_prompt, user_prompt = self._render_prompts(input_data)
+            self.logger.debug("System prompt: %s", system_prompt)
+            self.logger.debug("user prompt: %s", user_prompt)
 
             result = await self.run_single_queries(
                 user_prompt=user_prompt,
@@ -255,8 +452,9 @@ class DataGenerationPipeline:
                 input_data=input_data,
                 extract_function=extract_function,
                 client=client,
+                score_function=score_function,
             )
-            self.logger.debug(f"Getting result: {result}")
+            self.logger.debug("Getting result: %s", result)
             return result
 
         except Exception as e:
@@ -269,43 +467,176 @@ class DataGenerationPipeline:
             self.save_result(error_result)
             return error_result
 
-    async def run_all_tasks(
-        self, data_pool, concurrency_limit: int = 5, extract_function: Callable = None
-    ):
-        sem = asyncio.Semaphore(concurrency_limit)
+    async def astream(
+        self,
+        data_pool,
+        concurrency_limit: int = 5,
+        extract_function: Callable = None,
+        prefix_ordering: bool = False,
+        score_function: Callable = None,
+        scheduler: Optional[FairScheduler] = None,
+        job_name: Optional[str] = None,
+        client: Optional[OpenAIClient] = None,
+        tracker: Optional[ProgressTracker] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        异步生成器接口：按完成顺序逐条产出结果，可以在已有事件循环中使用
 
-        async def worker(i, input_data):
-            async with sem:
-                client = OpenAIClient(self.config_for_client)
+        同时在途的请求数不超过 concurrency_limit，且只有调用方取走结果后
+        才会继续读取 data_pool（背压），因此 data_pool 可以是异步生成器，
+        例如上游 pipeline 的 astream，从而串联成无需中间文件的流式 pipeline。
+
+        Args:
+            data_pool: 数据池，list / 可迭代对象 / 异步迭代器
+            concurrency_limit (int): 并发限制数量，默认为5
+            extract_function (Callable): 提取函数
+            prefix_ordering (bool): 是否按提示词前缀分组调度以命中 prompt cache，
+                仅对 list 等可排序的数据池生效
+            score_function (Callable): model.n 大于 1 时为每个采样打分的函数（同步或协程函数，
+                输入为单个采样结果，返回分数），分数最高的采样标记为 best 并作为该提示词的结果
+            scheduler (FairScheduler): 多个 pipeline 共享的调度器，默认不使用
+            job_name (str): 在调度器中的作业名称，默认为实验目录
+            client (OpenAIClient): 共享的客户端（连接池与速率限制），默认为本次运行新建一个
+            tracker (ProgressTracker): 进度指标收集器，设置后并发上限可以在运行中调整
+
+        Yields:
+            Dict[str, Any]: 单条生成结果；带有 skipped 字段的结果（近重复被丢弃或达到上限）未写入结果文件
+        """
+        job_name = job_name or self.experiment_dir
+
+        async def worker(item):
+            i, input_data = item
+            if tracker is not None:
+                tracker.task_started()
+            async with job_slot(scheduler, job_name):
                 return await self.run_single_task(
-                    i, input_data, extract_function, client
+                    i, input_data, extract_function, client, score_function
                 )
 
-        tasks = [worker(i, x) for i, x in enumerate(data_pool)]
+        if prefix_ordering and isinstance(data_pool, Sequence):
+            items = self.order_by_prompt_prefix(list(enumerate(data_pool)))
+        else:
+            if prefix_ordering:
+                self.logger.warning("prefix_ordering requires a sequence data pool, skipped.")
+            items = aenumerate(data_pool)
+
+        results = None
+        try:
+            # 剖析器在 try 内启动，客户端创建失败时也会停止（恢复事件循环的 debug 模式、取消延迟监控）
+            self.profiler.start()
+            with self.profiler.stage("client_creation"):
+                client = client if client is not None else OpenAIClient(self.config_for_client)
+            if self.profiler.enabled:
+                client.profiler = self.profiler
+            limit = concurrency_limit
+            if tracker is not None:
+                tracker.attach_rate_limiter(client.rate_limiter)
+                limit = lambda: tracker.concurrency_limit
+            results = bounded_as_completed(items, worker, limit)
+            async for result in results:
+                if tracker is not None:
+                    tracker.task_finished(result)
+                yield result
+        finally:
+            if results is not None:
+                # 提前退出时先取消在途任务，避免它们在结果文件关闭后继续写入
+                await results.aclose()
+            self.result_store.close()
+            self.profiler.stop()
+            if self.dedup is not None:
+                self.logger.info(f"Near-duplicate filter: {self.dedup.stats()}")
+
+    async def arun(
+        self,
+        data_pool,
+        concurrency_limit: int = 5,
+        extract_function: Callable = None,
+        prefix_ordering: bool = False,
+        score_function: Callable = None,
+        scheduler: Optional[FairScheduler] = None,
+        job_name: Optional[str] = None,
+        client: Optional[OpenAIClient] = None,
+        progress: Optional[List[ProgressReporter]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        异步运行数据生成管道并收集全部结果，其余参数与 astream 相同
+
+        Args:
+            progress (List[ProgressReporter]): 进度输出方式，默认按配置中的 progress 字段创建
+
+        Returns:
+            List[Dict[str, Any]]: 按完成顺序排列的生成结果
+        """
         results = []
-        for coro in tqdm(asyncio.as_completed(tasks), total=len(tasks)):
-            results.append(await coro)
+        tracker = ProgressTracker(
+            total=len(data_pool) if isinstance(data_pool, Sized) else None,
+            reporters=(
+                progress
+                if progress is not None
+                else create_reporters(self.config.get("progress"), self.experiment_dir)
+            ),
+            concurrency_limit=concurrency_limit,
+        )
+        tracker.start()
+        try:
+            async for result in self.astream(
+                data_pool,
+                concurrency_limit=concurrency_limit,
+                extract_function=extract_function,
+                prefix_ordering=prefix_ordering,
+                score_function=score_function,
+                scheduler=scheduler,
+                job_name=job_name,
+                client=client,
+                tracker=tracker,
+            ):
+                results.append(result)
+        finally:
+            tracker.close()
         return results
 
+    async def run_all_tasks(self, data_pool, concurrency_limit: int = 5, **kwargs):
+        """兼容旧接口，等价于 arun"""
+        return await self.arun(data_pool, concurrency_limit=concurrency_limit, **kwargs)
+
     def run(
-        self, data_pool, concurrency_limit: int = 5, extract_function: Callable = None
+        self,
+        data_pool,
+        concurrency_limit: int = 5,
+        extract_function: Callable = None,
+        prefix_ordering: bool = False,
+        score_function: Callable = None,
+        scheduler: Optional[FairScheduler] = None,
+        job_name: Optional[str] = None,
+        progress: Optional[List[ProgressReporter]] = None,
     ):
         """
-        运行数据生成管道，支持并发处理
+        运行数据生成管道，支持并发处理（arun 的同步封装，不能在已有事件循环中调用）
 
         Args:
             data_pool: 数据池
             concurrency_limit (int): 并发限制数量，默认为5
+            prefix_ordering (bool): 是否按提示词前缀分组调度以命中 prompt cache
+            score_function (Callable): model.n 大于 1 时的 best-of-N 评分函数
+            scheduler (FairScheduler): 多个 pipeline 共享的调度器，默认不使用
+            job_name (str): 在调度器中的作业名称，默认为实验目录
+            progress (List[ProgressReporter]): 进度输出方式，默认按配置中的 progress 字段创建
         """
+        ensure_no_running_loop("pipeline.arun")
         self.logger.info("Starting data generation pipeline")
         self.logger.info(f"Concurrency limit: {concurrency_limit}")
         self.logger.info(f"Total tasks: {len(data_pool)}")
 
         results = asyncio.run(
-            self.run_all_tasks(
+            self.arun(
                 data_pool=data_pool,
                 concurrency_limit=concurrency_limit,
                 extract_function=extract_function,
+                prefix_ordering=prefix_ordering,
+                score_function=score_function,
+                scheduler=scheduler,
+                job_name=job_name,
+                progress=progress,
             )
         )
 
@@ -362,5 +693,11 @@ class DataGenerationPipeline:
             else:
                 processed_results.append(result)
 
+        cache_usage = summarize_cache_usage(processed_results)
+        self.logger.info(
+            f"Prompt tokens: {cache_usage['prompt_tokens']}, "
+            f"cached tokens: {cache_usage['cached_tokens']} "
+            f"({cache_usage['cache_hit_rate']:.1%})"
+        )
         self.logger.info("Data generation pipeline completed")
         return processed_results
@@ -1,6 +1,16 @@
-import json
-from typing import Dict, Any, List, Union
+import os
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Union
+from utils.compression import iter_lines
+from utils.field_access import compile_path
+from utils.incremental_stats import (
+    IncrementalStats,
+    StatsAccumulator,
+    group_capacity_for,
+    print_group_stats,
+)
 from utils.logger_config import get_logger
+from utils.result_store import InputResolver, references_input
+from utils.serialization import loads
 
 logger = get_logger(name="data_generation_stats", log_file="data_generation_stats.log")
 
@@ -23,16 +33,28 @@ class DataGenerationStats:
         Returns:
             List[Dict[str, Any]]: 生成结果列表
         """
-        results = []
+        return list(self.iter_results(file_path))
+    
+    def iter_results(self, file_path: str, resolve_inputs: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        逐行读取结果文件，不把整个文件加载到内存；.gz / .zst 压缩文件会透明解压
+
+        Args:
+            file_path (str): 结果文件路径
+            resolve_inputs (bool): 为 compact 结果从同目录的 inputs.jsonl 补回 input 字段
+
+        Yields:
+            Dict[str, Any]: 单条结果
+        """
+        resolver = InputResolver(os.path.dirname(os.path.abspath(file_path))) if resolve_inputs else None
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        results.append(json.loads(line))
+            for line in iter_lines(file_path):
+                if line.strip():
+                    result = loads(line)
+                    yield result if resolver is None else resolver.resolve(result)
         except Exception as e:
             self.logger.error(f"Error loading results from {file_path}: {e}")
             raise
-        return results
     
     def calculate_numeric_stats(self, values: List[Union[int, float]]) -> Dict[str, Any]:
         """
@@ -83,6 +105,9 @@ class DataGenerationStats:
         """
         从结果中提取指定路径的字段值
 
+        路径只解析一次（utils.field_access.compile_path），支持派生字段，
+        如 "response.length"（长度）和 "answer.token_count"（token 数）
+
         Args:
             results (List[Dict[str, Any]]): 结果列表
             field_path (str): 字段路径，如 "response.length"
@@ -90,91 +115,61 @@ class DataGenerationStats:
         Returns:
             List[Any]: 字段值列表
         """
+        getter = compile_path(field_path)
         values = []
-        
         for result in results:
             # 跳过错误结果
             if "error" in result:
                 continue
-                
-            current = result
-            try:
-                # 处理特殊路径
-                if field_path == "response.length":
-                    response = result.get("response", "")
-                    if response:
-                        values.append(len(response))
-                else:
-                    # 通用路径处理
-                    path_parts = field_path.split(".")
-                    for part in path_parts:
-                        if isinstance(current, dict) and part in current:
-                            current = current[part]
-                        else:
-                            current = None
-                            break
-                    
-                    if current is not None:
-                        values.append(current)
-            except (KeyError, TypeError):
-                continue
-                
+            value = getter(result)
+            if value is not None:
+                values.append(value)
         return values
     
-    def calculate_general_stats(self, results: List[Dict[str, Any]], 
+    def calculate_general_stats(self, results: Iterable[Dict[str, Any]], 
                               numeric_fields: List[str] = None,
-                              distribution_fields: List[str] = None) -> Dict[str, Any]:
+                              distribution_fields: List[str] = None,
+                              group_by: Union[str, List[str]] = None,
+                              top_k: Optional[int] = None) -> Dict[str, Any]:
         """
         计算通用统计信息
 
+        只遍历一次结果，results 可以是列表，也可以是 iter_results 返回的迭代器。
+        设置 group_by 时在同一次遍历中按分组键做哈希聚合，结果中增加 groups 字段：
+            {"by": [...], "group_count": N, "approximate": bool,
+             "items": [{"key": {...}, "stats": {...}}, ...],  # 按结果数降序
+             "other": {...} 或 None}                           # top_k 之外的分组合计
+        设置 top_k 且分组数超过跟踪上限时 approximate 为 True，group_count 为上界，
+        items 中的 count_error 为该分组结果数可能少计的上界
+
         Args:
-            results (List[Dict[str, Any]]): 结果列表
+            results (Iterable[Dict[str, Any]]): 结果列表或迭代器
             numeric_fields (List[str]): 需要计算数值统计的字段路径列表
             distribution_fields (List[str]): 需要计算分布统计的字段路径列表
+            group_by (Union[str, List[str]]): 分组字段路径，如 "input.meta_info.model_name"，
+                多个字段时按组合键分组
+            top_k (int): 只输出结果数最多的 K 个分组，适合高基数的分组键；设置后只跟踪
+                top_k * HEAVY_HITTER_FACTOR 个分组（space-saving），内存不随分组数增长
 
         Returns:
             Dict[str, Any]: 统计信息
         """
-        stats = {
-            "total_count": len(results),
-            "success_count": 0,
-            "error_count": 0,
-            "numeric_stats": {},
-            "distribution_stats": {}
-        }
-        
-        # 统计成功和错误数量
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        accumulator = StatsAccumulator(
+            numeric_fields, distribution_fields, group_by, group_capacity_for(top_k) if group_by else None
+        )
         for result in results:
-            if "error" in result:
-                stats["error_count"] += 1
-            else:
-                stats["success_count"] += 1
-        
-        # 计算数值统计
-        if numeric_fields:
-            for field in numeric_fields:
-                values = self.extract_fields(results, field)
-                # 转换为数值类型
-                numeric_values = []
-                for v in values:
-                    try:
-                        numeric_values.append(float(v))
-                    except (ValueError, TypeError):
-                        continue
-                
-                stats["numeric_stats"][field] = self.calculate_numeric_stats(numeric_values)
-        
-        # 计算分布统计
-        if distribution_fields:
-            for field in distribution_fields:
-                values = self.extract_fields(results, field)
-                stats["distribution_stats"][field] = self.calculate_distribution_stats(values)
-        
-        return stats
+            accumulator.add(result)
+        return accumulator.general_stats(top_k)
     
     def generate_report(self, file_path: str, 
                        numeric_fields: List[str] = None,
-                       distribution_fields: List[str] = None) -> Dict[str, Any]:
+                       distribution_fields: List[str] = None,
+                       incremental: bool = False,
+                       state_path: Optional[str] = None,
+                       group_by: Union[str, List[str]] = None,
+                       top_k: Optional[int] = None) -> Dict[str, Any]:
         """
         生成完整的统计报告
 
@@ -182,15 +177,43 @@ class DataGenerationStats:
             file_path (str): 结果文件路径
             numeric_fields (List[str]): 需要计算数值统计的字段路径列表
             distribution_fields (List[str]): 需要计算分布统计的字段路径列表
+            incremental (bool): 增量模式，只读取上次统计之后新追加的行，
+                统计状态保存在旁路状态文件中
+            state_path (str): 增量模式的状态文件路径，默认为 "<file_path>.stats_state.json"
+            group_by (Union[str, List[str]]): 分组字段路径
+            top_k (int): 只输出结果数最多的 K 个分组
 
         Returns:
             Dict[str, Any]: 统计报告
         """
-        results = self.load_results(file_path)
+        if isinstance(group_by, str):
+            group_by = [group_by]
+        if incremental:
+            general_stats = IncrementalStats(
+                file_path,
+                numeric_fields,
+                distribution_fields,
+                state_path=state_path,
+                kind=type(self).__name__,
+                group_by=group_by,
+            ).update(top_k)
+            report = {
+                "total_tasks": general_stats["total_count"],
+                "general_stats": general_stats
+            }
+            self.logger.info(f"Updated incremental stats report for {file_path}")
+            return report
+
+        # compact 结果只保存 input_hash，统计 input 下的字段时需要补回输入
+        resolve_inputs = references_input((numeric_fields or []) + (distribution_fields or []) + (group_by or []))
+        general_stats = self.calculate_general_stats(
+            self.iter_results(file_path, resolve_inputs),
+            numeric_fields, distribution_fields, group_by, top_k
+        )
         
         report = {
-            "total_tasks": len(results),
-            "general_stats": self.calculate_general_stats(results, numeric_fields, distribution_fields)
+            "total_tasks": general_stats["total_count"],
+            "general_stats": general_stats
         }
         
         self.logger.info(f"Generated stats report for {file_path}")
@@ -198,7 +221,11 @@ class DataGenerationStats:
     
     def print_report(self, file_path: str, 
                     numeric_fields: List[str] = None,
-                    distribution_fields: List[str] = None) -> None:
+                    distribution_fields: List[str] = None,
+                    incremental: bool = False,
+                    state_path: Optional[str] = None,
+                    group_by: Union[str, List[str]] = None,
+                    top_k: Optional[int] = None) -> None:
         """
         打印统计报告
 
@@ -206,8 +233,15 @@ class DataGenerationStats:
             file_path (str): 结果文件路径
             numeric_fields (List[str]): 需要计算数值统计的字段路径列表
             distribution_fields (List[str]): 需要计算分布统计的字段路径列表
+            incremental (bool): 增量模式，只读取上次统计之后新追加的行
+            state_path (str): 增量模式的状态文件路径
+            group_by (Union[str, List[str]]): 分组字段路径
+            top_k (int): 只输出结果数最多的 K 个分组
         """
-        report = self.generate_report(file_path, numeric_fields, distribution_fields)
+        report = self.generate_report(
+            file_path, numeric_fields, distribution_fields, incremental, state_path,
+            group_by, top_k
+        )
         
         print("=" * 50)
         print("Data Generation Stats Report")
@@ -238,4 +272,6 @@ class DataGenerationStats:
                 for value, count in distribution.items():
                     print(f"    {value}: {count}")
         
+        print_group_stats(general_stats.get('groups'))
+        
         print("=" * 50)
\ No newline at end of file
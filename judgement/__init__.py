@@ -1,4 +1,20 @@
-from .pipeline import JudgementPipeline
-from .stats import JudgementStats
+from typing import TYPE_CHECKING
+from utils.lazy_import import lazy_exports
 
-__all__ = ['JudgementPipeline', 'JudgementStats']
\ No newline at end of file
+if TYPE_CHECKING:
+    from .compare import JudgementComparison
+    from .pipeline import JudgementPipeline
+    from .sequential import SequentialEvaluation
+    from .stats import JudgementStats
+
+__all__ = ['JudgementComparison', 'JudgementPipeline', 'JudgementStats', 'SequentialEvaluation']
+
+__getattr__, __dir__ = lazy_exports(
+    __name__,
+    {
+        'JudgementComparison': '.compare',
+        'JudgementPipeline': '.pipeline',
+        'JudgementStats': '.stats',
+        'SequentialEvaluation': '.sequential',
+    },
+)
@@ -0,0 +1,273 @@
+import os
+from typing import Any, Callable, Dict, List, Optional
+from utils.field_access import compile_fields
+from utils.logger_config import get_logger
+from utils.records import hash_input, hash_query
+from utils.result_store import load_inputs
+from .stats import JudgementStats
+
+logger = get_logger(name="judgement_compare", log_file="judgement_compare.log")
+
+# 唯一值不超过该数量时使用多项分布重采样（评分通常是 1~10 的整数）
+MAX_DISCRETE_VALUES = 256
+# 逐行重采样时单个分块的最大元素数，控制内存占用
+MAX_CHUNK_ELEMENTS = 1 << 24
+# 连续取值时逐行重采样的总元素数上限（行数 x 重采样次数），超过后改用分位数分箱近似
+MAX_EXACT_ELEMENTS = 2 * 10**8
+# 分箱近似使用的等频分箱数，每个分箱用箱内均值代表，总体均值保持不变
+APPROX_BINS = 4096
+
+
+def _require_numpy():
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise ImportError(
+            "numpy is required for judgement comparison, install it with `pip install numpy`"
+        ) from e
+    return np
+
+
+class JudgementComparison:
+    """
+    评测结果的置信区间与配对比较
+
+    - bootstrap_ci: 单个实验某项评分均值的 bootstrap 置信区间
+    - paired_bootstrap: 两个实验在相同输入上的配对差值及其置信区间
+    - compare: 读取两个结果文件，按问题的哈希（utils.records.hash_query，不含被评模型的回答和模型信息）配对后逐字段比较
+
+    重采样使用 NumPy 向量化实现：唯一值较少的评分（离散分数、分数差）直接对各取值的计数做
+    多项分布抽样，开销与行数无关；连续取值按分块一次性生成重采样下标，
+    行数 x 重采样次数超过 MAX_EXACT_ELEMENTS 时改用等频分箱近似。
+    """
+
+    def __init__(
+        self,
+        n_resamples: int = 10000,
+        confidence: float = 0.95,
+        seed: Optional[int] = 0,
+        key_function: Callable[[Dict[str, Any]], str] = hash_query,
+    ):
+        """
+        Args:
+            n_resamples (int): bootstrap 重采样次数
+            confidence (float): 置信水平
+            seed (Optional[int]): 随机种子，None 表示不固定
+            key_function (Callable): 由结果中的 input 计算配对键的函数，默认忽略 answer、meta_info
+                和 user_prompt_kwargs.model_response；同一模型的两次评判可以用 hash_input 按完整输入配对
+        """
+        self.n_resamples = n_resamples
+        self.confidence = confidence
+        self.seed = seed
+        self.key_function = key_function
+        self.logger = logger
+
+    def _resample_means(self, values, rng):
+        """返回 n_resamples 个重采样均值"""
+        np = _require_numpy()
+        n = len(values)
+        unique, counts = np.unique(values, return_counts=True)
+        if len(unique) <= MAX_DISCRETE_VALUES:
+            # 有放回抽样 n 次等价于按各取值频率做一次多项分布抽样
+            draws = rng.multinomial(n, counts / n, size=self.n_resamples)
+            return draws @ unique / n
+
+        if n * self.n_resamples > MAX_EXACT_ELEMENTS:
+            # 大样本的连续取值：按等频分箱后对各分箱做多项分布抽样
+            ordered = np.sort(values)
+            edges = np.unique(np.linspace(0, n, APPROX_BINS + 1).astype(int)[:-1])
+            sizes = np.diff(np.append(edges, n))
+            centers = np.add.reduceat(ordered, edges) / sizes
+            draws = rng.multinomial(n, sizes / n, size=self.n_resamples)
+            return draws @ centers / n
+
+        means = np.empty(self.n_resamples)
+        chunk = max(1, MAX_CHUNK_ELEMENTS // n)
+        for start in range(0, self.n_resamples, chunk):
+            size = min(chunk, self.n_resamples - start)
+            indices = rng.integers(0, n, size=(size, n))
+            means[start:start + size] = values[indices].mean(axis=1)
+        return means
+
+    def _interval(self, means) -> Dict[str, float]:
+        np = _require_numpy()
+        alpha = (1 - self.confidence) / 2
+        low, high = np.quantile(means, [alpha, 1 - alpha])
+        return {"low": float(low), "high": float(high)}
+
+    def bootstrap_ci(self, values) -> Dict[str, Any]:
+        """
+        计算均值的 bootstrap 置信区间（百分位法）
+
+        Args:
+            values: 数值序列
+
+        Returns:
+            Dict[str, Any]: n、mean、low、high
+        """
+        np = _require_numpy()
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return {"n": 0, "mean": None, "low": None, "high": None}
+        rng = np.random.default_rng(self.seed)
+        means = self._resample_means(values, rng)
+        return {"n": len(values), "mean": float(values.mean()), **self._interval(means)}
+
+    def paired_bootstrap(self, baseline, candidate) -> Dict[str, Any]:
+        """
+        对同一批输入上的两组评分做配对 bootstrap
+
+        Args:
+            baseline: 基线实验的评分序列
+            candidate: 候选实验的评分序列（与 baseline 一一对应）
+
+        Returns:
+            Dict[str, Any]: n、mean_diff（candidate - baseline）、low、high、
+                p_value（双侧，差值为 0 的 bootstrap 检验）以及 wins / ties / losses
+        """
+        np = _require_numpy()
+        baseline = np.asarray(baseline, dtype=float)
+        candidate = np.asarray(candidate, dtype=float)
+        if len(baseline) != len(candidate):
+            raise ValueError("baseline and candidate must have the same length")
+        if len(baseline) == 0:
+            return {"n": 0, "mean_diff": None, "low": None, "high": None, "p_value": None,
+                    "wins": 0, "ties": 0, "losses": 0}
+        diffs = candidate - baseline
+        rng = np.random.default_rng(self.seed)
+        means = self._resample_means(diffs, rng)
+        p_value = min(1.0, 2 * min(float((means <= 0).mean()), float((means >= 0).mean())))
+        return {
+            "n": len(diffs),
+            "mean_diff": float(diffs.mean()),
+            **self._interval(means),
+            "p_value": p_value,
+            "wins": int((diffs > 0).sum()),
+            "ties": int((diffs == 0).sum()),
+            "losses": int((diffs < 0).sum()),
+        }
+
+    def load_scores(self, file_path: str, fields: List[str]) -> Dict[str, Dict[str, float]]:
+        """
+        读取结果文件中每条输入的评分，跳过错误结果；同一输入出现多次时保留最后一条
+
+        Args:
+            file_path (str): 评测结果文件路径
+            fields (List[str]): 评分字段路径，如 "model_based_judgement.accuracy"
+
+        Returns:
+            Dict[str, Dict[str, float]]: 输入哈希 -> {字段: 分数}
+        """
+        scores = {}
+        extract = compile_fields(fields)
+        inputs = None
+        for result in JudgementStats().iter_results(file_path):
+            if "error" in result:
+                continue
+            if "input" in result:
+                key = self.key_function(result["input"])
+            elif "input_hash" in result:
+                # compact 格式的结果只保存输入哈希，完整输入在同目录的 inputs.jsonl 中
+                if self.key_function is hash_input:
+                    key = result["input_hash"]
+                else:
+                    if inputs is None:
+                        inputs = load_inputs(os.path.dirname(os.path.abspath(file_path)))
+                    if result["input_hash"] not in inputs:
+                        continue
+                    key = self.key_function(inputs[result["input_hash"]])
+            else:
+                continue
+            row = {}
+            for field, value in zip(fields, extract(result)):
+                try:
+                    row[field] = float(value)
+                except (ValueError, TypeError):
+                    continue
+            scores[key] = row
+        return scores
+
+    def compare(self, baseline_path: str, candidate_path: str, fields: List[str]) -> Dict[str, Any]:
+        """
+        比较两个实验的结果文件
+
+        Args:
+            baseline_path (str): 基线实验结果文件
+            candidate_path (str): 候选实验结果文件
+            fields (List[str]): 需要比较的评分字段路径列表
+
+        Returns:
+            Dict[str, Any]: 每个字段的基线/候选均值置信区间和配对差值
+        """
+        baseline = self.load_scores(baseline_path, fields)
+        candidate = self.load_scores(candidate_path, fields)
+        shared = [key for key in baseline if key in candidate]
+        report = {
+            "baseline_path": baseline_path,
+            "candidate_path": candidate_path,
+            "n_resamples": self.n_resamples,
+            "confidence": self.confidence,
+            "baseline_rows": len(baseline),
+            "candidate_rows": len(candidate),
+            "paired_rows": len(shared),
+            "fields": {},
+        }
+        for field in fields:
+            pairs = [
+                (baseline[key][field], candidate[key][field])
+                for key in shared
+                if field in baseline[key] and field in candidate[key]
+            ]
+            report["fields"][field] = {
+                "baseline": self.bootstrap_ci(
+                    [row[field] for row in baseline.values() if field in row]
+                ),
+                "candidate": self.bootstrap_ci(
+                    [row[field] for row in candidate.values() if field in row]
+                ),
+                "paired": self.paired_bootstrap(
+                    [pair[0] for pair in pairs], [pair[1] for pair in pairs]
+                ),
+            }
+        self.logger.info(
+            f"Compared {baseline_path} and {candidate_path} on {len(shared)} paired inputs"
+        )
+        if not shared and baseline and candidate:
+            self.logger.warning(
+                "No inputs are shared between the two result files, the paired comparison is empty. "
+                "Check that key_function ignores the fields that differ between the experiments."
+            )
+        return report
+
+    def print_comparison(self, baseline_path: str, candidate_path: str, fields: List[str]) -> None:
+        """
+        打印比较报告
+
+        Args:
+            baseline_path (str): 基线实验结果文件
+            candidate_path (str): 候选实验结果文件
+            fields (List[str]): 需要比较的评分字段路径列表
+        """
+        report = self.compare(baseline_path, candidate_path, fields)
+        level = f"{report['confidence']:.0%}"
+
+        print("=" * 50)
+        print("Judgement Comparison Report")
+        print("=" * 50)
+        print(f"Baseline rows: {report['baseline_rows']}")
+        print(f"Candidate rows: {report['candidate_rows']}")
+        print(f"Paired rows: {report['paired_rows']}")
+        for field, result in report["fields"].items():
+            print(f"\n  {field}:")
+            for name in ("baseline", "candidate"):
+                ci = result[name]
+                if ci["n"]:
+                    print(f"    {name.capitalize()}: {ci['mean']:.3f} "
+                          f"[{level} CI {ci['low']:.3f}, {ci['high']:.3f}] (n={ci['n']})")
+            paired = result["paired"]
+            if paired["n"]:
+                print(f"    Paired diff: {paired['mean_diff']:+.3f} "
+                      f"[{level} CI {paired['low']:+.3f}, {paired['high']:+.3f}], "
+                      f"p={paired['p_value']:.4f}")
+                print(f"    Wins/Ties/Losses: {paired['wins']}/{paired['ties']}/{paired['losses']}")
+        print("=" * 50)
@@ -1,19 +1,34 @@
 import json
 import os
-import yaml
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Union, Callable
-import dotenv
+from typing import List, Dict, Any, Optional, Union, Callable, Tuple, AsyncIterator
+from collections.abc import Sequence, Sized
 import asyncio
 import re
-from tqdm import tqdm
-from utils.llm_client import OpenAIClient
+from utils.llm_client import OpenAIClient, extract_usage, load_env, merge_usage, summarize_cache_usage
 from utils.logger_config import get_logger
-import tiktoken
+from utils.profiling import create_profiler
+from utils.progress import ProgressReporter, ProgressTracker, create_reporters
+from utils.result_store import ResultStore
+from utils.scheduler import FairScheduler, job_slot
+from utils.tokenizer import get_tokenizer
+from judgement.sequential import SequentialEvaluation, create_sequential
+from utils.streaming import (
+    aenumerate,
+    aiter_items,
+    bounded_as_completed,
+    ensure_no_running_loop,
+)
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 
-dotenv.load_dotenv(override=True)
+# 打包评判模式下附加在用户提示词前的说明，{count} 为本次打包的条目数
+PACKED_PROMPT_HEADER = (
+    "You will judge {count} independent items below. Judge every item separately "
+    "and strictly follow the required output format for each one. Wrap the full "
+    "output of each item in <item id=N>...</item>, where N is the id of the "
+    "corresponding input item."
+)
 
 
 class JudgementPipeline:
@@ -39,6 +54,7 @@ class JudgementPipeline:
             **kwargs: 用于覆盖配置文件中的参数
         """
         self.logger = get_logger(name="judgement", log_file="judgement.log")
+        load_env()
         self.config_path = config_path
         self.config = self._load_config()
         self.timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
@@ -62,9 +78,25 @@ class JudgementPipeline:
         # 初始化文件锁和结果存储
         self.file_lock = threading.Lock()
         self.results = []
+        # compact 格式下 input 按哈希引用，只在 inputs.jsonl 中写入一次
+        output_config = self.config.get("output_data", {})
+        self.result_store = ResultStore(
+            self.experiment_path,
+            schema=output_config.get("result_schema", "full"),
+            compression=output_config.get("compression"),
+        )
+        # 压缩时结果文件带有 .gz / .zst 后缀
+        self.experiment_path = self.result_store.result_path
+        # 组合 pipeline 统一落盘时会关闭单个 pipeline 的结果保存
+        self.save_enabled = True
+
+        # 提示词模板缓存，保证同一次运行中渲染出的前缀逐字节一致
+        self._prompt_templates: Dict[str, str] = {}
 
-        # 初始化tokenizer
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        # 性能剖析（默认关闭，通过配置中的 profiling 字段开启）
+        self.profiler = create_profiler(self.config.get("profiling"), self.experiment_dir)
+        # 最近一次运行的序贯评估（通过配置中的 sequential 字段或 sequential 参数开启）
+        self.sequential: Optional[SequentialEvaluation] = None
 
     def _update_config_with_kwargs(
         self, config: Dict[str, Any], kwargs: Dict[str, Any]
@@ -107,6 +139,8 @@ class JudgementPipeline:
         Returns:
             Dict[str, Any]: 配置字典
         """
+        import yaml
+
         with open(self.config_path, "r", encoding="utf-8") as file:
             return yaml.safe_load(file)
 
@@ -205,35 +239,154 @@ class JudgementPipeline:
         Returns:
             str: 提示词内容
         """
-        if file_path and os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf-8") as file:
-                prompt = file.read().strip()
-                try:
-                    # formatting prompt
-                    prompt = prompt.format(**format_variables)
-                except KeyError as e:
-                    self.logger.warning(
-                        f"Prompt formatting error, missing key: {e}. Using original prompt."
-                    )
-                except Exception as e:
-                    self.logger.error(f"Error occurred while formatting strings: {e}")
-                return prompt
+        if file_path in self._prompt_templates or (
+            file_path and os.path.exists(file_path)
+        ):
+            if file_path not in self._prompt_templates:
+                with open(file_path, "r", encoding="utf-8") as file:
+                    self._prompt_templates[file_path] = file.read().strip()
+            prompt = self._prompt_templates[file_path]
+            try:
+                # formatting prompt
+                prompt = prompt.format(**format_variables)
+            except KeyError as e:
+                self.logger.warning(
+                    f"Prompt formatting error, missing key: {e}. Using original prompt."
+                )
+            except Exception as e:
+                self.logger.error(f"Error occurred while formatting strings: {e}")
+            return prompt
 
         self.logger.error(f"Error, failed to load prompt file from {file_path}")
         return ""
 
+    def _render_prompts(self, input_data: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        根据输入数据渲染系统提示词和用户提示词
+
+        Args:
+            input_data (Dict[str, Any]): 输入数据
+
+        Returns:
+            Tuple[str, str]: (system_prompt, user_prompt)
+        """
+        system_prompt_kwargs = input_data.get("system_prompt_kwargs", {})
+        system_prompt = self._load_prompt_from_file(
+            self.system_prompt_path, **system_prompt_kwargs
+        )
+        user_prompt_kwargs = input_data.get("user_prompt_kwargs", {})
+        user_prompt = self._load_prompt_from_file(
+            self.user_prompt_path, **user_prompt_kwargs
+        )
+        return system_prompt, user_prompt
+
+    def build_packed_prompt(self, user_prompts: List[str]) -> str:
+        """
+        将多条用户提示词打包为一个带编号标签的评判提示词
+
+        示例：
+            build_packed_prompt(["q1", "q2"]) -> "...<item id=1>\nq1\n</item>..."
+
+        Args:
+            user_prompts (List[str]): 每个条目渲染后的用户提示词
+
+        Returns:
+            str: 打包后的用户提示词
+        """
+        blocks = [PACKED_PROMPT_HEADER.format(count=len(user_prompts))]
+        for item_id, user_prompt in enumerate(user_prompts, start=1):
+            blocks.append(f"<item id={item_id}>\n{user_prompt}\n</item>")
+        return "\n\n".join(blocks)
+
+    def split_packed_response(self, response: str) -> Dict[int, str]:
+        """
+        将打包评判的模型输出拆分为每个条目的输出
+
+        Args:
+            response (str): 模型的完整输出
+
+        Returns:
+            Dict[int, str]: 条目编号（从 1 开始）到该条目输出的映射
+        """
+        pattern = r"<item\s+id\s*=\s*[\"']?(\d+)[\"']?\s*>(.*?)</item>"
+        item_responses = {}
+        for item_id, content in re.findall(pattern, response, re.DOTALL | re.IGNORECASE):
+            item_responses[int(item_id)] = content.strip()
+        return item_responses
+
+    @staticmethod
+    def _is_parsed_judgement(judgement: Any) -> bool:
+        """判断提取出的评判结果是否有效（全部字段为 None 视为解析失败）"""
+        if judgement is None:
+            return False
+        if isinstance(judgement, dict) and judgement:
+            return any(value is not None for value in judgement.values())
+        return True
+
+    async def _iter_units(
+        self,
+        data_pool,
+        pack_size: int,
+        prefix_ordering: bool = False,
+    ) -> AsyncIterator[List[Tuple[int, Dict[str, Any], Optional[Tuple[str, str]]]]]:
+        """
+        将数据池划分为调度单元。系统提示词相同的条目按 pack_size 打包，
+        无法打包的条目（缺少 answer 或未配置提示词）单独成为一个单元。
+        数据池可以是异步迭代器，此时未凑满的打包单元会在数据源结束时发出。
+
+        Args:
+            data_pool: 数据池
+            pack_size (int): 每次调用打包的条目数
+            prefix_ordering (bool): 是否按渲染后的提示词前缀排序，
+                使共享前缀的请求相邻发出以命中 prompt cache（仅对 list 等序列生效）
+
+        Yields:
+            List: 每个单元是 (index, input_data, (system_prompt, user_prompt)) 的列表
+        """
+        model_enabled = bool(self.system_prompt_path and self.user_prompt_path)
+        if prefix_ordering and model_enabled and isinstance(data_pool, Sequence):
+            indexed_pool = sorted(
+                enumerate(data_pool), key=lambda item: self._render_prompts(item[1])
+            )
+        else:
+            if prefix_ordering and model_enabled:
+                self.logger.warning("prefix_ordering requires a sequence data pool, skipped.")
+            indexed_pool = aenumerate(data_pool)
+
+        groups: Dict[str, List] = {}
+        async for i, input_data in aiter_items(indexed_pool):
+            if pack_size <= 1 or not model_enabled or not input_data.get("answer"):
+                yield [(i, input_data, None)]
+                continue
+            prompts = self._render_prompts(input_data)
+            group = groups.setdefault(prompts[0], [])
+            group.append((i, input_data, prompts))
+            if len(group) == pack_size:
+                yield group
+                groups[prompts[0]] = []
+
+        for group in groups.values():
+            if group:
+                yield group
+
     def save_result(self, result: Dict[str, Any]) -> None:
         """
-        持续保存单个评测结果到jsonl文件
+        持续保存单个评测结果到jsonl文件，写入格式由 output_data.result_schema 决定
 
         Args:
             result (Dict[str, Any]): 单个评测结果
         """
+        if not self.save_enabled:
+            return
         with self.file_lock:
-            with open(self.experiment_path, "a", encoding="utf-8") as file:
-                file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.result_store.write(result)
             self.results.append(result)
 
+    @property
+    def tokenizer(self):
+        """cl100k_base 编码器，astream 开始时在线程池中加载"""
+        return get_tokenizer()
+
     def count_tokens(self, text: str) -> int:
         """
         计算文本的token数量
@@ -271,20 +424,24 @@ class JudgementPipeline:
         """
         # 如果提供了client参数，则使用它；否则使用实例的client
         client_to_use = client if client is not None else self.client
-        response = await client_to_use.safe_chat_completion(
-            prompt=user_prompt, system_prompt=system_prompt
-        )
+        with self.profiler.stage("api_call"):
+            completion = await client_to_use.safe_chat_completion(
+                prompt=user_prompt, system_prompt=system_prompt, n=1
+            )
+        response = completion[0] if completion else None
 
         # 构造结果字典
         result = {
             "input": input_data,
             "model_response": response,
+            "usage": extract_usage(completion[1]) if completion else None,
             "timestamp": datetime.now().isoformat(),
         }
 
         # 如果提供了评判函数，则处理评判结果
         if judgement_function:
-            result["model_based_judgement"] = judgement_function(response)
+            with self.profiler.stage("extraction"):
+                result["model_based_judgement"] = judgement_function(response)
 
         return result
 
@@ -304,26 +461,28 @@ class JudgementPipeline:
         rule_judgement = {}
 
         # 默认统计信息 - 只统计存在的字段
-        answer = input_data.get("answer", "")
-        if answer:
-            rule_judgement["answer-token-count"] = self.count_tokens(answer)
+        with self.profiler.stage("tokenization"):
+            answer = input_data.get("answer", "")
+            if answer:
+                rule_judgement["answer-token-count"] = self.count_tokens(answer)
 
-        query = input_data.get("query", "")
-        if query:
-            rule_judgement["query-token-count"] = self.count_tokens(query)
+            query = input_data.get("query", "")
+            if query:
+                rule_judgement["query-token-count"] = self.count_tokens(query)
 
-        gt = input_data.get("GT", "")
-        if gt:
-            rule_judgement["GT-token-count"] = self.count_tokens(gt)
+            gt = input_data.get("GT", "")
+            if gt:
+                rule_judgement["GT-token-count"] = self.count_tokens(gt)
 
         # 用户自定义规则函数
         if rule_functions:
-            for key, func in rule_functions.items():
-                try:
-                    rule_judgement[key] = func(input_data)
-                except Exception as e:
-                    self.logger.error(f"Error running rule function {key}: {e}")
-                    rule_judgement[key] = None
+            with self.profiler.stage("rule_functions"):
+                for key, func in rule_functions.items():
+                    try:
+                        rule_judgement[key] = func(input_data)
+                    except Exception as e:
+                        self.logger.error(f"Error running rule function {key}: {e}")
+                        rule_judgement[key] = None
 
         return rule_judgement
 
@@ -334,11 +493,16 @@ class JudgementPipeline:
         model_judgement_function=None,
         rule_functions: Dict[str, Callable] = None,
         client=None,
+        extra_usage: Optional[dict] = None,
     ):
-        """处理单个评判任务"""
+        """
+        处理单个评判任务
+
+        extra_usage 为需要额外计入本条结果的用量，例如全部条目都解析失败的打包调用
+        """
         try:
-            self.logger.debug(f"Processing judgement task {i+1}")
-            self.logger.debug(f"Input data: {input_data}")
+            self.logger.debug("Processing judgement task %s", i + 1)
+            self.logger.debug("Input data: %s", input_data)
 
             # 检查必需字段
             if "answer" not in input_data or not input_data["answer"]:
@@ -347,19 +511,11 @@ class JudgementPipeline:
             # 运行基于模型的评判
             model_judgement = {}
             if self.system_prompt_path and self.user_prompt_path:
-                self.logger.debug("Loading system prompt")
-                system_prompt_kwargs = input_data.get("system_prompt_kwargs", {})
-                system_prompt = self._load_prompt_from_file(
-                    self.system_prompt_path, **system_prompt_kwargs
-                )
-                self.logger.debug(f"System prompt: {system_prompt}")
-
-                self.logger.debug("Loading user prompt")
-                user_prompt_kwargs = input_data.get("user_prompt_kwargs", {})
-                user_prompt = self._load_prompt_from_file(
-                    self.user_prompt_path, **user_prompt_kwargs
-                )
-                self.logger.debug(f"user prompt: {user_prompt}")
+                self.logger.debug("Loading system prompt and user prompt")
+                with self.profiler.stage("prompt_load"):
+                    system_prompt, user_prompt = self._render_prompts(input_data)
+                self.logger.debug("System prompt: %s", system_prompt)
+                self.logger.debug("user prompt: %s", user_prompt)
 
                 model_judgement = await self.run_model_based_judgement(
                     user_prompt=user_prompt,
@@ -368,7 +524,7 @@ class JudgementPipeline:
                     judgement_function=model_judgement_function,
                     client=client,
                 )
-                self.logger.debug(f"Model-based judgement: {model_judgement}")
+                self.logger.debug("Model-based judgement: %s", model_judgement)
             else:
                 self.logger.warning(
                     "System prompt path or user prompt path not set, skipping model-based judgement"
@@ -378,7 +534,7 @@ class JudgementPipeline:
             rule_judgement = await self.run_rule_based_judgement(
                 input_data=input_data, rule_functions=rule_functions
             )
-            self.logger.debug(f"Rule-based judgement: {rule_judgement}")
+            self.logger.debug("Rule-based judgement: %s", rule_judgement)
 
             # 合并结果
             result = {
@@ -387,11 +543,13 @@ class JudgementPipeline:
                     "model_based_judgement", {}
                 ),
                 "rule_based_judgement": rule_judgement,
+                "usage": merge_usage(model_judgement.get("usage"), extra_usage),
                 "timestamp": datetime.now().isoformat(),
             }
 
             # 持续保存结果
-            self.save_result(result)
+            with self.profiler.stage("save_result"):
+                self.save_result(result)
 
             return result
 
@@ -402,49 +560,296 @@ class JudgementPipeline:
                 "error": str(e),
                 "timestamp": datetime.now().isoformat(),
             }
+            if extra_usage:
+                error_result["usage"] = extra_usage
             self.save_result(error_result)
             return error_result
 
-    async def run_all_task(
+    async def run_packed_task(
+        self,
+        unit: List[Tuple[int, Dict[str, Any], Tuple[str, str]]],
+        model_judgement_function=None,
+        rule_functions: Dict[str, Callable] = None,
+        client=None,
+    ) -> List[Dict[str, Any]]:
+        """
+        将多条评判数据打包为一次模型调用，并把输出拆回每条数据的评判结果。
+        解析失败的条目会回退到单条调用。打包调用的用量记录在第一个解析成功的条目上，
+        全部条目都回退时计入第一个回退条目的用量。
+
+        Args:
+            unit: 由 _iter_units 生成的打包单元，每项为 (index, input_data, (system_prompt, user_prompt))
+            model_judgement_function (Callable): 模型评判提取函数
+            rule_functions (Dict): 规则函数字典
+            client: OpenAI客户端实例
+
+        Returns:
+            List[Dict[str, Any]]: 每条数据的评判结果
+        """
+        client_to_use = client if client is not None else self.client
+        system_prompt = unit[0][2][0]
+        packed_prompt = self.build_packed_prompt([prompts[1] for _, _, prompts in unit])
+        self.logger.debug("Packed %s items into one judgement prompt", len(unit))
+
+        with self.profiler.stage("api_call"):
+            completion = await client_to_use.safe_chat_completion(
+                prompt=packed_prompt, system_prompt=system_prompt, n=1
+            )
+        item_responses = (
+            self.split_packed_response(completion[0])
+            if completion and completion[0]
+            else {}
+        )
+        pack_usage = extract_usage(completion[1]) if completion else None
+
+        results = []
+        fallback = []
+        for position, (i, input_data, _) in enumerate(unit, start=1):
+            item_response = item_responses.get(position)
+            judgement = None
+            if item_response is not None:
+                try:
+                    with self.profiler.stage("extraction"):
+                        judgement = (
+                            model_judgement_function(item_response)
+                            if model_judgement_function
+                            else {}
+                        )
+                except Exception as e:
+                    self.logger.error(f"Error extracting packed judgement {i+1}: {e}")
+            if not self._is_parsed_judgement(judgement):
+                fallback.append((i, input_data))
+                continue
+
+            rule_judgement = await self.run_rule_based_judgement(
+                input_data=input_data, rule_functions=rule_functions
+            )
+            result = {
+                "input": input_data,
+                "model_based_judgement": judgement,
+                "rule_based_judgement": rule_judgement,
+                "pack": {"size": len(unit), "position": position},
+                # 打包调用的用量只记录在第一个条目上，避免重复计数
+                "usage": pack_usage if not results else None,
+                "timestamp": datetime.now().isoformat(),
+            }
+            with self.profiler.stage("save_result"):
+                self.save_result(result)
+            results.append(result)
+
+        if fallback:
+            self.logger.warning(
+                f"{len(fallback)}/{len(unit)} packed items failed to parse, falling back to single calls"
+            )
+        # 没有条目解析成功时，打包调用的用量还没有记录
+        unrecorded_usage = pack_usage if not results else None
+        for i, input_data in fallback:
+            results.append(
+                await self.run_single_task(
+                    i, input_data, model_judgement_function, rule_functions, client,
+                    extra_usage=unrecorded_usage,
+                )
+            )
+            unrecorded_usage = None
+        return results
+
+    async def astream(
         self,
         data_pool,
         concurrency_limit: int = 5,
         model_judgement_function: Callable = None,
         rule_functions: Dict[str, Callable] = None,
-    ):
-        sem = asyncio.Semaphore(concurrency_limit)
+        pack_size: int = 1,
+        prefix_ordering: bool = False,
+        scheduler: Optional[FairScheduler] = None,
+        job_name: Optional[str] = None,
+        client: Optional[OpenAIClient] = None,
+        tracker: Optional[ProgressTracker] = None,
+        sequential: Optional[SequentialEvaluation] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        异步生成器接口：按完成顺序逐条产出评判结果，可以在已有事件循环中使用
 
-        async def worker(i, input_data):
-            async with sem:
-                client = OpenAIClient(self.config_for_client)
-                return await self.run_single_task(
-                    i, input_data, model_judgement_function, rule_functions, client
-                )
+        同时在途的请求数不超过 concurrency_limit，且只有调用方取走结果后
+        才会继续读取 data_pool（背压）。data_pool 可以是异步生成器，
+        例如把 DataGenerationPipeline.astream 的结果转换为评判输入后直接传入。
+
+        Args:
+            data_pool: 数据池，list / 可迭代对象 / 异步迭代器
+            concurrency_limit (int): 并发限制数量，默认为5
+            model_judgement_function (Callable): 模型评判函数
+            rule_functions (Dict[str, Callable]): 规则函数字典
+            pack_size (int): 每次模型调用打包评判的条目数，默认为1（不打包）
+            prefix_ordering (bool): 是否按提示词前缀分组调度以命中 prompt cache
+            scheduler (FairScheduler): 多个 pipeline 共享的调度器，默认不使用
+            job_name (str): 在调度器中的作业名称，默认为 "job_name/experiment_name"
+            client (OpenAIClient): 共享的客户端（连接池与速率限制），默认为本次运行新建一个
+            tracker (ProgressTracker): 进度指标收集器，设置后并发上限可以在运行中调整
+            sequential (SequentialEvaluation): 序贯评估，默认按配置中的 sequential 字段创建。
+                开启后按随机顺序评判，达到停止条件后不再发出新请求，只等待在途请求完成
+
+        Yields:
+            Dict[str, Any]: 单条评判结果
+        """
+        job_name = job_name or f"{self.job_name}/{self.experiment_name}"
+        # 规则评判需要分词器：在线程池中预先加载（首次可能需要下载编码），
+        # 不阻塞事件循环，加载失败时在发出任何请求之前报错
+        await asyncio.get_running_loop().run_in_executor(None, get_tokenizer)
+        if sequential is None:
+            sequential = create_sequential(self.config.get("sequential"))
+        self.sequential = sequential
+        if sequential is not None:
+            data_pool = sequential.order(data_pool)
+            if prefix_ordering:
+                self.logger.warning("prefix_ordering is ignored by sequential evaluation, rows are judged in random order.")
+                prefix_ordering = False
+
+        async def worker(unit):
+            if tracker is not None:
+                tracker.task_started(len(unit))
+            async with job_slot(scheduler, job_name):
+                if len(unit) > 1:
+                    return await self.run_packed_task(
+                        unit, model_judgement_function, rule_functions, client
+                    )
+                i, input_data, _ = unit[0]
+                return [
+                    await self.run_single_task(
+                        i, input_data, model_judgement_function, rule_functions, client
+                    )
+                ]
+
+        units = self._iter_units(data_pool, pack_size, prefix_ordering)
+        if sequential is not None:
+            units = sequential.guard(units)
+        results = None
+        try:
+            # 剖析器在 try 内启动，客户端创建失败时也会停止（恢复事件循环的 debug 模式、取消延迟监控）
+            self.profiler.start()
+            with self.profiler.stage("client_creation"):
+                client = client if client is not None else OpenAIClient(self.config_for_client)
+            if self.profiler.enabled:
+                client.profiler = self.profiler
+            limit = concurrency_limit
+            if tracker is not None:
+                tracker.attach_rate_limiter(client.rate_limiter)
+                limit = lambda: tracker.concurrency_limit
+            results = bounded_as_completed(units, worker, limit)
+            async for unit_results in results:
+                for result in unit_results:
+                    if tracker is not None:
+                        tracker.task_finished(result)
+                    if sequential is not None:
+                        sequential.update(result)
+                    yield result
+        finally:
+            if results is not None:
+                # 提前退出时先取消在途任务，避免它们在结果文件关闭后继续写入
+                await results.aclose()
+            self.result_store.close()
+            self.profiler.stop()
+            if sequential is not None:
+                self._save_sequential_summary(sequential)
+
+    def _save_sequential_summary(self, sequential: SequentialEvaluation) -> None:
+        """把序贯评估的估计结果写入实验目录下的 sequential.json"""
+        summary = sequential.summary()
+        self.logger.info(
+            f"Sequential evaluation: stopped={summary['stopped']} ({summary['reason']}), rows={summary['rows']}"
+        )
+        with open(os.path.join(self.experiment_dir, "sequential.json"), "w", encoding="utf-8") as file:
+            json.dump(summary, file, ensure_ascii=False, indent=2)
+
+    async def arun(
+        self,
+        data_pool,
+        concurrency_limit: int = 5,
+        model_judgement_function: Callable = None,
+        rule_functions: Dict[str, Callable] = None,
+        pack_size: int = 1,
+        prefix_ordering: bool = False,
+        scheduler: Optional[FairScheduler] = None,
+        job_name: Optional[str] = None,
+        client: Optional[OpenAIClient] = None,
+        progress: Optional[List[ProgressReporter]] = None,
+        sequential: Optional[SequentialEvaluation] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        异步运行评判管道并收集全部结果，其余参数与 astream 相同
 
-        tasks = [worker(i, x) for i, x in enumerate(data_pool)]
+        Args:
+            progress (List[ProgressReporter]): 进度输出方式，默认按配置中的 progress 字段创建
+
+        Returns:
+            List[Dict[str, Any]]: 按完成顺序排列的评判结果
+        """
         results = []
-        for coro in tqdm(asyncio.as_completed(tasks), total=len(tasks)):
-            results.append(await coro)
+        tracker = ProgressTracker(
+            total=len(data_pool) if isinstance(data_pool, Sized) else None,
+            reporters=(
+                progress
+                if progress is not None
+                else create_reporters(self.config.get("progress"), self.experiment_dir)
+            ),
+            score_field="model_based_judgement",
+            concurrency_limit=concurrency_limit,
+        )
+        tracker.start()
+        try:
+            async for result in self.astream(
+                data_pool,
+                concurrency_limit=concurrency_limit,
+                model_judgement_function=model_judgement_function,
+                rule_functions=rule_functions,
+                pack_size=pack_size,
+                prefix_ordering=prefix_ordering,
+                scheduler=scheduler,
+                job_name=job_name,
+                client=client,
+                tracker=tracker,
+                sequential=sequential,
+            ):
+                results.append(result)
+        finally:
+            tracker.close()
         return results
 
+    async def run_all_task(self, data_pool, concurrency_limit: int = 5, **kwargs):
+        """兼容旧接口，等价于 arun"""
+        return await self.arun(data_pool, concurrency_limit=concurrency_limit, **kwargs)
+
     def run(
         self,
         data_pool,
         concurrency_limit: int = 5,
         model_judgement_function: Callable = None,
         rule_functions: Dict[str, Callable] = None,
+        pack_size: int = 1,
+        prefix_ordering: bool = False,
+        scheduler: Optional[FairScheduler] = None,
+        job_name: Optional[str] = None,
+        progress: Optional[List[ProgressReporter]] = None,
+        sequential: Optional[SequentialEvaluation] = None,
     ):
         """
-        运行评判管道，支持并发处理
+        运行评判管道，支持并发处理（arun 的同步封装，不能在已有事件循环中调用）
 
         Args:
             data_pool: 数据池，包含需要评判的数据
             concurrency_limit (int): 并发限制数量，默认为5
             model_judgement_function (Callable): 模型评判函数
             rule_functions (Dict[str, Callable]): 规则函数字典
+            pack_size (int): 每次模型调用打包评判的条目数，默认为1（不打包）
+            prefix_ordering (bool): 是否按提示词前缀分组调度以命中 prompt cache
+            scheduler (FairScheduler): 多个 pipeline 共享的调度器，默认不使用
+            job_name (str): 在调度器中的作业名称，默认为 "job_name/experiment_name"
+            progress (List[ProgressReporter]): 进度输出方式，默认按配置中的 progress 字段创建
+            sequential (SequentialEvaluation): 序贯评估，默认按配置中的 sequential 字段创建
         """
+        ensure_no_running_loop("pipeline.arun")
         self.logger.info("Starting judgement pipeline")
         self.logger.info(f"Concurrency limit: {concurrency_limit}")
+        self.logger.info(f"Pack size: {pack_size}")
         self.logger.info(f"Total tasks: {len(data_pool)}")
 
         # # 定义执行单个任务的函数
@@ -494,11 +899,17 @@ class JudgementPipeline:
         #     pbar.close()
 
         results = asyncio.run(
-            self.run_all_task(
+            self.arun(
                 data_pool=data_pool,
                 concurrency_limit=concurrency_limit,
                 model_judgement_function=model_judgement_function,
                 rule_functions=rule_functions,
+                pack_size=pack_size,
+                prefix_ordering=prefix_ordering,
+                scheduler=scheduler,
+                job_name=job_name,
+                progress=progress,
+                sequential=sequential,
             )
         )
 
@@ -513,5 +924,11 @@ class JudgementPipeline:
             else:
                 processed_results.append(result)
 
+        cache_usage = summarize_cache_usage(processed_results)
+        self.logger.info(
+            f"Prompt tokens: {cache_usage['prompt_tokens']}, "
+            f"cached tokens: {cache_usage['cached_tokens']} "
+            f"({cache_usage['cache_hit_rate']:.1%})"
+        )
         self.logger.info("Judgement pipeline completed")
         return processed_results
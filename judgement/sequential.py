@@ -0,0 +1,374 @@
+"""
+评判的序贯评估（提前停止）
+"""
+
+import math
+import random
+from collections.abc import Sequence
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from utils.field_access import compile_path
+from utils.logger_config import get_logger
+
+logger = get_logger(name="judgement_sequential", log_file="judgement_sequential.log")
+
+SEQUENTIAL_METHODS = ("bernstein", "asymptotic", "hoeffding")
+# 不分组时所有结果归入的组名
+ALL_ROWS = "all"
+# 经验 Bernstein 置信序列中单步权重的上限
+MAX_BERNSTEIN_WEIGHT = 0.5
+
+
+class EmpiricalBernstein:
+    """
+    取值在 [low, high] 内的评分均值的经验 Bernstein 置信序列（predictable plug-in 构造）
+
+    每条评分按此前的方差估计分配权重，方差估计带有一个取最大方差的先验样本，
+    因此前几条评分完全相同时区间也不会收缩为一个点。对有界评分严格成立，
+    方差小时比 Hoeffding 紧得多；区间取历史交集，只会收窄。
+    """
+
+    __slots__ = ("low", "scale", "_log_term", "n", "_sum", "_squares",
+                 "_weights", "_weighted", "_penalty", "lower", "upper")
+
+    def __init__(self, alpha: float, low: float, high: float):
+        """
+        Args:
+            alpha (float): 双侧的犯错概率
+            low (float): 评分下界
+            high (float): 评分上界
+        """
+        self.low = low
+        self.scale = high - low
+        self._log_term = math.log(2 / alpha)
+        self.n = 0
+        self._sum = 0.0
+        self._squares = 0.0
+        self._weights = 0.0
+        self._weighted = 0.0
+        self._penalty = 0.0
+        # 归一化到 [0, 1] 后的区间
+        self.lower = 0.0
+        self.upper = 1.0
+
+    def add(self, value: float) -> None:
+        # 超出范围的评分截断到边界
+        x = min(1.0, max(0.0, (value - self.low) / self.scale))
+        t = self.n + 1
+        mean = (0.5 + self._sum) / t
+        variance = (0.25 + self._squares) / t
+        weight = min(
+            math.sqrt(2 * self._log_term / (variance * t * math.log(1 + t))),
+            MAX_BERNSTEIN_WEIGHT,
+        )
+        self._weights += weight
+        self._weighted += weight * x
+        self._penalty += (x - mean) ** 2 * (-math.log(1 - weight) - weight)
+        self.n = t
+        self._sum += x
+        self._squares += (x - (0.5 + self._sum) / (t + 1)) ** 2
+
+        center = self._weighted / self._weights
+        radius = (self._log_term + self._penalty) / self._weights
+        self.lower = max(self.lower, center - radius)
+        self.upper = min(self.upper, center + radius)
+
+    def interval(self) -> Tuple[float, float]:
+        lower = min(self.lower, self.upper)
+        return self.low + lower * self.scale, self.low + self.upper * self.scale
+
+
+class RunningMean:
+    """单个评分的在线均值和方差（Welford 算法），bernstein 方法下同时维护置信序列"""
+
+    __slots__ = ("n", "mean", "_m2", "bound")
+
+    def __init__(self, bound: Optional[EmpiricalBernstein] = None):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.bound = bound
+
+    def add(self, value: float) -> None:
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (value - self.mean)
+        if self.bound is not None:
+            self.bound.add(value)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.n - 1) if self.n > 1 else 0.0
+
+
+class SequentialEvaluation:
+    """
+    序贯评估：按随机顺序评判，实时维护各评分均值的置信序列，达到精度或显著性后停止调度新请求
+
+    置信序列（confidence sequence）在任意时刻同时成立，因此每来一条结果都检查一次停止条件，
+    不会像反复查看普通置信区间那样抬高犯错概率。
+
+    - bernstein: 经验 Bernstein 置信序列，对取值在 score_range 内的评分严格成立（设置 score_range 时默认）
+    - asymptotic: 正态混合边界，n 条结果后的半径为 sigma / n * sqrt((n + k) * log((n + k) / (k * alpha^2)))，
+      sigma 取样本标准差，k 由 target_rows 决定，使边界在该行数附近最紧。只是渐近成立，
+      评分还没有出现不同取值（样本方差为 0）时不给出区间（未设置 score_range 时默认）
+    - hoeffding: 同样的正态混合边界，sigma 取 (high - low) / 2，严格成立但较保守
+
+    停止条件（满足任意一个即停止，每组至少 min_rows 条后才检查）：
+    - precision: 所有组、所有字段的置信区间半宽都不超过 precision
+    - 显著性: 设置 group_by 且恰好有两组时，所有字段的两组均值之差的置信区间都不包含 0
+      （不要求配对；分组时每组的置信序列都在 alpha / 2 水平下构造）
+    """
+
+    def __init__(
+        self,
+        fields: Optional[List[str]] = None,
+        confidence: float = 0.95,
+        precision: Optional[float] = None,
+        group_by: Optional[str] = None,
+        min_rows: int = 30,
+        target_rows: int = 1000,
+        method: Optional[str] = None,
+        score_range: Optional[Tuple[float, float]] = None,
+        seed: Optional[int] = 0,
+    ):
+        """
+        Args:
+            fields (Optional[List[str]]): model_based_judgement 中参与停止判断的评分字段，None 表示所有数值字段
+            confidence (float): 置信水平
+            precision (Optional[float]): 置信区间半宽达到该值时停止，None 表示不按精度停止
+            group_by (Optional[str]): 分组字段路径，如 "input.meta_info.model_name"，两组时按显著性停止
+            min_rows (int): 每组至少需要的有效评分数
+            target_rows (int): asymptotic / hoeffding 边界最紧的行数，通常取预计停止时的行数
+            method (Optional[str]): bernstein / asymptotic / hoeffding，None 表示按是否设置 score_range 选择
+            score_range (Optional[Tuple[float, float]]): 评分的取值范围，bernstein / hoeffding 必需
+            seed (Optional[int]): 打乱数据顺序的随机种子，None 表示不固定
+        """
+        if method is None:
+            method = "bernstein" if score_range is not None else "asymptotic"
+        if method not in SEQUENTIAL_METHODS:
+            raise ValueError(f"Unknown sequential method {method!r}, expected one of {SEQUENTIAL_METHODS}")
+        if method != "asymptotic" and score_range is None:
+            raise ValueError(f"score_range is required by the {method} method")
+        if score_range is not None and not score_range[0] < score_range[1]:
+            raise ValueError("score_range must be (low, high) with low < high")
+        if not 0 < confidence < 1:
+            raise ValueError("confidence must be between 0 and 1")
+        if precision is None and group_by is None:
+            raise ValueError("Set precision or group_by, otherwise the evaluation never stops early")
+        self.fields = list(fields) if fields else None
+        self.confidence = confidence
+        self.precision = precision
+        self.group_by = group_by
+        self.min_rows = max(2, min_rows)
+        self.target_rows = target_rows
+        self.method = method
+        self.score_range = tuple(score_range) if score_range is not None else None
+        self.seed = seed
+        self._group_of = compile_path(group_by) if group_by else None
+        # 分组时两组的置信序列各占一半的犯错概率，差值的区间由两者组合得到
+        self.alpha = (1 - confidence) / (2 if group_by else 1)
+
+        self.rows = 0
+        self.stopped = False
+        self.reason: Optional[str] = None
+        self.estimates: Dict[str, Dict[str, RunningMean]] = {}
+
+    def _new_estimate(self) -> RunningMean:
+        if self.method == "bernstein":
+            return RunningMean(EmpiricalBernstein(self.alpha, *self.score_range))
+        return RunningMean()
+
+    def _interval(self, estimate: RunningMean) -> Optional[Tuple[float, float]]:
+        """均值的置信区间，数据不足以给出区间时返回 None"""
+        n = estimate.n
+        if n < 2:
+            return None
+        if estimate.bound is not None:
+            return estimate.bound.interval()
+        if self.method == "hoeffding":
+            sigma = (self.score_range[1] - self.score_range[0]) / 2
+        else:
+            sigma = math.sqrt(estimate.variance)
+            if sigma == 0:
+                # 样本方差为 0 时渐近边界没有意义，等出现不同取值后再给出区间
+                return None
+        log_alpha = math.log(1 / self.alpha)
+        k = self.target_rows / (2 * log_alpha + math.log(1 + 2 * log_alpha))
+        radius = sigma / n * math.sqrt((n + k) * math.log((n + k) / (k * self.alpha ** 2)))
+        return estimate.mean - radius, estimate.mean + radius
+
+    def order(self, data_pool):
+        """
+        按随机顺序排列数据池，使任意时刻已评判的部分都是全体的随机样本
+
+        Args:
+            data_pool: 数据池
+
+        Returns:
+            打乱后的 list；数据池不是序列（例如异步生成器）时原样返回
+        """
+        if not isinstance(data_pool, Sequence):
+            logger.warning("Sequential evaluation needs a sequence data pool to sample in random order, "
+                           "rows are judged in arrival order.")
+            return data_pool
+        rows = list(data_pool)
+        random.Random(self.seed).shuffle(rows)
+        return rows
+
+    async def guard(self, units: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """
+        停止后不再产出新的调度单元，已在途的请求照常完成
+
+        Args:
+            units: 调度单元的异步迭代器
+
+        Yields:
+            调度单元
+        """
+        async for unit in units:
+            if self.stopped:
+                return
+            yield unit
+
+    def update(self, result: Dict[str, Any]) -> bool:
+        """
+        加入一条评判结果并检查停止条件，错误结果和无法转换为数值的评分会被跳过
+
+        Args:
+            result (Dict[str, Any]): 评判结果
+
+        Returns:
+            bool: 是否已经停止
+        """
+        self.rows += 1
+        judgement = result.get("model_based_judgement")
+        if "error" in result or not isinstance(judgement, dict):
+            return self.stopped
+        group = str(self._group_of(result)) if self._group_of else ALL_ROWS
+        estimates = self.estimates.setdefault(group, {})
+        for field in self.fields or judgement:
+            value = judgement.get(field)
+            if value is None or isinstance(value, bool):
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if math.isfinite(value):
+                if field not in estimates:
+                    estimates[field] = self._new_estimate()
+                estimates[field].add(value)
+        if not self.stopped:
+            self._check()
+        return self.stopped
+
+    def _ready_fields(self) -> Optional[List[str]]:
+        """所有组都有至少 min_rows 条评分的字段，任何一组还不够时返回 None"""
+        fields = self.fields or sorted({field for group in self.estimates.values() for field in group})
+        if not self.estimates or not fields:
+            return None
+        for group in self.estimates.values():
+            for field in fields:
+                if field not in group or group[field].n < self.min_rows:
+                    return None
+        return fields
+
+    def _check(self) -> None:
+        fields = self._ready_fields()
+        if fields is None:
+            return
+        if self.precision is not None and all(
+            self._within_precision(group[field])
+            for group in self.estimates.values()
+            for field in fields
+        ):
+            self._stop("precision")
+        elif self.group_by and len(self.estimates) == 2 and all(
+            self._difference(field)["significant"] for field in fields
+        ):
+            self._stop("significance")
+
+    def _within_precision(self, estimate: RunningMean) -> bool:
+        interval = self._interval(estimate)
+        return interval is not None and (interval[1] - interval[0]) / 2 <= self.precision
+
+    def _stop(self, reason: str) -> None:
+        self.stopped = True
+        self.reason = reason
+        logger.info(f"Sequential evaluation stopped by {reason} after {self.rows} rows")
+
+    def _difference(self, field: str) -> Dict[str, Any]:
+        """两组（按组名排序，第二组减第一组）均值之差的置信区间"""
+        (first, a), (second, b) = sorted(self.estimates.items())
+        report = {"baseline": first, "candidate": second, "diff": None,
+                  "low": None, "high": None, "significant": False}
+        if field not in a or field not in b:
+            return report
+        report["diff"] = b[field].mean - a[field].mean
+        baseline = self._interval(a[field])
+        candidate = self._interval(b[field])
+        if baseline is None or candidate is None:
+            return report
+        low = candidate[0] - baseline[1]
+        high = candidate[1] - baseline[0]
+        report.update(low=low, high=high, significant=low > 0 or high < 0)
+        return report
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        当前的估计结果
+
+        Returns:
+            Dict[str, Any]: stopped、reason、rows、每组每个字段的 n / mean / low / high
+                （还不能给出区间时为 None），两组时还包含 difference
+        """
+        estimates = {}
+        for group, fields in self.estimates.items():
+            estimates[group] = {}
+            for field, estimate in fields.items():
+                interval = self._interval(estimate) or (None, None)
+                estimates[group][field] = {
+                    "n": estimate.n,
+                    "mean": estimate.mean,
+                    "low": interval[0],
+                    "high": interval[1],
+                }
+        report = {
+            "stopped": self.stopped,
+            "reason": self.reason,
+            "rows": self.rows,
+            "confidence": self.confidence,
+            "method": self.method,
+            "estimates": estimates,
+        }
+        if self.group_by and len(self.estimates) == 2:
+            fields = self.fields or sorted(
+                set.intersection(*(set(group) for group in self.estimates.values()))
+            )
+            report["difference"] = {field: self._difference(field) for field in fields}
+        return report
+
+
+def create_sequential(sequential_config: Optional[Dict[str, Any]]) -> Optional[SequentialEvaluation]:
+    """
+    根据配置中的 sequential 字段创建序贯评估
+
+    示例配置：
+        sequential:
+          enabled: true
+          fields: [overall]
+          precision: 0.1
+          group_by: input.meta_info.model_name
+          score_range: [1, 10]
+
+    Args:
+        sequential_config (Optional[Dict[str, Any]]): 配置中的 sequential 字段
+
+    Returns:
+        Optional[SequentialEvaluation]: 未开启时返回 None
+    """
+    sequential_config = dict(sequential_config or {})
+    if not sequential_config.pop("enabled", False):
+        return None
+    return SequentialEvaluation(**sequential_config)
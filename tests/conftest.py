@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+# 直接运行 pytest 时也能导入仓库根目录下的包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.helpers import FakeTokenizer, write_config  # noqa: E402
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    """不读取 .env，不加载 tiktoken"""
+    from utils import llm_client
+    import judgement.pipeline
+    import workflow.pipeline
+
+    monkeypatch.setattr(llm_client, "_env_loaded", True)
+    for module in (judgement.pipeline, workflow.pipeline):
+        monkeypatch.setattr(module, "get_tokenizer", lambda *args: FakeTokenizer())
+
+
+@pytest.fixture
+def judgement_pipeline(tmp_path, offline):
+    """创建 JudgementPipeline 的工厂，额外的关键字参数作为配置中的顶层字段"""
+    from judgement.pipeline import JudgementPipeline
+
+    def create(prompts=True, **sections):
+        config_path = write_config(tmp_path / "judgement.yaml", prompts=prompts, **sections)
+        return JudgementPipeline("job", "test", config_path=config_path)
+
+    return create
+
+
+@pytest.fixture
+def generation_pipeline(tmp_path, offline):
+    """创建 DataGenerationPipeline 的工厂，额外的关键字参数作为配置中的顶层字段"""
+    from data_generation.pipeline import DataGenerationPipeline
+
+    def create(**sections):
+        config_path = write_config(tmp_path / "generation.yaml", kind="generation", **sections)
+        return DataGenerationPipeline(config_path=config_path)
+
+    return create
@@ -0,0 +1,91 @@
+"""测试共用的替身对象和数据"""
+
+import asyncio
+import os
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeTokenizer:
+    """按空白切分的分词器，测试中代替 tiktoken"""
+
+    def encode(self, text):
+        return text.split()
+
+
+class FakeClient:
+    """
+    代替 OpenAIClient：按 responder(prompt, system_prompt) 返回响应文本，记录每次调用
+
+    responder 返回 None 时模拟请求失败，usage 为每次响应中的用量
+    """
+
+    def __init__(self, responder, delay=0.0, usage=None):
+        self.responder = responder
+        self.delay = delay
+        self.usage = usage or {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        self.calls = []
+        self.rate_limiter = None
+        # 组合 pipeline 判断两个阶段能否共享连接池时读取
+        self.client = None
+
+    async def safe_chat_completion(self, prompt, system_prompt=None, timeout=3600, n=None):
+        self.calls.append({"prompt": prompt, "system_prompt": system_prompt, "n": n})
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        content = self.responder(prompt, system_prompt)
+        if content is None:
+            return None
+        usage = self.usage
+        if isinstance(content, list):
+            choices = [{"index": i, "message": {"content": c}, "finish_reason": "stop"} for i, c in enumerate(content)]
+        else:
+            choices = [{"index": 0, "message": {"content": content}, "finish_reason": "stop"}]
+        return content, {"usage": usage, "choices": choices}
+
+
+def write_config(path, prompts=True, kind="judgement", **sections):
+    """写入测试用的 pipeline 配置（kind 为 judgement 或 generation），返回配置文件路径"""
+    config = {
+        "model": {"api_key": "test", "base_url": "http://localhost", "model": "test-model", "rate_limit": 1000},
+        "output_data": {"output_dir": os.path.join(os.path.dirname(path), "output"),
+                        "experiment_name": "test", "need_time_stamp": False},
+        "progress": {"terminal": False},
+    }
+    if prompts:
+        name = "default.prompt_evaluation.txt" if kind == "judgement" else "default.prompt.txt"
+        config["prompts"] = {
+            "system_prompt_path": os.path.join(ROOT, "prompt/system_prompts", name),
+            "user_prompt_path": os.path.join(ROOT, "prompt/user_prompts", name),
+        }
+    config.update(sections)
+    with open(path, "w", encoding="utf-8") as file:
+        yaml.safe_dump(config, file)
+    return str(path)
+
+
+def judge_rows(count, **extra):
+    """评判输入：每条带有 answer 和渲染默认评判提示词需要的参数"""
+    return [
+        {
+            "answer": f"answer {i}",
+            "query": f"question {i}",
+            "user_prompt_kwargs": {"question": f"question {i}", "reference_answer": "ref", "model_response": f"answer {i}"},
+            **extra,
+        }
+        for i in range(count)
+    ]
+
+
+def generation_rows(count, **extra):
+    """生成输入：渲染默认生成提示词需要的参数"""
+    return [
+        {
+            "system_prompt_kwargs": {"tone": "plain"},
+            "user_prompt_kwargs": {"topic": f"topic {i}", "word_count": 10},
+            **extra,
+        }
+        for i in range(count)
+    ]
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from judgement.compare import JudgementComparison
+from utils.records import hash_input, hash_query
+from utils.result_store import ResultStore
+
+
+def _judgement(i, model, score):
+    return {
+        "input": {
+            "query": f"question {i}",
+            "answer": f"{model} answer {i}",
+            "meta_info": {"model_name": model},
+            "user_prompt_kwargs": {"question": f"question {i}", "model_response": f"{model} answer {i}"},
+        },
+        "model_based_judgement": {"overall": score},
+    }
+
+
+def _write(path, rows, schema="full"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    store = ResultStore(path, schema=schema)
+    for row in rows:
+        store.write(row)
+    store.close()
+    return path
+
+
+def test_hash_query_ignores_model_specific_fields():
+    a = _judgement(1, "a", 0)["input"]
+    b = _judgement(1, "b", 0)["input"]
+    assert hash_input(a) != hash_input(b)
+    assert hash_query(a) == hash_query(b)
+    assert hash_query(a) != hash_query(_judgement(2, "a", 0)["input"])
+    # 原始输入不被修改
+    assert a["user_prompt_kwargs"]["model_response"] == "a answer 1"
+
+
+@pytest.mark.parametrize("schema", ["full", "compact"])
+def test_compare_pairs_two_models_on_the_same_queries(tmp_path, schema):
+    baseline = _write(str(tmp_path / "a" / "result.jsonl"), [_judgement(i, "a", 5) for i in range(50)], schema)
+    candidate = _write(str(tmp_path / "b" / "result.jsonl"),
+                       [_judgement(i, "b", 6 + i % 2) for i in range(50)] + [{"input": {"query": "x"}, "error": "boom"}],
+                       schema)
+    report = JudgementComparison(n_resamples=200).compare(baseline, candidate, ["model_based_judgement.overall"])
+    assert report["paired_rows"] == 50
+    paired = report["fields"]["model_based_judgement.overall"]["paired"]
+    assert paired["mean_diff"] == pytest.approx(1.5)
+    assert (paired["wins"], paired["ties"], paired["losses"]) == (50, 0, 0)
+
+
+def test_whole_input_key_pairs_nothing_across_models(tmp_path):
+    baseline = _write(str(tmp_path / "a" / "result.jsonl"), [_judgement(i, "a", 5) for i in range(5)])
+    candidate = _write(str(tmp_path / "b" / "result.jsonl"), [_judgement(i, "b", 5) for i in range(5)])
+    comparison = JudgementComparison(n_resamples=50, key_function=hash_input)
+    report = comparison.compare(baseline, candidate, ["model_based_judgement.overall"])
+    assert report["paired_rows"] == 0
+    assert report["fields"]["model_based_judgement.overall"]["paired"]["n"] == 0
+
+
+def test_bootstrap_ci_contains_mean():
+    comparison = JudgementComparison(n_resamples=500)
+    ci = comparison.bootstrap_ci([1, 2, 3, 4, 5] * 20)
+    assert ci["n"] == 100 and ci["low"] < ci["mean"] == 3 < ci["high"]
+    assert comparison.bootstrap_ci([])["mean"] is None
+    with pytest.raises(ValueError):
+        comparison.paired_bootstrap([1, 2], [1])
@@ -0,0 +1,123 @@
+import json
+import os
+import time
+
+import pytest
+
+from utils.compression import compressed_path, detect_compression, frame_compressor, iter_frames, iter_lines
+from utils.incremental_stats import IncrementalStats
+from utils.result_index import ResultIndex
+from utils.result_store import ResultStore
+
+
+@pytest.fixture(params=["gzip", "zstd"])
+def compression(request):
+    if request.param == "zstd":
+        pytest.importorskip("zstandard")
+    return request.param
+
+
+def _frame(compression, *keys):
+    data = "".join(json.dumps({"key": key, "score": len(key)}) + "\n" for key in keys)
+    return frame_compressor(compression)(data.encode("utf-8"))
+
+
+def _write(path, *frames):
+    with open(path, "ab") as file:
+        for frame in frames:
+            file.write(frame)
+
+
+def _frames(path, compression):
+    """每帧的行数"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb") as file:
+        return [data.count(b"\n") for _, _, data in iter_frames(file, compression)]
+
+
+def test_paths_and_detection():
+    assert compressed_path("result.jsonl", "gzip") == "result.jsonl.gz"
+    assert compressed_path("result.jsonl.zst", "zstd") == "result.jsonl.zst"
+    assert compressed_path("result.jsonl", None) == "result.jsonl"
+    assert detect_compression("result.jsonl.zst") == "zstd"
+    assert detect_compression("result.jsonl") is None
+    with pytest.raises(ValueError):
+        compressed_path("result.jsonl", "bz2")
+
+
+def test_iter_frames_stops_before_truncated_tail(tmp_path, compression):
+    path = tmp_path / "result.jsonl"
+    first, second, third = _frame(compression, "a", "b"), _frame(compression, "c"), _frame(compression, "d")
+    _write(path, first, second, third[: len(third) // 2])
+
+    with open(path, "rb") as file:
+        frames = list(iter_frames(file, compression))
+        assert [(start, end) for start, end, _ in frames] == [
+            (0, len(first)), (len(first), len(first) + len(second))
+        ]
+        assert frames[1][2] == b'{"key": "c", "score": 1}\n'
+        # 从帧边界续读
+        assert [data for _, _, data in iter_frames(file, compression, len(first))] == [frames[1][2]]
+
+
+def test_iter_lines_ignores_truncated_tail(tmp_path, compression):
+    path = tmp_path / "result.jsonl"
+    third = _frame(compression, "d" * 200)
+    _write(path, _frame(compression, "a", "b"), _frame(compression, "c"), third[: len(third) // 2])
+    path = path.rename(compressed_path(str(path), compression))
+
+    keys = [json.loads(line)["key"] for line in iter_lines(str(path)) if line.endswith("\n")]
+    assert keys == ["a", "b", "c"]
+
+
+def test_incremental_stats_reads_compressed_frames(tmp_path, compression):
+    path = tmp_path / compressed_path("result.jsonl", compression)
+    last = _frame(compression, "dddd")
+    _write(path, _frame(compression, "a", "bb"), last[:-4])
+
+    stats = IncrementalStats(str(path), numeric_fields=["score"]).update()
+    assert stats["total_count"] == 2
+
+    _write(path, last[-4:], _frame(compression, "eeeee"))
+    stats = IncrementalStats(str(path), numeric_fields=["score"]).update()
+    assert stats["total_count"] == 4
+    assert stats["numeric_stats"]["score"]["total"] == 12
+
+
+def test_result_index_reads_rows_inside_frames(tmp_path, compression):
+    path = tmp_path / compressed_path("result.jsonl", compression)
+    last = _frame(compression, "d")
+    _write(path, _frame(compression, "a", "b"), _frame(compression, "c"), last[:-4])
+
+    with ResultIndex(str(path)) as index:
+        assert len(index) == 3
+        assert index.get(1) == {"key": "b", "score": 1}
+        assert index.get_by_key("c") == {"key": "c", "score": 1}
+        _write(path, last[-4:])
+        assert index.refresh() == 1
+        assert index.get(-1) == {"key": "d", "score": 1}
+
+
+def test_result_store_flushes_idle_buffer(tmp_path, compression):
+    store = ResultStore(str(tmp_path / "result.jsonl"), compression=compression, frame_rows=100, flush_interval=0.05)
+    store.write({"key": "a"})
+    store.write({"key": "b"})
+    assert _frames(store.result_path, compression) == []
+
+    # 没有新的写入，定时器到期后也会写出一帧
+    time.sleep(0.2)
+    assert _frames(store.result_path, compression) == [2]
+    store.write({"key": "c"})
+    store.close()
+    assert _frames(store.result_path, compression) == [2, 1]
+    assert store._flush_timer is None
+
+
+def test_result_store_writes_full_frames_without_waiting(tmp_path, compression):
+    store = ResultStore(str(tmp_path / "result.jsonl"), compression=compression, frame_rows=2, flush_interval=60)
+    for key in "abcde":
+        store.write({"key": key})
+    assert _frames(store.result_path, compression) == [2, 2]
+    store.close()
+    assert [json.loads(line)["key"] for line in iter_lines(store.result_path)] == list("abcde")
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+import workflow.pipeline
+from data_generation.dedup import LSHIndex, MinHasher, NearDuplicateFilter
+from tests.helpers import FakeClient, generation_rows
+from workflow.pipeline import GenerateJudgePipeline
+
+DROP = {"enabled": True, "mode": "drop", "capacity": 1000}
+MODEL = {"api_key": "test", "base_url": "http://localhost", "model": "test-model", "rate_limit": 1000}
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+async def _consume(stream):
+    return [row async for row in stream]
+
+
+def test_minhash_numpy_matches_pure_python():
+    pytest.importorskip("numpy")
+    vectorized = MinHasher(num_perm=32)
+    pure = MinHasher(num_perm=32)
+    pure._numpy = None
+    for text in ("short", "The quick brown fox jumps over the lazy dog", "近重复检测" * 10):
+        assert vectorized.signature(text) == pure.signature(text)
+
+
+def test_lsh_index_overwrites_oldest_signature_when_full():
+    hasher = MinHasher(num_perm=64)
+    index = LSHIndex(threshold=0.8, num_perm=64, capacity=2)
+    texts = [f"completely different sentence number {i} " * 3 for i in ("one", "two", "three")]
+    for i, text in enumerate(texts):
+        index.insert(hasher.signature(text), bytes([i]) * 16)
+    assert index.size == 2 and index.inserted == 3
+    assert index.query(hasher.signature(texts[0])) is None
+    key, similarity = index.query(hasher.signature(texts[2]))
+    assert key == bytes([2]) * 16 and similarity == 1.0
+
+
+def _word_texts(count, seed=0, words=40):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(5000)]
+    return [[rng.choice(vocabulary) for _ in range(words)] for _ in range(count)], rng, vocabulary
+
+
+def _exact_jaccard(hasher, first, second):
+    first, second = set(hasher.shingles(first)), set(hasher.shingles(second))
+    return len(first & second) / len(first | second)
+
+
+def test_lsh_index_matches_collision_free_lsh_and_exact_jaccard():
+    hasher = MinHasher(num_perm=64)
+    # 容量小于插入数：环形缓冲区会覆盖最早的签名，各段哈希表的负载接近 0.5，桶冲突很多
+    index = LSHIndex(threshold=0.8, num_perm=64, capacity=300)
+    texts, rng, vocabulary = _word_texts(500)
+    signatures = [hasher.signature(" ".join(words)) for words in texts]
+    for i, signature in enumerate(signatures):
+        index.insert(signature, i.to_bytes(16, "big"))
+    assert index.size == 300 and index.allocated == 300
+
+    def band_keys(signature):
+        return {(band, tuple(signature[band * index.rows:(band + 1) * index.rows])) for band in range(index.bands)}
+
+    kept = range(200, 500)
+    stored = {j: band_keys(signatures[j]) for j in kept}
+    recalled = similar = 0
+    for i in range(500):
+        words = list(texts[i])
+        for _ in range(rng.choice((1, 2, 3))):
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)
+        variant = " ".join(words)
+        signature = hasher.signature(variant)
+
+        # 没有桶冲突的 LSH：与任一段完全相同的保留签名都是候选
+        keys = band_keys(signature)
+        candidates = [j for j in kept if keys & stored[j]]
+        scores = {j: sum(x == y for x, y in zip(signature, signatures[j])) / 64 for j in candidates}
+        best = max(scores, key=scores.get, default=None)
+        match = index.query(signature)
+        if best is None or scores[best] < index.threshold:
+            assert match is None
+        else:
+            assert match == (best.to_bytes(16, "big"), scores[best])
+
+        if i in kept and _exact_jaccard(hasher, " ".join(texts[i]), variant) >= 0.9:
+            similar += 1
+            recalled += match is not None and match[0] == i.to_bytes(16, "big")
+    assert similar > 100 and recalled / similar >= 0.95
+
+
+def test_lsh_index_grows_lazily():
+    hasher = MinHasher(num_perm=64)
+    index = LSHIndex(threshold=0.8, num_perm=64, capacity=1_000_000)
+    empty = index.memory_bytes
+    assert index.allocated == LSHIndex.INITIAL_SLOTS and empty < 1024 * 1024
+    texts, _, _ = _word_texts(LSHIndex.INITIAL_SLOTS + 1, seed=1, words=20)
+    for i, words in enumerate(texts):
+        index.insert(hasher.signature(" ".join(words)), i.to_bytes(16, "big"))
+    assert index.allocated == 2 * LSHIndex.INITIAL_SLOTS and index.memory_bytes == 2 * empty
+    for i in (0, LSHIndex.INITIAL_SLOTS):
+        assert index.query(hasher.signature(" ".join(texts[i]))) == (i.to_bytes(16, "big"), 1.0)
+
+
+def test_filter_flags_near_duplicates_and_exhausts_prompt():
+    dedup = NearDuplicateFilter(capacity=100, max_duplicates_per_prompt=1)
+    first = {"input": {"q": 1}, "response": "the same generated answer " * 4}
+    second = {"input": {"q": 2}, "response": "the same generated answer " * 4}
+    assert dedup.check(first) is None
+    assert dedup.check(second)["similarity"] == 1.0
+    assert dedup.exhausted({"q": 2}) and not dedup.exhausted({"q": 1})
+    assert dedup.check({"input": {"q": 3}, "error": "failed"}) is None
+
+
+def test_drop_mode_marks_dropped_rows_as_skipped(generation_pipeline):
+    pipeline = generation_pipeline(dedup=DROP)
+    client = FakeClient(lambda prompt, system: "identical output " * 5)
+    results = asyncio.run(_consume(pipeline.astream(generation_rows(3), concurrency_limit=1, client=client)))
+
+    skipped = [result for result in results if "skipped" in result]
+    assert len(skipped) == 2
+    assert all(result["skipped"] == "near_duplicate" and "near_duplicate" in result for result in skipped)
+    assert len(_read_jsonl(pipeline.experiment_path)) == 1
+
+
+def test_duplicate_limit_skips_requests(generation_pipeline):
+    pipeline = generation_pipeline(dedup=dict(DROP, mode="flag", max_duplicates_per_prompt=1))
+    client = FakeClient(lambda prompt, system: "identical output " * 5)
+    rows = generation_rows(1) * 4
+    results = asyncio.run(_consume(pipeline.astream(rows, concurrency_limit=1, client=client)))
+
+    assert [result.get("skipped") for result in results] == [None, None, "near_duplicate_limit", "near_duplicate_limit"]
+    assert len(client.calls) == 2
+    assert len(_read_jsonl(pipeline.experiment_path)) == 2
+
+
+def test_best_of_n_never_returns_a_dropped_sample(generation_pipeline):
+    pipeline = generation_pipeline(dedup=DROP, model=dict(MODEL, n=3))
+    outputs = ["identical output " * 5, "identical output " * 5, "a completely unrelated answer about birds"]
+    client = FakeClient(lambda prompt, system: outputs)
+    results = asyncio.run(_consume(pipeline.astream(
+        generation_rows(1), client=client, score_function=lambda sample: len(sample["response"])
+    )))
+
+    result = results[0]
+    assert "skipped" not in result and result["sample"]["best"]
+    assert result["sample"]["index"] == 0
+    assert [sample.get("skipped") for sample in result["samples"]] == [None, "near_duplicate", None]
+    saved = _read_jsonl(pipeline.experiment_path)
+    assert [row["sample"]["index"] for row in saved] == [0, 2]
+    assert sum(row["usage"] is not None for row in saved) == 1
+
+
+def test_workflow_does_not_judge_or_save_dropped_rows(generation_pipeline, judgement_pipeline, monkeypatch):
+    generation_client = FakeClient(lambda prompt, system: "identical output " * 5)
+    judgement_client = FakeClient(lambda prompt, system: "<overall>7</overall>")
+    created = iter([generation_client, judgement_client])
+    monkeypatch.setattr(workflow.pipeline, "OpenAIClient", lambda *args, **kwargs: next(created))
+    generation = generation_pipeline(dedup=DROP)
+    judge = judgement_pipeline()
+    fused = GenerateJudgePipeline(generation, judge, to_judge_input=lambda result: {"answer": result["response"]})
+
+    records = asyncio.run(_consume(fused.astream(
+        generation_rows(3), generation_concurrency=1, model_judgement_function=judge.make_judgement_extractor()
+    )))
+
+    assert len(records) == 1
+    assert len(judgement_client.calls) == 1
+    assert len(_read_jsonl(fused.output_path)) == 1
@@ -0,0 +1,44 @@
+from data_generation.stats import DataGenerationStats
+from judgement.stats import JudgementStats
+from utils import field_access
+from utils.field_access import compile_fields, compile_path, register_derived_field
+
+
+def test_real_key_shadows_derived_field():
+    row = {"model_based_judgement": {"length": 7, "overall": 3}, "response": "abcd"}
+    assert compile_path("model_based_judgement.length")(row) == 7
+    assert compile_path("response.length")(row) == 4
+    assert compile_fields(
+        ["model_based_judgement.length", "model_based_judgement.overall", "response.length"]
+    )(row) == [7, 3, 4]
+
+
+def test_derived_field_fallback_and_missing_values():
+    row = {"answer": "", "items": [1, 2, 3], "nested": {"a": {"b": 5}}}
+    assert compile_path("items.length")(row) == 3
+    assert compile_path("answer.length")(row) is None
+    assert compile_path("missing.length")(row) is None
+    assert compile_path("nested.a.b")(row) == 5
+    assert compile_fields(["nested.a.b", "nested.a.c", "items"])(row) == [5, None, [1, 2, 3]]
+
+
+def test_registered_derived_field():
+    register_derived_field("shout", lambda value: value + "!")
+    try:
+        assert compile_path("answer.shout")({"answer": "ok"}) == "ok!"
+        assert compile_path("answer.shout")({"answer": 1}) is None
+        assert compile_path("answer.shout")({"answer": {"shout": "real"}}) == "real"
+    finally:
+        del field_access._DERIVED_FIELDS["shout"]
+        compile_path.cache_clear()
+
+
+def test_stats_average_of_field_named_length():
+    results = [{"model_based_judgement": {"length": i}, "response": "x" * i} for i in range(1, 300)]
+    for stats in (JudgementStats(), DataGenerationStats()):
+        report = stats.calculate_general_stats(
+            results, numeric_fields=["model_based_judgement.length", "response.length"]
+        )
+        numeric = report["numeric_stats"]
+        assert numeric["model_based_judgement.length"]["average"] == 150
+        assert numeric["response.length"]["average"] == 150
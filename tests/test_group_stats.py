@@ -0,0 +1,105 @@
+import json
+import random
+
+from data_generation.stats import DataGenerationStats
+from judgement.stats import JudgementStats
+from utils.incremental_stats import IncrementalStats, StatsAccumulator
+
+OVERALL = "model_based_judgement.overall"
+
+
+def _row(model, score, variant="a"):
+    return {"input": {"meta_info": {"model_name": model, "prompt_variant": variant}}, "model_based_judgement": {"overall": score}}
+
+
+def _items(stats):
+    return {item["key"]["input.meta_info.model_name"]: item for item in stats["groups"]["items"]}
+
+
+def test_groups_aggregate_per_key_including_errors():
+    rows = [_row("a", 4), _row("a", 6), _row("b", 9), {"input": {"meta_info": {"model_name": "b"}}, "error": "failed"}]
+    stats = JudgementStats().calculate_general_stats(rows, [OVERALL], group_by="input.meta_info.model_name")
+
+    groups = stats["groups"]
+    assert groups["by"] == ["input.meta_info.model_name"] and groups["group_count"] == 2
+    assert not groups["approximate"] and groups["other"] is None
+    items = _items(stats)
+    assert items["a"]["stats"]["numeric_stats"][OVERALL]["average"] == 5
+    assert (items["b"]["stats"]["total_count"], items["b"]["stats"]["error_count"]) == (2, 1)
+    assert "count_error" not in items["a"]
+
+
+def test_composite_keys_and_top_k_other():
+    rows = [_row("a", 1, "x")] * 3 + [_row("a", 2, "y")] * 2 + [_row("b", 3, "x")]
+    stats = DataGenerationStats().calculate_general_stats(
+        rows, [OVERALL], group_by=["input.meta_info.model_name", "input.meta_info.prompt_variant"], top_k=1
+    )
+
+    groups = stats["groups"]
+    assert [item["key"] for item in groups["items"]] == [
+        {"input.meta_info.model_name": "a", "input.meta_info.prompt_variant": "x"}
+    ]
+    assert groups["group_count"] == 3 and not groups["approximate"]
+    assert groups["other"]["group_count"] == 2 and groups["other"]["total_count"] == 3
+
+
+def test_top_k_bounds_tracked_groups_and_keeps_heavy_hitters():
+    rng = random.Random(0)
+    rows = [_row(f"heavy-{i % 3}", 5) for i in range(600)] + [_row(f"rare-{i}", 1) for i in range(5000)]
+    rng.shuffle(rows)
+    accumulator = StatsAccumulator([OVERALL], group_by=["input.meta_info.model_name"], group_capacity=30)
+    peak = 0
+    for row in rows:
+        accumulator.add(row)
+        peak = max(peak, len(accumulator.groups))
+
+    assert peak == 30
+    stats = accumulator.general_stats(top_k=3)
+    items = _items(stats)
+    assert sorted(items) == ["heavy-0", "heavy-1", "heavy-2"]
+    for item in items.values():
+        # 估计值是上界：统计到的结果数加上误差不少于真实的 200
+        assert item["stats"]["total_count"] <= 200 <= item["stats"]["total_count"] + item["count_error"]
+    groups = stats["groups"]
+    assert groups["approximate"] and groups["group_count"] >= 5003
+    # 被淘汰和 top_k 之外的分组都计入 other，总数守恒
+    kept = sum(item["stats"]["total_count"] for item in items.values())
+    assert kept + groups["other"]["total_count"] == stats["total_count"] == len(rows)
+
+
+def test_bounded_accumulator_round_trips_through_state():
+    accumulator = StatsAccumulator([OVERALL], group_by=["input.meta_info.model_name"], group_capacity=2)
+    for model in ("a", "a", "b", "c", "a"):
+        accumulator.add(_row(model, 1))
+    restored = StatsAccumulator.from_dict(json.loads(json.dumps(accumulator.to_dict())))
+    restored.add(_row("d", 1))
+
+    assert len(restored.groups) == 2
+    stats = restored.general_stats(top_k=2)
+    assert _items(stats)["a"]["stats"]["total_count"] == 3
+    assert stats["groups"]["other"]["total_count"] + sum(
+        item["stats"]["total_count"] for item in stats["groups"]["items"]
+    ) == 6
+
+
+def test_incremental_stats_recomputes_when_top_k_changes(tmp_path):
+    path = tmp_path / "result.jsonl"
+    path.write_text("".join(json.dumps(_row(f"m{i}", i)) + "\n" for i in range(30)), encoding="utf-8")
+
+    def update(top_k):
+        return IncrementalStats(str(path), [OVERALL], group_by=["input.meta_info.model_name"]).update(top_k)
+
+    assert update(1)["groups"]["approximate"]
+    exact = update(None)["groups"]
+    assert not exact["approximate"] and exact["group_count"] == 30
+
+
+def test_print_report_shows_groups(tmp_path, capsys):
+    path = tmp_path / "result.jsonl"
+    path.write_text("".join(json.dumps(_row(model, 6)) + "\n" for model in "aab"), encoding="utf-8")
+    JudgementStats().print_report(str(path), [OVERALL], group_by="input.meta_info.model_name", top_k=1)
+
+    output = capsys.readouterr().out
+    assert "Groups by input.meta_info.model_name (2 groups):" in output
+    assert "[input.meta_info.model_name=a] Total: 2" in output
+    assert "[other=1 groups] Total: 1" in output
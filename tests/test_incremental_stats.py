@@ -0,0 +1,78 @@
+import json
+
+from utils.incremental_stats import IncrementalStats
+
+
+def _line(score, **extra):
+    return json.dumps({"model_based_judgement": {"overall": score}, **extra}) + "\n"
+
+
+def _append(path, text):
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(text)
+
+
+def _stats(path, **kwargs):
+    return IncrementalStats(str(path), numeric_fields=["model_based_judgement.overall"], **kwargs)
+
+
+def test_only_new_complete_lines_are_merged(tmp_path):
+    path = tmp_path / "result.jsonl"
+    _append(path, _line(1) + _line(3))
+    stats = _stats(path).update()
+    assert stats["total_count"] == 2
+
+    # 最后一行还没有写完，留到下次读取
+    _append(path, _line(5) + '{"model_based_judgement": {"over')
+    stats = _stats(path).update()
+    assert stats["total_count"] == 3
+    assert stats["numeric_stats"]["model_based_judgement.overall"]["total"] == 9
+
+    _append(path, 'all": 7}}\n' + json.dumps({"error": "failed"}) + "\n")
+    stats = _stats(path).update()
+    assert (stats["total_count"], stats["error_count"]) == (5, 1)
+    overall = stats["numeric_stats"]["model_based_judgement.overall"]
+    assert (overall["count"], overall["min"], overall["max"], overall["average"]) == (4, 1, 7, 4)
+
+
+def test_state_records_offset_of_last_complete_line(tmp_path):
+    path = tmp_path / "result.jsonl"
+    complete = _line(1) + _line(2)
+    _append(path, complete + '{"partial"')
+    _stats(path).update()
+    with open(f"{path}.stats_state.json", encoding="utf-8") as file:
+        state = json.load(file)
+    assert state["offset"] == len(complete.encode("utf-8"))
+
+
+def test_rewritten_file_is_recomputed(tmp_path):
+    path = tmp_path / "result.jsonl"
+    _append(path, _line(1) + _line(2))
+    _stats(path).update()
+
+    # 同样长度但内容不同：偏移仍然合法，只能靠文件头指纹发现
+    path.write_text(_line(8) + _line(9) + _line(9), encoding="utf-8")
+    stats = _stats(path).update()
+    assert stats["total_count"] == 3
+    assert stats["numeric_stats"]["model_based_judgement.overall"]["total"] == 26
+
+
+def test_truncated_file_is_recomputed(tmp_path):
+    path = tmp_path / "result.jsonl"
+    _append(path, _line(1) + _line(2) + _line(3))
+    _stats(path).update()
+
+    path.write_text(_line(4), encoding="utf-8")
+    stats = _stats(path).update()
+    assert stats["total_count"] == 1
+    assert stats["numeric_stats"]["model_based_judgement.overall"]["total"] == 4
+
+
+def test_changed_fields_ignore_saved_state(tmp_path):
+    path = tmp_path / "result.jsonl"
+    _append(path, _line(1, label="a") + _line(2, label="b"))
+    _stats(path).update()
+
+    stats = _stats(path, distribution_fields=["label"]).update()
+    assert stats["total_count"] == 2
+    assert stats["distribution_stats"]["label"] == {"a": 1, "b": 1}
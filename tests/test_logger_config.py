@@ -0,0 +1,29 @@
+import logging
+import os
+
+import pytest
+
+from utils import logger_config
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_forked_child_writes_logs_directly(tmp_path, monkeypatch):
+    monkeypatch.setattr(logger_config, "LOG_DIR", str(tmp_path))
+    logger = logger_config.get_logger(name="fork_test", log_file="fork_test.log", use_queue=True)
+    logger.info("from parent")
+
+    pid = os.fork()
+    if pid == 0:
+        # 模拟进程池的子进程：不执行 atexit，直接 os._exit
+        try:
+            logger.info("from child")
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    # 等待后台线程写出父进程的日志
+    logger_config._queue.join()
+
+    with open(tmp_path / "fork_test.log", encoding="utf-8") as file:
+        content = file.read()
+    assert "from parent" in content and "from child" in content
+    assert isinstance(logger.handlers[0], logging.handlers.QueueHandler)
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from agent import memory as memory_module
+from agent.memory import ConversationMemory, count_message_tokens, estimate_tokens
+
+
+def _unavailable(*args, **kwargs):
+    raise ConnectionError("cannot download cl100k_base")
+
+
+def test_no_budget_never_loads_tokenizer(monkeypatch):
+    monkeypatch.setattr(memory_module, "count_tokens", _unavailable)
+    memory = ConversationMemory(system_prompt="sys")
+    memory.append("hello")
+    memory.append("hi", role="assistant")
+    assert len(memory) == 3
+    assert memory.total_tokens == 0
+    assert not memory.over_budget(10**9)
+
+
+def test_budget_falls_back_to_estimate(monkeypatch):
+    monkeypatch.setattr(memory_module, "count_tokens", _unavailable)
+    assert count_message_tokens("abcdef") == estimate_tokens("abcdef") + memory_module.MESSAGE_OVERHEAD_TOKENS
+    assert estimate_tokens("你好") == 2
+    memory = ConversationMemory(system_prompt="sys", max_tokens=100)
+    assert memory.total_tokens == count_message_tokens("sys")
+
+
+def _length_memory(**kwargs):
+    return ConversationMemory(system_prompt="s" * 10, count_tokens=len, **kwargs)
+
+
+def test_sliding_window_drops_whole_turns_down_to_low_watermark():
+    memory = _length_memory(max_tokens=100, low_watermark=0.5)
+    for turn in range(5):
+        memory.append("u" * 10)
+        memory.append("a" * 10, role="assistant")
+    assert memory.total_tokens == 110 and memory.over_budget()
+    dropped = asyncio.run(memory.compact())
+    assert dropped == 6
+    assert memory.total_tokens == 50
+    assert memory.messages[0]["role"] == "system"
+    assert memory.messages[1]["role"] == "user"
+
+
+def test_latest_turn_is_kept_even_over_budget():
+    memory = _length_memory(max_tokens=20)
+    memory.append("u" * 50)
+    assert asyncio.run(memory.compact()) == 0
+    assert len(memory) == 2
+
+
+def test_summary_strategy_replaces_dropped_turns():
+    seen = []
+
+    async def summarizer(messages):
+        seen.append(messages)
+        return "short"
+
+    memory = _length_memory(max_tokens=60, strategy="summary", summarizer=summarizer)
+    for _ in range(3):
+        memory.append("u" * 10)
+        memory.append("a" * 10, role="assistant")
+    asyncio.run(memory.compact())
+    assert seen and all(message["role"] != "system" for message in seen[0])
+    assert memory.messages[1]["role"] == "system"
+    assert memory.messages[1]["content"].endswith("short")
+    assert len(memory) == 4
+
+
+def test_invalid_strategy():
+    with pytest.raises(ValueError):
+        ConversationMemory(strategy="unknown")
+    with pytest.raises(ValueError):
+        ConversationMemory(strategy="summary")
@@ -0,0 +1,93 @@
+import asyncio
+
+from tests.helpers import FakeClient, judge_rows
+
+
+def _packed_responder(packed_output):
+    """打包调用返回 packed_output，单条调用返回可解析的评判"""
+
+    def respond(prompt, system_prompt):
+        return packed_output if "<item id=" in prompt else "<overall>7</overall>"
+
+    return respond
+
+
+def _run_unit(pipeline, client, rows):
+    unit = [(i, row, pipeline._render_prompts(row)) for i, row in enumerate(rows)]
+    return asyncio.run(pipeline.run_packed_task(unit, pipeline.make_judgement_extractor(), client=client))
+
+
+def test_packed_prompt_round_trips_through_split(judgement_pipeline):
+    pipeline = judgement_pipeline()
+    prompt = pipeline.build_packed_prompt(["first question", "second question"])
+    assert "<item id=1>\nfirst question\n</item>" in prompt
+    assert "<item id=2>\nsecond question\n</item>" in prompt
+
+    response = "intro <ITEM id='2'> <overall>3</overall> </item>\n<item id=1><overall>9</overall></item>"
+    assert pipeline.split_packed_response(response) == {1: "<overall>9</overall>", 2: "<overall>3</overall>"}
+    assert pipeline.split_packed_response("no items") == {}
+
+
+def test_each_parsed_item_keeps_its_own_judgement(judgement_pipeline):
+    pipeline = judgement_pipeline()
+    client = FakeClient(_packed_responder(
+        "<item id=1><overall>8</overall></item><item id=2><overall>4</overall></item>"
+    ))
+    results = _run_unit(pipeline, client, judge_rows(2))
+
+    assert len(client.calls) == 1
+    assert "<item id=2>" in client.calls[0]["prompt"]
+    assert [result["model_based_judgement"]["overall"] for result in results] == [8, 4]
+    assert [result["pack"] for result in results] == [{"size": 2, "position": 1}, {"size": 2, "position": 2}]
+
+
+def test_unparsed_items_fall_back_to_single_calls(judgement_pipeline):
+    pipeline = judgement_pipeline()
+    client = FakeClient(_packed_responder("<item id=2><overall>5</overall></item>"))
+    results = _run_unit(pipeline, client, judge_rows(3))
+
+    single_calls = [call for call in client.calls if "<item id=" not in call["prompt"]]
+    assert len(single_calls) == 2
+    assert [result.get("pack", {}).get("position") for result in results] == [2, None, None]
+    assert [result["input"]["answer"] for result in results] == ["answer 1", "answer 0", "answer 2"]
+    assert all(result["model_based_judgement"]["overall"] is not None for result in results)
+
+
+def _run(pipeline, client, rows, pack_size):
+    async def consume():
+        return [
+            result
+            async for result in pipeline.astream(
+                rows,
+                pack_size=pack_size,
+                model_judgement_function=pipeline.make_judgement_extractor(),
+                client=client,
+            )
+        ]
+
+    return asyncio.run(consume())
+
+
+def _total_tokens(results):
+    return sum(result["usage"]["total_tokens"] for result in results if result.get("usage"))
+
+
+def test_pack_usage_is_recorded_when_every_item_falls_back(judgement_pipeline):
+    pipeline = judgement_pipeline()
+    client = FakeClient(_packed_responder("no items here"))
+    results = _run(pipeline, client, judge_rows(3), pack_size=3)
+
+    assert len(client.calls) == 4
+    assert not any("pack" in result for result in results)
+    assert _total_tokens(results) == 15 * len(client.calls)
+
+
+def test_pack_usage_is_recorded_once_when_some_items_parse(judgement_pipeline):
+    pipeline = judgement_pipeline()
+    client = FakeClient(_packed_responder("<item id=1><overall>8</overall></item>"))
+    results = _run(pipeline, client, judge_rows(3), pack_size=3)
+
+    assert len(client.calls) == 3
+    packed = [result for result in results if "pack" in result]
+    assert [result["pack"] for result in packed] == [{"size": 3, "position": 1}]
+    assert _total_tokens(results) == 15 * len(client.calls)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import data_generation.pipeline
+import judgement.pipeline
+import workflow.pipeline
+from tests.helpers import FakeClient, generation_rows, judge_rows
+from utils.llm_client import OpenAIClient
+from utils.profiling import PipelineProfiler
+from workflow.pipeline import GenerateJudgePipeline
+
+PROFILING = {"enabled": True, "mode": "stages", "loop_lag_interval": 0.01}
+
+
+def _failing_client(*args, **kwargs):
+    raise RuntimeError("no client")
+
+
+async def _consume(stream):
+    return [row async for row in stream]
+
+
+def _assert_loop_restored():
+    loop = asyncio.get_running_loop()
+    assert not loop.get_debug()
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+
+
+def test_judgement_profiler_stops_when_client_creation_fails(judgement_pipeline, monkeypatch):
+    monkeypatch.setattr(judgement.pipeline, "OpenAIClient", _failing_client)
+    pipeline = judgement_pipeline(profiling=PROFILING)
+
+    async def run():
+        with pytest.raises(RuntimeError, match="no client"):
+            await _consume(pipeline.astream(judge_rows(3)))
+        await asyncio.sleep(0)
+        _assert_loop_restored()
+
+    asyncio.run(run())
+    assert os.path.exists(os.path.join(pipeline.experiment_dir, "profile_summary.json"))
+
+
+def test_generation_profiler_stops_when_client_creation_fails(generation_pipeline, monkeypatch):
+    monkeypatch.setattr(data_generation.pipeline, "OpenAIClient", _failing_client)
+    pipeline = generation_pipeline(profiling=PROFILING)
+
+    async def run():
+        with pytest.raises(RuntimeError, match="no client"):
+            await _consume(pipeline.astream(generation_rows(3)))
+        await asyncio.sleep(0)
+        _assert_loop_restored()
+
+    asyncio.run(run())
+
+
+def test_workflow_profiles_the_judgement_stage(generation_pipeline, judgement_pipeline, monkeypatch):
+    clients = {
+        "generation": FakeClient(lambda prompt, system: "<draft>text</draft>"),
+        "judgement": FakeClient(lambda prompt, system: "<overall>7</overall>"),
+    }
+    created = iter(clients.values())
+    monkeypatch.setattr(workflow.pipeline, "OpenAIClient", lambda *args, **kwargs: next(created))
+    generation = generation_pipeline(profiling=PROFILING)
+    judge = judgement_pipeline(profiling=PROFILING)
+    fused = GenerateJudgePipeline(
+        generation, judge, to_judge_input=lambda result: {"answer": result["response"]}
+    )
+
+    async def run():
+        records = await _consume(fused.astream(generation_rows(4), model_judgement_function=judge.make_judgement_extractor()))
+        await asyncio.sleep(0)
+        _assert_loop_restored()
+        return records
+
+    records = asyncio.run(run())
+    assert len(records) == 4 and not any("error" in record for record in records)
+    with open(os.path.join(judge.experiment_dir, "profile_summary.json"), encoding="utf-8") as file:
+        summary = json.load(file)
+    assert "api_call" in summary["stages"]
+
+
+def test_nested_stages_are_counted_once(tmp_path):
+    profiler = PipelineProfiler(str(tmp_path))
+
+    async def call(delay):
+        with profiler.stage("api_call"):
+            with profiler.stage("rate_limiter_wait"):
+                await asyncio.sleep(delay)
+            await asyncio.sleep(0.05)
+
+    async def run():
+        await asyncio.gather(call(0.1), call(0.0))
+
+    asyncio.run(run())
+    wait, api = profiler.stages["rate_limiter_wait"], profiler.stages["api_call"]
+    assert wait["count"] == api["count"] == 2
+    assert 0.1 <= wait["total"] < 0.14
+    assert 0.1 <= api["total"] < 0.14
+
+
+def test_rate_limiter_wait_is_excluded_from_api_call(tmp_path):
+    class _Completions:
+        async def create(self, **kwargs):
+            await asyncio.sleep(0.02)
+            message = SimpleNamespace(content="ok")
+            return SimpleNamespace(
+                choices=[SimpleNamespace(index=0, message=message)], model_dump=lambda: {}
+            )
+
+    config = {"model": {"api_key": "test", "base_url": "http://localhost", "rate_limit": 600}}
+    client = OpenAIClient(config, async_client=SimpleNamespace(chat=SimpleNamespace(completions=_Completions())))
+    profiler = client.profiler = PipelineProfiler(str(tmp_path))
+
+    async def call():
+        with profiler.stage("api_call"):
+            return await client.safe_chat_completion("hi")
+
+    async def run():
+        return await asyncio.gather(*(call() for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert [result[0] for result in results] == ["ok"] * 3
+    # 600 次/分钟：第二、三个请求分别等待约 0.1 秒和 0.2 秒
+    assert profiler.stages["rate_limiter_wait"]["total"] >= 0.25
+    assert profiler.stages["api_call"]["total"] < 0.2
@@ -0,0 +1,111 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+import utils.progress
+from utils.progress import HTTPReporter, JSONSnapshotReporter, ProgressTracker
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(utils.progress.time, "monotonic", clock)
+    return clock
+
+
+def _post(port, body):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/concurrency", data=body, method="POST",
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_tracker_reports_throughput_errors_and_eta(clock):
+    tracker = ProgressTracker(total=10)
+    tracker.start()
+    for i in range(4):
+        tracker.task_started()
+        clock.now += 0.5
+        tracker.task_finished({"error": "failed"} if i == 0 else {"usage": {"total_tokens": 30}})
+
+    snapshot = tracker.snapshot()
+    assert snapshot["completed"] == 4 and snapshot["in_flight"] == 0
+    assert snapshot["rows_per_sec"] == pytest.approx(2.0)
+    assert snapshot["recent_rows_per_sec"] == pytest.approx(2.0)
+    assert snapshot["error_rate"] == pytest.approx(0.25)
+    assert snapshot["tokens_per_min"] == pytest.approx(90 * 60 / 2)
+    assert snapshot["eta_seconds"] == pytest.approx(3.0)
+
+
+def test_tracker_without_total_has_no_eta(clock):
+    tracker = ProgressTracker()
+    tracker.start()
+    clock.now += 1
+    tracker.task_finished({})
+    assert tracker.snapshot()["eta_seconds"] is None
+
+
+def test_tracker_averages_numeric_scores():
+    tracker = ProgressTracker(score_field="model_based_judgement")
+    for scores in ({"overall": 6, "style": 2}, {"overall": 8, "passed": True}, {"overall": "n/a"}):
+        tracker.task_finished({"model_based_judgement": scores})
+    tracker.task_finished({"error": "failed"})
+
+    assert tracker.snapshot()["scores"] == {"overall": 7.0, "style": 2.0}
+
+
+def test_snapshot_reporter_writes_json_at_interval(tmp_path, clock):
+    path = tmp_path / "run" / "progress.json"
+    tracker = ProgressTracker(total=3, reporters=[JSONSnapshotReporter(str(path), interval=5.0)])
+    tracker.start()
+    assert json.loads(path.read_text())["completed"] == 0
+
+    tracker.task_finished({})
+    assert json.loads(path.read_text())["completed"] == 0
+    clock.now += 5
+    tracker.task_finished({})
+    assert json.loads(path.read_text())["completed"] == 2
+
+    tracker.task_finished({})
+    tracker.close()
+    assert json.loads(path.read_text())["completed"] == 3
+    assert not (tmp_path / "run" / "progress.json.tmp").exists()
+
+
+def test_http_reporter_serves_snapshot_and_adjusts_concurrency():
+    reporter = HTTPReporter(port=0)
+    tracker = ProgressTracker(total=5, reporters=[reporter], concurrency_limit=4)
+    tracker.start()
+    try:
+        tracker.task_finished({})
+        with urllib.request.urlopen(f"http://127.0.0.1:{reporter.port}/", timeout=5) as response:
+            assert json.loads(response.read())["completed"] == 1
+
+        assert _post(reporter.port, b'{"limit": 16}') == (200, {"concurrency_limit": 16})
+        assert tracker.concurrency_limit == 16
+        for body in (b'{"limit": 0}', b'{"limit": 2.5}', b'{"limit": true}', b'{"limit": "8"}', b"{}", b"[]", b"not json"):
+            status, payload = _post(reporter.port, body)
+            assert status == 400 and "error" in payload
+        assert tracker.concurrency_limit == 16
+
+        request = urllib.request.Request(f"http://127.0.0.1:{reporter.port}/other", data=b"{}", method="POST")
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request, timeout=5)
+        assert error.value.code == 404
+    finally:
+        tracker.close()
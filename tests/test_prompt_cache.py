@@ -0,0 +1,58 @@
+import asyncio
+
+from tests.helpers import FakeClient, judge_rows
+from utils.llm_client import summarize_cache_usage
+
+
+def _rows(questions):
+    rows = judge_rows(len(questions))
+    for row, question in zip(rows, questions):
+        row["user_prompt_kwargs"]["question"] = question
+    return rows
+
+
+def _judge(pipeline, client, rows, **kwargs):
+    async def consume():
+        return [
+            result
+            async for result in pipeline.astream(
+                rows,
+                concurrency_limit=1,
+                model_judgement_function=pipeline.make_judgement_extractor(),
+                client=client,
+                **kwargs,
+            )
+        ]
+
+    return asyncio.run(consume())
+
+
+def _asked(client):
+    return [next(q for q in ("alpha", "beta") if q in call["prompt"]) for call in client.calls]
+
+
+def test_prefix_ordering_dispatches_shared_prefixes_together(judgement_pipeline):
+    questions = ["beta 1", "alpha 1", "beta 2", "alpha 2", "beta 3"]
+    pipeline = judgement_pipeline()
+
+    client = FakeClient(lambda prompt, system: "<overall>7</overall>")
+    _judge(pipeline, client, _rows(questions), prefix_ordering=True)
+    assert _asked(client) == ["alpha", "alpha", "beta", "beta", "beta"]
+
+    client = FakeClient(lambda prompt, system: "<overall>7</overall>")
+    _judge(pipeline, client, _rows(questions))
+    assert _asked(client) == ["beta", "alpha", "beta", "alpha", "beta"]
+
+
+def test_cached_prompt_tokens_are_recorded(judgement_pipeline):
+    usage = {
+        "prompt_tokens": 100,
+        "completion_tokens": 5,
+        "total_tokens": 105,
+        "prompt_tokens_details": {"cached_tokens": 80},
+    }
+    client = FakeClient(lambda prompt, system: "<overall>7</overall>", usage=usage)
+    results = _judge(judgement_pipeline(), client, judge_rows(3))
+
+    assert all(result["usage"]["cached_tokens"] == 80 for result in results)
+    assert summarize_cache_usage(results) == {"prompt_tokens": 300, "cached_tokens": 240, "cache_hit_rate": 0.8}
@@ -0,0 +1,130 @@
+import gc
+import glob
+import json
+import threading
+import weakref
+
+import pytest
+
+import agent.recorder
+from agent.recorder import TrajectoryWriter
+from utils.compression import iter_frames, iter_lines
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(agent.recorder.time, "monotonic", clock)
+    return clock
+
+
+def _records(path):
+    return [json.loads(line) for line in iter_lines(path)]
+
+
+def test_records_are_written_in_batches(tmp_path, clock):
+    path = str(tmp_path / "trajectory.jsonl")
+    writer = TrajectoryWriter(path, batch_size=3, flush_interval=10)
+    for i in range(5):
+        writer.write({"i": i})
+    assert [record["i"] for record in _records(path)] == [0, 1, 2]
+
+    # 距上次写入超过 flush_interval 时，下一次写入会带出缓冲的记录
+    clock.now += 10
+    writer.write({"i": 5})
+    assert len(_records(path)) == 6
+
+    writer.write({"i": 6})
+    writer.close()
+    assert writer.written == 7 and len(_records(path)) == 7
+
+
+def test_rotates_by_size(tmp_path, clock):
+    path = str(tmp_path / "trajectory.jsonl")
+    with TrajectoryWriter(path, batch_size=1, max_bytes=60) as writer:
+        for i in range(6):
+            writer.write({"payload": "x" * 20, "i": i})
+
+    files = sorted(glob.glob(str(tmp_path / "trajectory*.jsonl")))
+    assert writer.rotations == len(files) - 1 >= 2
+    rows = [record["i"] for file in files for record in _records(file)]
+    assert sorted(rows) == list(range(6))
+    assert all(len(open(file, "rb").read()) <= 60 for file in files)
+
+
+def test_rotates_by_time(tmp_path, clock):
+    path = str(tmp_path / "trajectory.jsonl")
+    with TrajectoryWriter(path, batch_size=1, rotate_interval=60) as writer:
+        writer.write({"i": 0})
+        clock.now += 30
+        writer.write({"i": 1})
+        clock.now += 30
+        writer.write({"i": 2})
+
+    assert writer.rotations == 1
+    rotated = [file for file in glob.glob(str(tmp_path / "trajectory*.jsonl")) if file != path]
+    assert [record["i"] for record in _records(rotated[0])] == [0, 1]
+    assert [record["i"] for record in _records(path)] == [2]
+
+
+def test_zstd_writes_one_frame_per_batch(tmp_path):
+    pytest.importorskip("zstandard")
+    writer = TrajectoryWriter(str(tmp_path / "trajectory.jsonl"), batch_size=2, compression="zstd")
+    assert writer.path.endswith(".jsonl.zst")
+    for i in range(5):
+        writer.write({"i": i})
+    writer.close()
+
+    with open(writer.path, "rb") as file:
+        frames = [data for _, _, data in iter_frames(file, "zstd")]
+    assert [data.count(b"\n") for data in frames] == [2, 2, 1]
+    assert [record["i"] for record in _records(writer.path)] == list(range(5))
+
+
+def test_concurrent_writes_are_not_lost_or_interleaved(tmp_path):
+    path = str(tmp_path / "trajectory.jsonl")
+    writer = TrajectoryWriter(path, batch_size=7)
+
+    def produce(thread):
+        for i in range(200):
+            writer.write({"thread": thread, "i": i, "text": "y" * 50})
+
+    threads = [threading.Thread(target=produce, args=(t,)) for t in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+
+    records = _records(path)
+    assert len(records) == writer.written == 1600
+    for t in range(8):
+        assert [record["i"] for record in records if record["thread"] == t] == list(range(200))
+
+
+def test_open_writers_are_tracked_weakly(tmp_path):
+    path = str(tmp_path / "trajectory.jsonl")
+    writer = TrajectoryWriter(path, batch_size=100)
+    writer.write({"i": 0})
+    assert writer in agent.recorder._open_writers
+
+    # 进程退出时由同一个 atexit 回调写入剩余记录
+    agent.recorder._close_open_writers()
+    assert len(_records(path)) == 1 and writer not in agent.recorder._open_writers
+
+    # 关闭后继续写入时重新登记；不再引用的写入器被回收时写入剩余记录
+    writer.write({"i": 1})
+    assert writer in agent.recorder._open_writers
+    ref = weakref.ref(writer)
+    del writer
+    gc.collect()
+    assert ref() is None
+    assert [record["i"] for record in _records(path)] == [0, 1]
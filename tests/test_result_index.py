@@ -0,0 +1,119 @@
+import json
+
+from utils.result_index import ResultIndex
+
+
+def _line(key, **fields):
+    return json.dumps({"key": key, **fields}) + "\n"
+
+
+def _append(path, text):
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(text)
+
+
+def test_rows_are_read_by_number_and_key(tmp_path):
+    path = tmp_path / "result.jsonl"
+    _append(path, _line("a", value=1) + _line("b", error="failed") + _line("c", value=3))
+    with ResultIndex(str(path)) as index:
+        assert len(index) == 3
+        assert index.get(-1)["value"] == 3
+        assert index.get_by_key("a")["value"] == 1
+        assert index.is_completed("a") and not index.is_completed("b") and "b" in index
+        assert index.error_rows() == [1]
+        assert index.completed_count == 2
+
+
+def test_successful_row_is_not_replaced_by_later_error(tmp_path):
+    path = tmp_path / "result.jsonl"
+    _append(path, _line("a", value=1) + _line("a", error="failed"))
+    with ResultIndex(str(path)) as index:
+        assert index.is_completed("a")
+        assert index.get_by_key("a")["value"] == 1
+
+
+def test_refresh_indexes_only_new_complete_lines(tmp_path):
+    path = tmp_path / "result.jsonl"
+    _append(path, _line("a") + '{"key": "b"')
+    with ResultIndex(str(path)) as index:
+        assert len(index) == 1
+        _append(path, "}\n" + _line("c"))
+        assert index.refresh() == 2
+        assert "b" in index and "c" in index
+
+    # 重新打开时从索引文件加载，不重新解析已索引的行
+    _append(path, _line("d"))
+    with ResultIndex(str(path)) as index:
+        assert len(index) == 4 and index.get_by_key("d") == {"key": "d"}
+        assert index.refresh() == 0
+
+
+def test_rewritten_file_rebuilds_index(tmp_path):
+    path = tmp_path / "result.jsonl"
+    _append(path, _line("a") + _line("b"))
+    ResultIndex(str(path)).close()
+
+    # 长度不变、内容不同：偏移仍然合法，只能靠文件头指纹发现
+    path.write_text(_line("x") + _line("y"), encoding="utf-8")
+    with ResultIndex(str(path)) as index:
+        assert len(index) == 2
+        assert "x" in index and "a" not in index
+        assert index.get(0) == {"key": "x"}
+
+
+def test_truncated_file_rebuilds_index(tmp_path):
+    path = tmp_path / "result.jsonl"
+    _append(path, _line("a") + _line("b") + _line("c"))
+    with ResultIndex(str(path)) as index:
+        path.write_text(_line("z"), encoding="utf-8")
+        index.refresh()
+        assert len(index) == 1 and "z" in index and "a" not in index
+
+
+def test_changed_key_function_rebuilds_index(tmp_path):
+    path = tmp_path / "result.jsonl"
+    _append(path, _line("a", name="first") + _line("b", name="second"))
+    ResultIndex(str(path)).close()
+
+    def by_name(record):
+        return record.get("name")
+
+    with ResultIndex(str(path), key_function=by_name) as index:
+        assert "first" in index and "a" not in index
+
+
+def test_key_table_grows_and_persists(tmp_path, caplog):
+    path = tmp_path / "result.jsonl"
+    _append(path, "".join(_line(f"k{i}", **({"error": "failed"} if i % 10 == 0 else {})) for i in range(3000)))
+    with ResultIndex(str(path)) as index:
+        assert index._key_table.capacity >= 3000 / 0.7
+        assert index.row_of("k1234") == 1234 and "k3000" not in index
+        assert index.completed_count == 2700
+
+    # 重新打开时直接使用键表文件
+    caplog.clear()
+    with ResultIndex(str(path)) as index:
+        assert "Building key table" not in caplog.text
+        assert index.get_by_key("k2999") == {"key": "k2999"}
+        assert not index.is_completed("k2990") and index.is_completed("k2991")
+
+
+def test_stale_key_table_is_rebuilt(tmp_path, caplog):
+    path = tmp_path / "result.jsonl"
+    _append(path, _line("a") + _line("b"))
+    ResultIndex(str(path)).close()
+    keys_path = tmp_path / "result.jsonl.idx.keys"
+
+    # 模拟写入键表后、更新文件头前中断
+    data = bytearray(keys_path.read_bytes())
+    data[24:32] = b"\xff" * 8
+    keys_path.write_bytes(bytes(data))
+    caplog.clear()
+    with ResultIndex(str(path)) as index:
+        assert "Building key table" in caplog.text
+        assert index.row_of("b") == 1
+
+    keys_path.unlink()
+    _append(path, _line("c"))
+    with ResultIndex(str(path)) as index:
+        assert [index.row_of(key) for key in "abc"] == [0, 1, 2]
@@ -0,0 +1,122 @@
+import asyncio
+import gzip
+import json
+
+from data_generation.stats import DataGenerationStats
+from judgement.stats import JudgementStats
+from tests.helpers import FakeClient, generation_rows
+from utils.incremental_stats import IncrementalStats
+from utils.records import hash_input
+from utils.result_index import ResultIndex
+from utils.result_store import ResultStore, attach_inputs, iter_raw_responses, load_inputs
+
+MODEL_NAME = "input.meta_info.model_name"
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def _judgement(i, model):
+    return {"input": {"query": f"q{i}", "meta_info": {"model_name": model}}, "model_based_judgement": {"overall": i}}
+
+
+def _write_compact(directory, results):
+    store = ResultStore(str(directory / "result.jsonl"), schema="compact")
+    for result in results:
+        store.write(result)
+    store.close()
+    return str(directory / "result.jsonl")
+
+
+def test_inputs_are_written_once_per_hash_across_resumes(tmp_path):
+    path = str(tmp_path / "result.jsonl")
+    store = ResultStore(path, schema="compact")
+    first = {"query": "a"}
+    row = store.write({"input": first, "response": "1"})
+    store.write({"input": first, "response": "2"})
+    store.write({"input": {"query": "b"}, "response": "3"})
+    store.close()
+    assert row == {"input_hash": hash_input(first), "response": "1"}
+
+    # 续跑时新建的 store 沿用已写入的输入
+    store = ResultStore(path, schema="compact")
+    store.write({"input": first, "response": "4"})
+    store.write({"input": {"query": "c"}, "response": "5"})
+    store.close()
+
+    hashes = [record["input_hash"] for record in _read_jsonl(tmp_path / "inputs.jsonl")]
+    assert len(hashes) == len(set(hashes)) == 3
+    results = attach_inputs(_read_jsonl(path), load_inputs(str(tmp_path)))
+    assert [result["input"]["query"] for result in results] == ["a", "a", "b", "a", "c"]
+
+
+def test_raw_responses_round_trip_across_gzip_members(tmp_path):
+    path = str(tmp_path / "result.jsonl")
+    for start in (0, 3):
+        store = ResultStore(path, schema="compact", raw_responses=True)
+        for i in range(start, start + 3):
+            store.write({"input": {"query": i}, "response": str(i)}, naive_response={"id": i, "choices": []})
+        store.close()
+
+    raw = list(iter_raw_responses(str(tmp_path)))
+    assert [record["naive_response"]["id"] for record in raw] == list(range(6))
+    assert [record["input_hash"] for record in raw] == [hash_input({"query": i}) for i in range(6)]
+    assert all("naive_response" not in row for row in _read_jsonl(path))
+
+    # 崩溃时未写完的结尾被忽略
+    data = (tmp_path / "raw_responses.jsonl.gz").read_bytes()
+    (tmp_path / "raw_responses.jsonl.gz").write_bytes(data + gzip.compress(b'{"input_hash": "x"}\n')[:-6])
+    assert len(list(iter_raw_responses(str(tmp_path / "raw_responses.jsonl.gz")))) >= 6
+
+
+def test_full_schema_ignores_raw_responses(tmp_path):
+    store = ResultStore(str(tmp_path / "result.jsonl"), raw_responses=True)
+    store.write({"input": {"query": "a"}}, naive_response={"id": 1})
+    store.close()
+    assert not (tmp_path / "inputs.jsonl").exists() and not (tmp_path / "raw_responses.jsonl.gz").exists()
+
+
+def test_stats_resolve_input_fields_of_compact_results(tmp_path):
+    path = _write_compact(tmp_path, [_judgement(i, "a" if i < 3 else "b") for i in range(5)])
+    report = JudgementStats().generate_report(
+        path, ["model_based_judgement.overall"], distribution_fields=[MODEL_NAME], group_by=MODEL_NAME
+    )
+    stats = report["general_stats"]
+    assert stats["distribution_stats"][MODEL_NAME] == {"a": 3, "b": 2}
+    assert [item["key"][MODEL_NAME] for item in stats["groups"]["items"]] == ["a", "b"]
+
+    incremental = IncrementalStats(path, distribution_fields=[MODEL_NAME]).update()
+    assert incremental["distribution_stats"][MODEL_NAME] == {"a": 3, "b": 2}
+
+    # 不涉及 input 字段时不读取 inputs.jsonl
+    assert "input" not in next(DataGenerationStats().iter_results(path))
+
+
+def test_index_resolves_inputs_appended_after_opening(tmp_path):
+    path = _write_compact(tmp_path, [_judgement(0, "a")])
+    with ResultIndex(path) as index:
+        assert index.get(0)["input"]["query"] == "q0"
+        assert index.is_completed(hash_input(_judgement(0, "a")["input"]))
+
+        store = ResultStore(path, schema="compact")
+        store.write(_judgement(1, "b"))
+        store.close()
+        index.refresh()
+        assert index.get_by_key(hash_input(_judgement(1, "b")["input"]))["input"]["meta_info"]["model_name"] == "b"
+
+
+def test_compact_generation_run_returns_inputs(generation_pipeline, tmp_path):
+    pipeline = generation_pipeline(output_data={
+        "output_dir": str(tmp_path / "output"), "experiment_name": "test", "need_time_stamp": False,
+        "result_schema": "compact", "raw_responses": True,
+    })
+    rows = generation_rows(3)
+    results = asyncio.run(pipeline.arun(rows + rows[:1], client=FakeClient(lambda prompt, system: "text"), progress=[]))
+
+    assert all("input" in result for result in results)
+    saved = _read_jsonl(pipeline.experiment_path)
+    assert all("input" not in row and "naive_response" not in row for row in saved)
+    assert len(_read_jsonl(pipeline.experiment_dir + "/inputs.jsonl")) == 3
+    assert len(list(iter_raw_responses(pipeline.experiment_dir))) == 4
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+from tests.helpers import FakeClient, generation_rows
+
+DROP = {"enabled": True, "mode": "drop", "capacity": 1000}
+MODEL = {"api_key": "test", "base_url": "http://localhost", "model": "test-model", "rate_limit": 1000, "n": 3}
+OUTPUTS = ["short answer", "the longest answer of the three", "a medium answer"]
+# FakeClient 的默认用量经 extract_usage 规整后的结果
+USAGE = {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15, "cached_tokens": 0}
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def _run(pipeline, client, rows, **kwargs):
+    async def consume():
+        return [result async for result in pipeline.astream(rows, concurrency_limit=1, client=client, **kwargs)]
+
+    return asyncio.run(consume())
+
+
+def test_samples_are_saved_as_linked_records(generation_pipeline):
+    pipeline = generation_pipeline(model=MODEL)
+    client = FakeClient(lambda prompt, system: OUTPUTS)
+    (result,) = _run(pipeline, client, generation_rows(1))
+
+    saved = _read_jsonl(pipeline.experiment_path)
+    assert [row["response"] for row in saved] == OUTPUTS
+    assert len({row["sample"]["group"] for row in saved}) == 1
+    assert [row["sample"]["index"] for row in saved] == [0, 1, 2]
+    assert all(row["sample"]["count"] == 3 and "best" not in row["sample"] for row in saved)
+    assert len(client.calls) == 1 and client.calls[0]["n"] == 3
+
+    # 用量和原始响应只记录在第一个采样上
+    assert [row["usage"] for row in saved] == [USAGE, None, None]
+    assert ["naive_response" in row for row in saved] == [True, False, False]
+    assert result["sample"]["index"] == 0 and result["usage"] == USAGE
+    assert [sample["response"] for sample in result["samples"]] == OUTPUTS
+
+
+def test_usage_moves_to_the_first_kept_sample(generation_pipeline):
+    pipeline = generation_pipeline(dedup=DROP, model=MODEL)
+    first = FakeClient(lambda prompt, system: [OUTPUTS[0]])
+    _run(pipeline, first, generation_rows(1))
+    client = FakeClient(lambda prompt, system: OUTPUTS)
+    (result,) = _run(pipeline, client, generation_rows(1))
+
+    saved = _read_jsonl(pipeline.experiment_path)[1:]
+    assert [row["sample"]["index"] for row in saved] == [1, 2]
+    assert [row["usage"] for row in saved] == [USAGE, None]
+    assert result["sample"]["index"] == 1
+
+
+def test_sync_score_function_marks_best_sample(generation_pipeline):
+    pipeline = generation_pipeline(model=MODEL)
+    client = FakeClient(lambda prompt, system: OUTPUTS)
+    (result,) = _run(pipeline, client, generation_rows(1), score_function=lambda sample: len(sample["response"]))
+
+    saved = _read_jsonl(pipeline.experiment_path)
+    assert [row["sample"]["score"] for row in saved] == [float(len(output)) for output in OUTPUTS]
+    assert [row["sample"]["best"] for row in saved] == [False, True, False]
+    assert result["response"] == OUTPUTS[1] and result["sample"]["best"]
+    # 返回值的用量仍然是整次调用的用量，文件中的用量仍然只在第一个采样上
+    assert result["usage"] == USAGE
+    assert [row["usage"] for row in saved] == [USAGE, None, None]
+
+
+def test_async_score_function_marks_best_sample(generation_pipeline):
+    pipeline = generation_pipeline(model=MODEL)
+    client = FakeClient(lambda prompt, system: OUTPUTS)
+
+    async def score(sample):
+        await asyncio.sleep(0)
+        if sample["sample"]["index"] == 1:
+            raise ValueError("judge failed")
+        return -len(sample["response"])
+
+    (result,) = _run(pipeline, client, generation_rows(1), score_function=score)
+
+    saved = _read_jsonl(pipeline.experiment_path)
+    assert [row["sample"]["score"] for row in saved] == [-12.0, None, -15.0]
+    assert [row["sample"]["best"] for row in saved] == [True, False, False]
+    assert result["sample"]["index"] == 0
+
+
+def test_all_dropped_samples_return_a_skipped_result(generation_pipeline):
+    pipeline = generation_pipeline(dedup=DROP, model=MODEL)
+    client = FakeClient(lambda prompt, system: OUTPUTS)
+    scored = []
+    first, second = _run(
+        pipeline, client, generation_rows(2), score_function=lambda sample: scored.append(sample) or 1.0
+    )
+
+    assert "skipped" not in first
+    assert second["skipped"] == "near_duplicate" and "near_duplicate" in second
+    assert [sample["skipped"] for sample in second["samples"]] == ["near_duplicate"] * 3
+    assert second["usage"] == USAGE
+    assert len(scored) == 3
+    assert len(_read_jsonl(pipeline.experiment_path)) == 3
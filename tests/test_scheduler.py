@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.scheduler import FairScheduler, job_slot
+
+
+async def _task(scheduler, job_name, order, duration=0.001):
+    async with scheduler.slot(job_name):
+        order.append(job_name)
+        await asyncio.sleep(duration)
+
+
+def test_high_priority_job_is_not_starved():
+    scheduler = FairScheduler(max_concurrency=2)
+    scheduler.register_job("bulk")
+    scheduler.register_job("urgent", priority=10)
+    order = []
+
+    async def run():
+        bulk = [asyncio.create_task(_task(scheduler, "bulk", order)) for _ in range(30)]
+        await asyncio.sleep(0.005)
+        started = len(order)
+        urgent = [asyncio.create_task(_task(scheduler, "urgent", order)) for _ in range(3)]
+        await asyncio.gather(*bulk, *urgent)
+        return started
+
+    started = asyncio.run(run())
+    assert 0 < started < 30
+    # 紧急作业排队后，至多等待已经在途的两个请求
+    assert order[started:started + 5].count("urgent") == 3
+
+
+def test_per_job_cap_is_enforced():
+    scheduler = FairScheduler(max_concurrency=8)
+    scheduler.register_job("capped", max_concurrency=2)
+    peaks = {"capped": 0, "free": 0}
+    running = {"capped": 0, "free": 0}
+
+    async def task(job_name):
+        async with scheduler.slot(job_name):
+            running[job_name] += 1
+            peaks[job_name] = max(peaks[job_name], running[job_name])
+            await asyncio.sleep(0.002)
+            running[job_name] -= 1
+
+    async def run():
+        await asyncio.gather(*(task(name) for name in ("capped", "free") for _ in range(12)))
+
+    asyncio.run(run())
+    assert peaks["capped"] == 2
+    assert peaks["free"] == 6
+    assert scheduler.stats()["capped"]["completed"] == 12
+
+
+def test_weights_divide_throughput_proportionally():
+    scheduler = FairScheduler(max_concurrency=1)
+    scheduler.register_job("heavy", weight=3.0)
+    scheduler.register_job("light", weight=1.0)
+    order = []
+
+    async def run():
+        await asyncio.gather(
+            *(_task(scheduler, name, order, duration=0) for name in ("heavy", "light") for _ in range(60))
+        )
+
+    asyncio.run(run())
+    window = order[:40]
+    assert abs(window.count("heavy") - 30) <= 2
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    scheduler = FairScheduler(max_concurrency=1)
+    order = []
+
+    async def run():
+        holder = asyncio.create_task(_task(scheduler, "a", order, duration=0.01))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(_task(scheduler, "b", order))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await holder
+        await _task(scheduler, "c", order)
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(run())
+    assert order == ["a", "c"]
+    assert scheduler.stats()["b"]["queued"] == 0
+
+
+def test_global_limit_holds_across_event_loops():
+    scheduler = FairScheduler(max_concurrency=2)
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    async def task(job_name):
+        async with scheduler.slot(job_name):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            await asyncio.sleep(0.002)
+            with lock:
+                state["running"] -= 1
+
+    def run(job_name):
+        async def main():
+            await asyncio.gather(*(task(job_name) for _ in range(10)))
+
+        asyncio.run(main())
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in ("a", "b", "c")]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert time.monotonic() - started < 10
+    assert state["peak"] == 2
+    assert {name: stats["completed"] for name, stats in scheduler.stats().items()} == {"a": 10, "b": 10, "c": 10}
+
+
+def test_job_slot_without_scheduler_is_a_no_op():
+    async def run():
+        async with job_slot(None, "job"):
+            return True
+
+    assert asyncio.run(run())
@@ -0,0 +1,126 @@
+import asyncio
+import random
+
+import pytest
+
+from judgement.sequential import SequentialEvaluation, create_sequential
+
+
+def _row(score, group=None, field="acc"):
+    row = {"model_based_judgement": {field: score}}
+    if group is not None:
+        row["input"] = {"meta_info": {"model_name": group}}
+    return row
+
+
+def _feed(evaluation, scores, group=None):
+    for score in scores:
+        if evaluation.update(_row(score, group)):
+            break
+    return evaluation
+
+
+def test_constant_stream_does_not_stop_asymptotic():
+    evaluation = _feed(SequentialEvaluation(precision=0.05), [1] * 500)
+    assert not evaluation.stopped
+    estimate = evaluation.summary()["estimates"]["all"]["acc"]
+    assert estimate["n"] == 500
+    assert estimate["low"] is None and estimate["high"] is None
+
+
+def test_constant_stream_bernstein_keeps_width_at_min_rows():
+    evaluation = _feed(SequentialEvaluation(precision=0.05, score_range=(0, 1)), [1] * 30)
+    assert evaluation.method == "bernstein"
+    assert not evaluation.stopped
+    estimate = evaluation.summary()["estimates"]["all"]["acc"]
+    assert (estimate["high"] - estimate["low"]) / 2 > 0.05
+    assert estimate["low"] < 0.95
+
+
+@pytest.mark.parametrize("method", ["bernstein", "asymptotic"])
+@pytest.mark.parametrize("p", [0.95, 0.5])
+def test_binary_stream_covers_mean_when_stopped(method, p):
+    misses = 0
+    runs = 200
+    for seed in range(runs):
+        rng = random.Random(seed)
+        evaluation = SequentialEvaluation(
+            precision=0.05,
+            method=method,
+            score_range=(0, 1) if method == "bernstein" else None,
+        )
+        _feed(evaluation, (int(rng.random() < p) for _ in range(5000)))
+        assert evaluation.stopped and evaluation.reason == "precision"
+        estimate = evaluation.summary()["estimates"]["all"]["acc"]
+        misses += not estimate["low"] <= p <= estimate["high"]
+    assert misses / runs <= 0.05
+
+
+def test_constant_groups_are_not_significant_without_range():
+    evaluation = SequentialEvaluation(group_by="input.meta_info.model_name")
+    for _ in range(200):
+        evaluation.update(_row(3, "a"))
+        evaluation.update(_row(8, "b"))
+    assert not evaluation.stopped
+    assert evaluation.summary()["difference"]["acc"]["significant"] is False
+
+
+def test_two_groups_stop_on_significance():
+    rng = random.Random(0)
+    evaluation = SequentialEvaluation(group_by="input.meta_info.model_name", score_range=(1, 10))
+    for _ in range(5000):
+        evaluation.update(_row(rng.randint(1, 6), "a"))
+        if evaluation.update(_row(rng.randint(5, 10), "b")):
+            break
+    assert evaluation.stopped and evaluation.reason == "significance"
+    difference = evaluation.summary()["difference"]["acc"]
+    assert (difference["baseline"], difference["candidate"]) == ("a", "b")
+    assert 0 < difference["low"] <= 4 <= difference["high"]
+
+
+def test_errors_and_non_numeric_scores_are_skipped():
+    evaluation = SequentialEvaluation(precision=0.1)
+    evaluation.update({"error": "boom"})
+    evaluation.update({"model_based_judgement": {"acc": "n/a", "flag": True, "other": None}})
+    evaluation.update(_row(float("nan")))
+    evaluation.update(_row("7"))
+    assert evaluation.rows == 4
+    assert {field: e.n for field, e in evaluation.estimates["all"].items()} == {"acc": 1}
+
+
+def test_guard_stops_yielding_after_stop():
+    evaluation = SequentialEvaluation(precision=0.1)
+
+    async def units():
+        for i in range(10):
+            yield i
+
+    async def collect():
+        seen = []
+        async for unit in evaluation.guard(units()):
+            seen.append(unit)
+            if unit == 2:
+                evaluation.stopped = True
+        return seen
+
+    assert asyncio.run(collect()) == [0, 1, 2]
+
+
+def test_order_shuffles_sequences_only():
+    evaluation = SequentialEvaluation(precision=0.1, seed=1)
+    rows = list(range(100))
+    ordered = evaluation.order(rows)
+    assert sorted(ordered) == rows and ordered != rows
+    generator = iter(rows)
+    assert evaluation.order(generator) is generator
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError):
+        SequentialEvaluation()
+    with pytest.raises(ValueError):
+        SequentialEvaluation(precision=0.1, method="hoeffding")
+    with pytest.raises(ValueError):
+        SequentialEvaluation(precision=0.1, score_range=(5, 5))
+    assert create_sequential({"enabled": False, "precision": 0.1}) is None
+    assert create_sequential({"enabled": True, "precision": 0.1}).method == "asymptotic"
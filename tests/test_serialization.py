@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import pytest
+
+from tests.helpers import FakeClient, generation_rows, judge_rows
+from utils.serialization import JSON_BACKENDS, RESULT_FIELDS, create_serializer, typed_decoder
+
+MODEL = {"api_key": "test", "base_url": "http://localhost", "model": "test-model", "rate_limit": 1000}
+
+
+def _available_backends():
+    backends = []
+    for name in JSON_BACKENDS:
+        try:
+            create_serializer(name)
+        except ImportError:
+            continue
+        backends.append(name)
+    return backends
+
+
+@pytest.fixture(params=_available_backends())
+def serializer(request):
+    return create_serializer(request.param)
+
+
+@pytest.mark.parametrize("value", [2**64, 2**64 - 1, -(2**63) - 1, -(2**100)])
+def test_wide_integers_round_trip_exactly(serializer, value):
+    row = {"id": value, "nested": [value]}
+    decoded = serializer.decode(serializer.encode(row))
+    assert decoded == row and isinstance(decoded["id"], int)
+    assert serializer.decode(serializer.encode(row).decode("utf-8")) == row
+
+
+def test_long_digit_strings_stay_strings(serializer):
+    row = {"trace_id": "12345678901234567890123", "score": 1.5}
+    assert serializer.decode(serializer.encode(row)) == row
+
+
+def test_decodes_nan_written_by_json_module(serializer):
+    decoded = serializer.decode(json.dumps({"score": float("nan")}))
+    assert decoded["score"] != decoded["score"]
+
+
+def test_output_matches_json_module(serializer):
+    row = {"response": "中文", "usage": {"total_tokens": 15}, "items": [1, 2.5, None, True]}
+    assert serializer.encode(row) == json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def test_invalid_json_raises_value_error(serializer):
+    with pytest.raises(ValueError):
+        serializer.decode(b'{"a": ')
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown JSON backend"):
+        create_serializer("yaml")
+
+
+def _saved_lines(path):
+    with open(path, "rb") as file:
+        return [line for line in file if line.strip()]
+
+
+async def _consume(stream):
+    return [json.dumps(result, ensure_ascii=False).encode() async for result in stream]
+
+
+def _failing_on(marker, response):
+    """单条请求的 prompt 含 marker 时抛出异常（写入 error 结果），否则返回 response"""
+
+    def respond(prompt, system_prompt):
+        if marker in prompt and "<item id=" not in prompt:
+            raise RuntimeError("boom")
+        return response(prompt) if callable(response) else response
+
+    return respond
+
+
+@pytest.fixture
+def pipeline_lines(generation_pipeline, judgement_pipeline):
+    """两个 pipeline 写入和流式返回的各种结果：多采样、近重复、跳过、打包评判和出错的行"""
+    generation = generation_pipeline(model=dict(MODEL, n=3), dedup={"enabled": True, "mode": "drop", "capacity": 100})
+    outputs = ["identical output " * 5, "identical output " * 5, "a completely unrelated answer about birds"]
+    client = FakeClient(_failing_on("topic 1", outputs))
+    generated = asyncio.run(_consume(generation.astream(
+        generation_rows(3), client=client, score_function=lambda sample: len(sample["response"])
+    )))
+    judgement = judgement_pipeline()
+    packed = "<item id=1><overall>8</overall></item>"
+    client = FakeClient(_failing_on("question 2", lambda prompt: packed if "<item id=" in prompt else "<overall>7</overall>"))
+    judged = asyncio.run(_consume(judgement.astream(
+        judge_rows(3), client=client, pack_size=3, model_judgement_function=judgement.make_judgement_extractor()
+    )))
+    return {
+        "generation": _saved_lines(generation.experiment_path) + generated,
+        "judgement": _saved_lines(judgement.experiment_path) + judged,
+    }
+
+
+def test_result_fields_cover_every_saved_field(pipeline_lines):
+    seen = {kind: set().union(*(json.loads(line) for line in lines)) for kind, lines in pipeline_lines.items()}
+    assert {"sample", "samples", "near_duplicate", "skipped", "naive_response", "error"} <= seen["generation"]
+    assert {"pack", "error"} <= seen["judgement"]
+    for kind, fields in seen.items():
+        assert fields <= set(RESULT_FIELDS[kind]), kind
+
+
+def test_typed_decoder_round_trips_saved_rows(pipeline_lines):
+    msgspec = pytest.importorskip("msgspec")
+    for kind, lines in pipeline_lines.items():
+        decode = typed_decoder(kind)
+        for line in lines:
+            assert msgspec.to_builtins(decode(line)) == json.loads(line)
+    decoded = typed_decoder("generation")(b'{"usage": null, "skipped": "near_duplicate"}')
+    assert decoded.usage is None and decoded.skipped == "near_duplicate" and decoded.error is msgspec.UNSET
@@ -0,0 +1,68 @@
+import asyncio
+
+import yaml
+
+import agent.sessions
+from agent.sessions import SessionManager
+
+
+class _Client:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def _manager(tmp_path, monkeypatch, **config):
+    created = []
+
+    def create_client(config_data):
+        created.append(_Client())
+        return created[-1]
+
+    monkeypatch.setattr(agent.sessions, "create_client", create_client)
+    config_path = tmp_path / "agent.yaml"
+    config_path.write_text(yaml.safe_dump({"record_path": str(tmp_path / "records"), **config}), encoding="utf-8")
+    return SessionManager(str(config_path), experiment_name="test"), created
+
+
+def test_overlapping_runs_keep_their_own_client(tmp_path, monkeypatch):
+    manager, created = _manager(tmp_path, monkeypatch, rate_limit=600)
+
+    async def session_function(session_agent, session):
+        await asyncio.sleep(0.01)
+        assert not session_agent.client.closed
+        return session_agent.client, session_agent.rate_limiter
+
+    async def run():
+        return await asyncio.gather(
+            manager.arun(range(4), session_function, concurrency_limit=2, progress=[]),
+            manager.arun(range(4), session_function, concurrency_limit=2, progress=[]),
+        )
+
+    first, second = asyncio.run(run())
+    assert len(created) == 2 and all(client.closed for client in created)
+    for results, client in zip((first, second), created):
+        assert {result["output"][0] for result in results} == {client}
+        assert len({id(result["output"][1]) for result in results}) == 1
+    assert first[0]["output"][1] is not second[0]["output"][1]
+    assert manager.stats()["sessions"] == 8
+
+
+def test_client_is_closed_when_the_stream_stops_early(tmp_path, monkeypatch):
+    manager, created = _manager(tmp_path, monkeypatch)
+
+    async def session_function(session_agent, session):
+        await asyncio.sleep(0.01 * session)
+        return session
+
+    async def run():
+        stream = manager.astream(range(5), session_function, concurrency_limit=5)
+        async for result in stream:
+            break
+        await stream.aclose()
+        return result
+
+    assert asyncio.run(run())["output"] == 0
+    assert created[0].closed
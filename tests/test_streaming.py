@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+from tests.helpers import FakeClient, generation_rows, judge_rows
+from utils.streaming import aenumerate, bounded_as_completed, ensure_no_running_loop
+
+
+class _Probe:
+    """记录在途任务数的峰值和数据源被读取的条数"""
+
+    def __init__(self, delay=0.002):
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+        self.read = 0
+        self.peaks = []
+
+    async def source(self, count):
+        for i in range(count):
+            self.read += 1
+            yield i
+
+    async def worker(self, item):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        self.peaks.append(self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        return item
+
+
+def test_in_flight_bound_and_backpressure():
+    probe = _Probe()
+
+    async def run():
+        results = []
+        async for result in bounded_as_completed(probe.source(50), probe.worker, 4):
+            results.append(result)
+            # 数据源最多比调用方取走的结果多读 limit 条
+            assert probe.read <= len(results) + 4
+        return results
+
+    results = asyncio.run(run())
+    assert sorted(results) == list(range(50))
+    assert probe.peak == 4
+
+
+def test_finished_results_do_not_wait_for_the_source():
+    async def slow_source():
+        yield 0
+        await asyncio.sleep(0.5)
+        yield 1
+
+    async def worker(item):
+        return item
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async for result in bounded_as_completed(slow_source(), worker, 4):
+            return result, loop.time() - started
+
+    result, elapsed = asyncio.run(run())
+    assert result == 0 and elapsed < 0.25
+
+
+def test_callable_limit_is_read_before_each_dispatch():
+    probe = _Probe()
+    limit = {"value": 1}
+
+    async def run():
+        async for result in bounded_as_completed(probe.source(30), probe.worker, lambda: limit["value"]):
+            if result == 4:
+                limit["value"] = 5
+
+    asyncio.run(run())
+    assert probe.peaks[:5] == [1] * 5
+    assert probe.peak == 5
+
+
+def test_early_exit_cancels_pending_work():
+    probe = _Probe()
+    cancelled = []
+
+    async def worker(item):
+        try:
+            await asyncio.sleep(0.01 if item == 0 else 1)
+            return item
+        except asyncio.CancelledError:
+            cancelled.append(item)
+            raise
+
+    async def run():
+        async for result in bounded_as_completed(probe.source(100), worker, 3):
+            return result
+
+    assert asyncio.run(run()) == 0
+    assert sorted(cancelled) == [1, 2]
+    assert probe.read == 3
+
+
+def test_invalid_limit_is_rejected():
+    async def run():
+        async for _ in bounded_as_completed([1], asyncio.sleep, 0):
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+
+def test_aenumerate_accepts_sync_and_async_sources():
+    async def source():
+        yield "a"
+        yield "b"
+
+    async def run():
+        return [item async for item in aenumerate(source(), start=1)], [item async for item in aenumerate("xy")]
+
+    assert asyncio.run(run()) == ([(1, "a"), (2, "b")], [(0, "x"), (1, "y")])
+
+
+def test_arun_works_inside_a_running_loop(generation_pipeline, judgement_pipeline):
+    generation = generation_pipeline()
+    judge = judgement_pipeline()
+
+    async def run():
+        generated = await generation.arun(
+            generation_rows(3), client=FakeClient(lambda prompt, system: "text"), progress=[]
+        )
+        judged = await judge.arun(
+            judge_rows(3),
+            model_judgement_function=judge.make_judgement_extractor(),
+            client=FakeClient(lambda prompt, system: "<overall>6</overall>"),
+            progress=[],
+        )
+        return generated, judged
+
+    generated, judged = asyncio.run(run())
+    assert [result["response"] for result in generated] == ["text"] * 3
+    assert [result["model_based_judgement"]["overall"] for result in judged] == [6] * 3
+
+
+def test_run_refuses_a_running_loop(generation_pipeline, judgement_pipeline):
+    generation = generation_pipeline()
+    judge = judgement_pipeline()
+
+    async def run():
+        with pytest.raises(RuntimeError, match="await pipeline.arun"):
+            generation.run(generation_rows(1))
+        with pytest.raises(RuntimeError, match="await pipeline.arun"):
+            judge.run(judge_rows(1))
+
+    asyncio.run(run())
+    ensure_no_running_loop("pipeline.arun")
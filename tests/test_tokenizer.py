@@ -0,0 +1,70 @@
+import asyncio
+import sys
+import types
+
+import pytest
+
+import judgement.pipeline
+from tests.helpers import FakeClient, generation_rows, judge_rows
+from utils import tokenizer
+
+
+@pytest.fixture
+def fake_tiktoken(monkeypatch):
+    state = {"calls": 0, "fail": True}
+
+    def get_encoding(name):
+        state["calls"] += 1
+        if state["fail"]:
+            raise ConnectionError("offline")
+        return types.SimpleNamespace(encode=lambda text: text.split())
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(get_encoding=get_encoding))
+    tokenizer.reset_tokenizer_cache()
+    yield state
+    tokenizer.reset_tokenizer_cache()
+
+
+def test_load_failure_is_cached(fake_tiktoken):
+    for _ in range(3):
+        with pytest.raises(RuntimeError) as error:
+            tokenizer.count_tokens("a b")
+        assert isinstance(error.value.__cause__, ConnectionError)
+    assert fake_tiktoken["calls"] == 1
+
+    fake_tiktoken["fail"] = False
+    tokenizer.reset_tokenizer_cache()
+    assert tokenizer.count_tokens("a b c") == 3
+    assert tokenizer.count_tokens("a") == 1
+    assert fake_tiktoken["calls"] == 2
+
+
+def test_astream_fails_before_dispatch_without_tokenizer(judgement_pipeline, fake_tiktoken, monkeypatch):
+    monkeypatch.setattr(judgement.pipeline, "get_tokenizer", tokenizer.get_tokenizer)
+    pipeline = judgement_pipeline()
+    client = FakeClient(lambda prompt, system: "<overall>5</overall>")
+
+    async def run():
+        return [row async for row in pipeline.astream(judge_rows(5), client=client)]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+    assert client.calls == []
+    assert fake_tiktoken["calls"] == 1
+
+
+def test_workflow_fails_before_dispatch_without_tokenizer(generation_pipeline, judgement_pipeline, fake_tiktoken, monkeypatch):
+    import workflow.pipeline
+    from workflow.pipeline import GenerateJudgePipeline
+
+    monkeypatch.setattr(workflow.pipeline, "get_tokenizer", tokenizer.get_tokenizer)
+    client = FakeClient(lambda prompt, system: "<draft>text</draft>")
+    monkeypatch.setattr(workflow.pipeline, "OpenAIClient", lambda *args, **kwargs: client)
+    fused = GenerateJudgePipeline(generation_pipeline(), judgement_pipeline(), to_judge_input=lambda r: {"answer": "a"})
+
+    async def run():
+        return [row async for row in fused.astream(generation_rows(3))]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+    assert client.calls == []
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from agent.tools import Tool, ToolExecutor
+
+
+def _call(name, call_id="1", **arguments):
+    return {"name": name, "call_id": call_id, "arguments": json.dumps(arguments)}
+
+
+def _square_with_pid(x):
+    return {"square": x * x, "pid": os.getpid()}
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_calls_in_one_round_run_in_parallel():
+    executor = ToolExecutor()
+    threads = set()
+
+    @executor.register
+    async def wait(seconds):
+        await asyncio.sleep(seconds)
+        return seconds
+
+    @executor.register
+    def block(seconds):
+        threads.add(threading.current_thread().name)
+        time.sleep(seconds)
+        return "done"
+
+    started = time.perf_counter()
+    outputs = _run(executor.execute_all(
+        [_call("wait", "a", seconds=0.2), _call("block", "b", seconds=0.2), _call("block", "c", seconds=0.2)]
+    ))
+    elapsed = time.perf_counter() - started
+    executor.close()
+
+    assert elapsed < 0.35
+    assert [output["call_id"] for output in outputs] == ["a", "b", "c"]
+    assert [output["output"] for output in outputs] == ["0.2", "done", "done"]
+    assert all(name.startswith("agent-tool") for name in threads)
+
+
+def test_timeouts_are_per_call_and_reported_to_the_model():
+    executor = ToolExecutor(default_timeout=5)
+
+    @executor.register(timeout=0.05)
+    async def slow():
+        await asyncio.sleep(1)
+
+    @executor.register
+    async def fast():
+        return {"ok": True}
+
+    started = time.perf_counter()
+    outputs = _run(executor.execute_all([_call("slow", "a"), _call("fast", "b")]))
+    assert time.perf_counter() - started < 0.5
+    assert outputs[0]["output"] == "Error: tool slow timed out"
+    assert json.loads(outputs[1]["output"]) == {"ok": True}
+    assert executor.stats()["timeouts"] == 1
+
+
+def test_errors_and_unknown_tools_do_not_raise():
+    executor = ToolExecutor()
+
+    @executor.register
+    def broken():
+        raise RuntimeError("boom")
+
+    outputs = _run(executor.execute_all([_call("broken"), _call("missing"), {"name": "broken", "call_id": "x", "arguments": "{"}]))
+    assert outputs[0]["output"] == "Error: boom"
+    assert "unknown tool 'missing'" in outputs[1]["output"]
+    assert outputs[2]["output"].startswith("Error:")
+    assert executor.stats()["errors"] == 3
+    executor.close()
+
+
+def test_process_backend_runs_in_another_process():
+    executor = ToolExecutor(tools=[Tool(_square_with_pid, mode="process")], max_processes=1)
+    try:
+        output = _run(executor.execute(_call("_square_with_pid", x=7)))
+    finally:
+        executor.close()
+    result = json.loads(output["output"])
+    assert result["square"] == 49 and result["pid"] != os.getpid()
+
+
+def test_idempotent_calls_are_cached_and_deduplicated():
+    executor = ToolExecutor(cache_size=2)
+    runs = []
+
+    @executor.register(idempotent=True)
+    async def lookup(key):
+        runs.append(key)
+        await asyncio.sleep(0.05)
+        return key.upper()
+
+    async def run():
+        # 并发的相同调用只执行一次
+        first = await executor.execute_all([_call("lookup", str(i), key="a") for i in range(3)])
+        second = await executor.execute_all([_call("lookup", key="a"), _call("lookup", key="b"), _call("lookup", key="c")])
+        # 缓存只保留最近的 2 条，"a" 已被淘汰
+        third = await executor.execute(_call("lookup", key="a"))
+        return first, second, third
+
+    first, second, third = _run(run())
+    assert [output["output"] for output in first] == ["A"] * 3
+    assert [output["output"] for output in second] == ["A", "B", "C"]
+    assert third["output"] == "A"
+    assert runs == ["a", "b", "c", "a"]
+    assert executor.stats()["cache_hits"] == 3
+
+
+def test_failed_idempotent_calls_are_not_cached():
+    executor = ToolExecutor()
+    attempts = []
+
+    @executor.register(idempotent=True)
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("try again")
+        return "ok"
+
+    assert _run(executor.execute(_call("flaky")))["output"] == "Error: try again"
+    assert _run(executor.execute(_call("flaky")))["output"] == "ok"
+    assert len(attempts) == 2
+
+
+def test_invalid_mode_is_rejected():
+    with pytest.raises(ValueError, match="Unknown tool mode"):
+        Tool(lambda: None, mode="gpu")
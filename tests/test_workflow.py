@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import workflow.pipeline
+from tests.helpers import FakeClient, generation_rows
+from workflow.pipeline import GenerateJudgePipeline
+
+MODEL = {"api_key": "test", "base_url": "http://localhost", "model": "test-model", "rate_limit": 1000}
+
+
+def _judge_response(prompt, system_prompt):
+    return "<overall>7</overall>"
+
+
+def _fused(generation, judge, **kwargs):
+    return GenerateJudgePipeline(
+        generation, judge, to_judge_input=lambda result: {"answer": result["response"]}, **kwargs
+    )
+
+
+def _install_clients(monkeypatch, *clients):
+    """按创建顺序返回给定的客户端，并记录每次创建的参数"""
+    created = iter(clients)
+    calls = []
+
+    def create(config, async_client=None):
+        calls.append(async_client)
+        return next(created)
+
+    monkeypatch.setattr(workflow.pipeline, "OpenAIClient", create)
+    return calls
+
+
+def _consume(fused, rows, judge, **kwargs):
+    async def run():
+        return [
+            record
+            async for record in fused.astream(
+                rows, model_judgement_function=judge.make_judgement_extractor(), **kwargs
+            )
+        ]
+
+    return asyncio.run(run())
+
+
+def _topic(prompt):
+    return next(word for word in prompt.split() if word.startswith("t") and word[1:].isdigit())
+
+
+def _rows(count):
+    rows = generation_rows(count)
+    for i, row in enumerate(rows):
+        row["user_prompt_kwargs"]["topic"] = f"t{i}"
+    return rows
+
+
+def test_resume_skips_completed_rows_and_retries_failures(generation_pipeline, judgement_pipeline, monkeypatch):
+    generation, judge = generation_pipeline(), judgement_pipeline()
+    output_path = str(generation.experiment_dir) + "/fused.jsonl"
+    first = FakeClient(lambda prompt, system: None if _topic(prompt) == "t1" else f"draft {_topic(prompt)}")
+    _install_clients(monkeypatch, first, FakeClient(_judge_response))
+    records = _consume(_fused(generation, judge, output_path=output_path), _rows(3), judge)
+    assert sorted(record.get("error", "") for record in records) == ["", "", "generation failed"]
+
+    second = FakeClient(lambda prompt, system: f"draft {_topic(prompt)}")
+    _install_clients(monkeypatch, second, FakeClient(_judge_response))
+    records = _consume(_fused(generation, judge, output_path=output_path), _rows(4), judge)
+
+    assert sorted(_topic(call["prompt"]) for call in second.calls) == ["t1", "t3"]
+    assert not any("error" in record for record in records)
+    with open(output_path, encoding="utf-8") as file:
+        assert len([json.loads(line) for line in file]) == 5
+
+
+def test_skipped_generation_rows_are_neither_judged_nor_saved(generation_pipeline, judgement_pipeline, monkeypatch):
+    generation = generation_pipeline(dedup={"enabled": True, "mode": "drop", "capacity": 100})
+    judge = judgement_pipeline()
+    judgement_client = FakeClient(_judge_response)
+    _install_clients(monkeypatch, FakeClient(lambda prompt, system: "the same draft " * 5), judgement_client)
+    fused = _fused(generation, judge)
+
+    records = _consume(fused, _rows(3), judge, generation_concurrency=1)
+    assert len(records) == 1 and len(judgement_client.calls) == 1
+
+    # 被丢弃的数据没有写入，续跑时重新生成
+    generation_client = FakeClient(lambda prompt, system: f"a new draft about {_topic(prompt)} " * 5)
+    _install_clients(monkeypatch, generation_client, FakeClient(_judge_response))
+    records = _consume(_fused(generation, judge, output_path=fused.output_path), _rows(3), judge)
+    assert len(generation_client.calls) == 2 and len(records) == 2
+
+
+def test_clients_share_a_connection_pool_only_for_the_same_endpoint(
+    generation_pipeline, judgement_pipeline, monkeypatch
+):
+    pool = object()
+    generation_client = FakeClient(lambda prompt, system: "draft")
+    generation_client.client = pool
+
+    calls = _install_clients(monkeypatch, generation_client, FakeClient(_judge_response))
+    _fused(generation_pipeline(), judgement_pipeline())._create_clients()
+    assert calls == [None, pool]
+
+    calls = _install_clients(monkeypatch, generation_client, FakeClient(_judge_response))
+    judge = judgement_pipeline(model=dict(MODEL, base_url="http://judge.local"))
+    _fused(generation_pipeline(), judge)._create_clients()
+    assert calls == [None, None]
+
+
+def test_judged_records_are_yielded_before_the_next_generation(generation_pipeline, judgement_pipeline, monkeypatch):
+    generation, judge = generation_pipeline(), judgement_pipeline()
+    _install_clients(monkeypatch, FakeClient(lambda prompt, system: "draft"), FakeClient(_judge_response))
+    fused = _fused(generation, judge)
+
+    async def slow_pool():
+        rows = _rows(2)
+        yield rows[0]
+        await asyncio.sleep(0.5)
+        yield rows[1]
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        stream = fused.astream(slow_pool(), model_judgement_function=judge.make_judgement_extractor())
+        try:
+            async for record in stream:
+                return record, loop.time() - started
+        finally:
+            await stream.aclose()
+
+    record, elapsed = asyncio.run(run())
+    assert record["judgement"]["model_based_judgement"]["overall"] == 7
+    assert elapsed < 0.3
@@ -0,0 +1,175 @@
+import gzip
+import io
+import zlib
+from typing import IO, BinaryIO, Callable, Iterator, Optional, Tuple
+from utils.logger_config import get_logger
+
+logger = get_logger(name="compression", log_file="compression.log")
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+_READ_CHUNK = 1 << 20
+
+
+def _require_zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "zstandard is required for zstd compression, install it with `pip install zstandard`"
+        ) from e
+    return zstandard
+
+
+def _check(compression: Optional[str]) -> None:
+    if compression is not None and compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(
+            f"Unknown compression {compression!r}, expected one of {tuple(COMPRESSION_SUFFIXES)}"
+        )
+
+
+def compressed_path(path: str, compression: Optional[str]) -> str:
+    """
+    加上压缩格式对应的后缀（已有后缀时不重复添加）
+
+    Args:
+        path (str): 原始文件路径
+        compression (Optional[str]): 压缩格式，None 表示不压缩
+
+    Returns:
+        str: 实际写入的文件路径
+    """
+    _check(compression)
+    if compression is None:
+        return path
+    suffix = COMPRESSION_SUFFIXES[compression]
+    return path if path.endswith(suffix) else path + suffix
+
+
+def detect_compression(path: str) -> Optional[str]:
+    """
+    按后缀判断文件的压缩格式
+
+    Args:
+        path (str): 文件路径
+
+    Returns:
+        Optional[str]: "gzip" / "zstd"，不压缩时为 None
+    """
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+    return None
+
+
+def frame_compressor(compression: Optional[str], level: Optional[int] = None) -> Callable[[bytes], bytes]:
+    """
+    创建按帧压缩的函数：每次调用把一批数据压缩为一个独立的帧（gzip member / zstd frame），
+    多个帧直接拼接写入同一个文件，崩溃时只会丢失最后一个没写完的帧。
+    返回的函数不是线程安全的，每个写入器应各自创建
+
+    Args:
+        compression (Optional[str]): 压缩格式，None 表示不压缩
+        level (Optional[int]): 压缩级别，默认 gzip 为 6，zstd 为 3
+
+    Returns:
+        Callable[[bytes], bytes]: 输入一批数据，返回压缩后的帧
+    """
+    _check(compression)
+    if compression is None:
+        return lambda data: data
+    level = DEFAULT_LEVELS[compression] if level is None else level
+    if compression == "gzip":
+        return lambda data: gzip.compress(data, compresslevel=level)
+    return _require_zstandard().ZstdCompressor(level=level).compress
+
+
+def _decompressor(compression: str):
+    if compression == "gzip":
+        return zlib.decompressobj(wbits=31)
+    return _require_zstandard().ZstdDecompressor().decompressobj()
+
+
+def iter_frames(file: BinaryIO, compression: str, offset: int = 0) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    从 offset（帧的起始位置）开始逐帧解压，用于按压缩字节偏移增量读取和随机访问
+
+    Args:
+        file (BinaryIO): 以二进制模式打开的压缩文件
+        compression (str): 压缩格式
+        offset (int): 起始的压缩字节偏移，必须位于帧边界
+
+    Yields:
+        Tuple[int, int, bytes]: (帧起始偏移, 帧结束偏移, 解压后的数据)，
+            未写完的最后一帧不会产出，留到下次读取
+    """
+    _check(compression)
+    file.seek(offset)
+    start = offset
+    position = offset
+    decompressor = _decompressor(compression)
+    parts = []
+    while True:
+        data = file.read(_READ_CHUNK)
+        if not data:
+            return
+        while data:
+            parts.append(decompressor.decompress(data))
+            if not decompressor.eof:
+                position += len(data)
+                break
+            unused = decompressor.unused_data
+            end = position + len(data) - len(unused)
+            yield start, end, b"".join(parts)
+            start = position = end
+            parts = []
+            decompressor = _decompressor(compression)
+            data = unused
+
+
+def open_text(path: str) -> IO[str]:
+    """
+    以文本模式打开文件，按后缀透明解压（.gz / .zst）
+
+    Args:
+        path (str): 文件路径
+
+    Returns:
+        IO[str]: 文本流
+    """
+    compression = detect_compression(path)
+    if compression == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if compression == "zstd":
+        raw = open(path, "rb")
+        reader = _require_zstandard().ZstdDecompressor().stream_reader(
+            raw, read_across_frames=True, closefd=True
+        )
+        return io.TextIOWrapper(io.BufferedReader(reader), encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_lines(path: str) -> Iterator[str]:
+    """
+    逐行读取（可能压缩的）文本文件，压缩文件末尾未写完的帧会被忽略
+
+    Args:
+        path (str): 文件路径
+
+    Yields:
+        str: 单行文本（含换行符）
+    """
+    compression = detect_compression(path)
+    with open_text(path) as file:
+        if compression is None:
+            yield from file
+            return
+        try:
+            yield from file
+        except (EOFError, OSError, zlib.error) as e:
+            logger.warning(f"{path} ends with an incomplete frame, ignored: {e}")
+        except Exception as e:
+            # zstandard.ZstdError 不继承自 OSError
+            if type(e).__name__ != "ZstdError":
+                raise
+            logger.warning(f"{path} ends with an incomplete frame, ignored: {e}")
@@ -0,0 +1,154 @@
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from utils.tokenizer import count_tokens
+
+# 派生字段：路径最后一段为已注册的名称、且前面路径取到的值中没有同名字段时，对该值调用对应函数，
+# 例如 "response.length" -> len(result["response"])
+_DERIVED_FIELDS: Dict[str, Callable[[Any], Any]] = {}
+_LOOKUP_ERRORS = (KeyError, IndexError, TypeError)
+
+
+def register_derived_field(name: str, function: Callable[[Any], Any]) -> None:
+    """
+    注册派生字段
+
+    Args:
+        name (str): 派生字段名，作为路径的最后一段使用，如 "length"
+        function (Callable): 输入为前面路径取到的值，返回 None 表示该行没有这个字段
+    """
+    _DERIVED_FIELDS[name] = function
+    compile_path.cache_clear()
+
+
+def _length(value: Any) -> Optional[int]:
+    # 与原先 "response.length" 的行为一致：空值不计入统计
+    return len(value) if value else None
+
+
+def _token_count(value: Any) -> Optional[int]:
+    if not isinstance(value, str) or not value:
+        return None
+    return count_tokens(value)
+
+
+def _key_or_derived(name: str, function: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    # 同名的真实字段优先，例如 model_based_judgement.length 是评分而不是字典的长度
+    def resolve(value: Any) -> Any:
+        if isinstance(value, dict) and name in value:
+            return value[name]
+        return function(value)
+
+    return resolve
+
+
+def _split_path(field_path: str) -> Tuple[Tuple[str, ...], Optional[Callable[[Any], Any]]]:
+    parts = tuple(field_path.split("."))
+    if len(parts) > 1 and parts[-1] in _DERIVED_FIELDS:
+        return parts[:-1], _key_or_derived(parts[-1], _DERIVED_FIELDS[parts[-1]])
+    return parts, None
+
+
+def _apply(derived: Callable[[Any], Any], value: Any) -> Any:
+    if value is None:
+        return None
+    try:
+        return derived(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=1024)
+def compile_path(field_path: str) -> Callable[[Any], Any]:
+    """
+    把字段路径解析为取值函数，同一路径只解析一次
+
+    Args:
+        field_path (str): 字段路径，如 "model_based_judgement.accuracy" 或 "response.length"
+
+    Returns:
+        Callable: 输入一条结果，返回字段值，路径不存在时返回 None
+    """
+    parts, derived = _split_path(field_path)
+
+    if len(parts) == 1:
+        (key,) = parts
+
+        def lookup(row):
+            try:
+                return row[key]
+            except _LOOKUP_ERRORS:
+                return None
+    elif len(parts) == 2:
+        first, second = parts
+
+        def lookup(row):
+            try:
+                return row[first][second]
+            except _LOOKUP_ERRORS:
+                return None
+    else:
+        def lookup(row):
+            current = row
+            try:
+                for part in parts:
+                    current = current[part]
+            except _LOOKUP_ERRORS:
+                return None
+            return current
+
+    if derived is None:
+        return lookup
+    return lambda row: _apply(derived, lookup(row))
+
+
+class _Node:
+    __slots__ = ("children", "outputs")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.outputs: List[Tuple[int, Optional[Callable[[Any], Any]]]] = []
+
+
+def compile_fields(field_paths: Sequence[str]) -> Callable[[Any], List[Any]]:
+    """
+    把多个字段路径编译为一次性取值函数
+
+    路径按公共前缀合并为一棵树，每行只遍历一次，
+    例如 "model_based_judgement.accuracy" 和 "model_based_judgement.overall"
+    只查找一次 "model_based_judgement"。
+
+    Args:
+        field_paths (Sequence[str]): 字段路径列表
+
+    Returns:
+        Callable: 输入一条结果，返回与 field_paths 一一对应的值列表，不存在的字段为 None
+    """
+    root = _Node()
+    for index, field_path in enumerate(field_paths):
+        parts, derived = _split_path(field_path)
+        node = root
+        for part in parts:
+            node = node.children.setdefault(part, _Node())
+        node.outputs.append((index, derived))
+    size = len(field_paths)
+
+    def walk(node: _Node, value: Any, values: List[Any]) -> None:
+        for index, derived in node.outputs:
+            values[index] = value if derived is None else _apply(derived, value)
+        for part, child in node.children.items():
+            try:
+                child_value = value[part]
+            except _LOOKUP_ERRORS:
+                continue
+            walk(child, child_value, values)
+
+    def evaluate(row: Any) -> List[Any]:
+        values = [None] * size
+        walk(root, row, values)
+        return values
+
+    return evaluate
+
+
+register_derived_field("length", _length)
+register_derived_field("token_count", _token_count)
@@ -0,0 +1,507 @@
+import heapq
+import json
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from utils.compression import detect_compression, iter_frames
+from utils.field_access import compile_fields
+from utils.logger_config import get_logger
+from utils.records import FINGERPRINT_BYTES, fingerprint_head
+from utils.result_store import InputResolver, references_input
+from utils.serialization import loads
+
+logger = get_logger(name="incremental_stats", log_file="incremental_stats.log")
+
+STATE_VERSION = 1
+
+# 设置 top_k 时最多跟踪 top_k * HEAVY_HITTER_FACTOR 个分组
+HEAVY_HITTER_FACTOR = 10
+
+
+def _new_numeric() -> Dict[str, Any]:
+    return {"count": 0, "total": 0.0, "min": None, "max": None}
+
+
+class StatsAccumulator:
+    """
+    可合并的统计累加器
+
+    只保存计数、总和、最值和分布计数，可以逐行更新、相互合并并序列化为 JSON，
+    输出格式与 calculate_general_stats 相同。设置 group_by 时在同一次遍历中
+    按分组键做哈希聚合，每个分组各有一个子累加器。
+
+    设置 group_capacity 时用 space-saving 算法只跟踪有限个分组：分组数满时淘汰估计
+    结果数最小的分组，把它的统计合并进 other，新分组继承被淘汰分组的估计数作为误差上界。
+    结果数超过 总数 / group_capacity 的分组一定会被保留，但中途被淘汰过的分组只统计
+    最后一次进入之后的结果。
+    """
+
+    def __init__(
+        self,
+        numeric_fields: List[str] = None,
+        distribution_fields: List[str] = None,
+        group_by: List[str] = None,
+        group_capacity: Optional[int] = None,
+    ):
+        """
+        Args:
+            numeric_fields (List[str]): 需要计算数值统计的字段路径列表
+            distribution_fields (List[str]): 需要计算分布统计的字段路径列表
+            group_by (List[str]): 分组字段路径列表
+            group_capacity (int): 最多跟踪的分组数，None 表示不限制
+        """
+        if group_capacity is not None and group_capacity < 1:
+            raise ValueError("group_capacity must be at least 1")
+        self.numeric_fields = list(numeric_fields or [])
+        self.distribution_fields = list(distribution_fields or [])
+        self.group_by = list(group_by or [])
+        self.group_capacity = group_capacity
+        self.total_count = 0
+        self.success_count = 0
+        self.error_count = 0
+        self.numeric = {field: _new_numeric() for field in self.numeric_fields}
+        self.distribution: Dict[str, Dict[str, int]] = {
+            field: {} for field in self.distribution_fields
+        }
+        self.groups: Dict[str, "StatsAccumulator"] = {}
+        # space-saving 状态：各分组继承的计数误差、被淘汰分组的合计和淘汰次数
+        self.group_errors: Dict[str, int] = {}
+        self.evicted: Optional["StatsAccumulator"] = None
+        self.evicted_groups = 0
+        # (估计结果数, 分组键) 的小顶堆，估计数只增不减，过期的条目在淘汰时再修正
+        self._heap: List[Tuple[int, str]] = []
+        self._extract = None
+        self._extract_group_key = None
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """
+        累加单条结果
+
+        Args:
+            result (Dict[str, Any]): 单条结果
+        """
+        is_error = "error" in result
+        numeric_values = {}
+        distribution_values = {}
+        if not is_error:
+            if self._extract is None:
+                self._extract = compile_fields(self.numeric_fields + self.distribution_fields)
+            values = self._extract(result)
+            for field, value in zip(self.numeric_fields, values):
+                if value is None:
+                    continue
+                try:
+                    numeric_values[field] = float(value)
+                except (ValueError, TypeError):
+                    continue
+            for field, value in zip(self.distribution_fields, values[len(self.numeric_fields):]):
+                if value is not None:
+                    distribution_values[field] = str(value)
+
+        self._add_values(is_error, numeric_values, distribution_values)
+        if self.group_by:
+            # 分组键不跳过错误结果，错误率也能按分组统计
+            if self._extract_group_key is None:
+                self._extract_group_key = compile_fields(self.group_by)
+            key = json.dumps(
+                self._extract_group_key(result), ensure_ascii=False, default=str
+            )
+            group = self.groups.get(key)
+            if group is None:
+                group = self._new_group(key)
+            group._add_values(is_error, numeric_values, distribution_values)
+
+    def _add_values(
+        self,
+        is_error: bool,
+        numeric_values: Dict[str, float],
+        distribution_values: Dict[str, str],
+    ) -> None:
+        self.total_count += 1
+        if is_error:
+            self.error_count += 1
+            return
+        self.success_count += 1
+        for field, value in numeric_values.items():
+            stats = self.numeric[field]
+            stats["count"] += 1
+            stats["total"] += value
+            if stats["min"] is None or value < stats["min"]:
+                stats["min"] = value
+            if stats["max"] is None or value > stats["max"]:
+                stats["max"] = value
+        for field, key in distribution_values.items():
+            distribution = self.distribution[field]
+            distribution[key] = distribution.get(key, 0) + 1
+
+    def merge(self, other: "StatsAccumulator") -> "StatsAccumulator":
+        """把另一个累加器（字段相同）合并进来"""
+        self.total_count += other.total_count
+        self.success_count += other.success_count
+        self.error_count += other.error_count
+        for field, other_stats in other.numeric.items():
+            stats = self.numeric.setdefault(field, _new_numeric())
+            stats["count"] += other_stats["count"]
+            stats["total"] += other_stats["total"]
+            for key, pick in (("min", min), ("max", max)):
+                if other_stats[key] is not None:
+                    stats[key] = (
+                        other_stats[key] if stats[key] is None else pick(stats[key], other_stats[key])
+                    )
+        for field, other_distribution in other.distribution.items():
+            distribution = self.distribution.setdefault(field, {})
+            for key, count in other_distribution.items():
+                distribution[key] = distribution.get(key, 0) + count
+        for key, other_group in other.groups.items():
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = StatsAccumulator(
+                    self.numeric_fields, self.distribution_fields
+                )
+            group.merge(other_group)
+            if key in other.group_errors:
+                self.group_errors[key] = self.group_errors.get(key, 0) + other.group_errors[key]
+        if other.evicted is not None:
+            self._evicted_accumulator().merge(other.evicted)
+            self.evicted_groups += other.evicted_groups
+        if self.group_capacity is not None:
+            self._rebuild_heap()
+            while len(self.groups) > self.group_capacity:
+                self._evict_smallest()
+        return self
+
+    def _estimate(self, key: str) -> int:
+        """分组结果数的估计值（space-saving 中的上界）"""
+        return self.groups[key].total_count + self.group_errors.get(key, 0)
+
+    def _evicted_accumulator(self) -> "StatsAccumulator":
+        if self.evicted is None:
+            self.evicted = StatsAccumulator(self.numeric_fields, self.distribution_fields)
+        return self.evicted
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(self._estimate(key), key) for key in self.groups]
+        heapq.heapify(self._heap)
+
+    def _evict_smallest(self) -> int:
+        """淘汰估计结果数最小的分组并合并进 other，返回它的估计数"""
+        while True:
+            estimate, key = self._heap[0]
+            current = self._estimate(key)
+            if estimate == current:
+                heapq.heappop(self._heap)
+                break
+            heapq.heapreplace(self._heap, (current, key))
+        self._evicted_accumulator().merge(self.groups.pop(key))
+        self.group_errors.pop(key, None)
+        self.evicted_groups += 1
+        return current
+
+    def _new_group(self, key: str) -> "StatsAccumulator":
+        group = self.groups[key] = StatsAccumulator(self.numeric_fields, self.distribution_fields)
+        if self.group_capacity is None:
+            return group
+        error = self._evict_smallest() if len(self.groups) > self.group_capacity else 0
+        if error:
+            self.group_errors[key] = error
+        heapq.heappush(self._heap, (error, key))
+        return group
+
+    def _own_stats(self) -> Dict[str, Any]:
+        numeric_stats = {}
+        for field, stats in self.numeric.items():
+            if stats["count"] == 0:
+                numeric_stats[field] = {
+                    "count": 0, "total": 0, "average": 0.0, "min": None, "max": None
+                }
+            else:
+                numeric_stats[field] = {
+                    "count": stats["count"],
+                    "total": stats["total"],
+                    "average": stats["total"] / stats["count"],
+                    "min": stats["min"],
+                    "max": stats["max"],
+                }
+        return {
+            "total_count": self.total_count,
+            "success_count": self.success_count,
+            "error_count": self.error_count,
+            "numeric_stats": numeric_stats,
+            "distribution_stats": {
+                field: dict(distribution) for field, distribution in self.distribution.items()
+            },
+        }
+
+    def general_stats(self, top_k: Optional[int] = None) -> Dict[str, Any]:
+        """
+        转换为 calculate_general_stats 的输出格式
+
+        Args:
+            top_k (int): 只输出结果数最多的 K 个分组，其余分组合并为 other
+
+        Returns:
+            Dict[str, Any]: 统计信息，设置 group_by 时包含 groups 字段
+        """
+        stats = self._own_stats()
+        if not self.group_by:
+            return stats
+
+        ordered = sorted(self.groups, key=self._estimate, reverse=True)
+        kept = ordered if top_k is None else ordered[:top_k]
+        rest = [] if top_k is None else ordered[top_k:]
+        other = None
+        if rest or self.evicted is not None:
+            other_accumulator = StatsAccumulator(self.numeric_fields, self.distribution_fields)
+            for key in rest:
+                other_accumulator.merge(self.groups[key])
+            if self.evicted is not None:
+                other_accumulator.merge(self.evicted)
+            other = dict(other_accumulator._own_stats(), group_count=len(rest) + self.evicted_groups)
+        items = []
+        for key in kept:
+            item = {"key": dict(zip(self.group_by, json.loads(key))), "stats": self.groups[key]._own_stats()}
+            if self.group_capacity is not None:
+                item["count_error"] = self.group_errors.get(key, 0)
+            items.append(item)
+        stats["groups"] = {
+            "by": self.group_by,
+            "group_count": len(self.groups) + self.evicted_groups,
+            "approximate": self.evicted_groups > 0,
+            "items": items,
+            "other": other,
+        }
+        return stats
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "numeric_fields": self.numeric_fields,
+            "distribution_fields": self.distribution_fields,
+            "group_by": self.group_by,
+            "group_capacity": self.group_capacity,
+            "total_count": self.total_count,
+            "success_count": self.success_count,
+            "error_count": self.error_count,
+            "numeric": self.numeric,
+            "distribution": self.distribution,
+            "groups": {key: group.to_dict() for key, group in self.groups.items()},
+            "group_errors": self.group_errors,
+            "evicted": self.evicted.to_dict() if self.evicted is not None else None,
+            "evicted_groups": self.evicted_groups,
+        }
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "StatsAccumulator":
+        accumulator = cls(
+            state["numeric_fields"],
+            state["distribution_fields"],
+            state.get("group_by"),
+            state.get("group_capacity"),
+        )
+        accumulator.total_count = state["total_count"]
+        accumulator.success_count = state["success_count"]
+        accumulator.error_count = state["error_count"]
+        accumulator.numeric = state["numeric"]
+        accumulator.distribution = state["distribution"]
+        accumulator.groups = {
+            key: cls.from_dict(group) for key, group in state.get("groups", {}).items()
+        }
+        accumulator.group_errors = state.get("group_errors", {})
+        if state.get("evicted") is not None:
+            accumulator.evicted = cls.from_dict(state["evicted"])
+        accumulator.evicted_groups = state.get("evicted_groups", 0)
+        if accumulator.group_capacity is not None:
+            accumulator._rebuild_heap()
+        return accumulator
+
+
+def group_capacity_for(top_k: Optional[int]) -> Optional[int]:
+    """只输出 top_k 个分组时需要跟踪的分组数，未设置 top_k 时不限制"""
+    return None if top_k is None else top_k * HEAVY_HITTER_FACTOR
+
+
+def print_group_stats(groups: Optional[Dict[str, Any]]) -> None:
+    """
+    打印 general_stats 中的 groups 字段，供各统计类的 print_report 使用
+
+    Args:
+        groups (Optional[Dict[str, Any]]): StatsAccumulator.general_stats 返回的 groups 字段
+    """
+    if not groups:
+        return
+    approximate = " (approximate)" if groups.get("approximate") else ""
+    print(f"\nGroups by {', '.join(groups['by'])} ({groups['group_count']} groups{approximate}):")
+    entries = [(item['key'], item['stats']) for item in groups['items']]
+    if groups['other']:
+        entries.append(({"other": f"{groups['other']['group_count']} groups"}, groups['other']))
+    for key, stats in entries:
+        label = ", ".join(f"{field}={value}" for field, value in key.items())
+        print(f"  [{label}] Total: {stats['total_count']}, "
+              f"Success: {stats['success_count']}, Errors: {stats['error_count']}")
+        for field, numeric in stats['numeric_stats'].items():
+            if numeric['count'] > 0:
+                print(f"    {field}: Average {numeric['average']:.2f} (n={numeric['count']})")
+
+
+def iter_complete_lines(
+    file: BinaryIO, offset: int, compression: Optional[str] = None
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    从字节偏移 offset 开始读取完整的行，未写完的结尾留到下次读取
+
+    Args:
+        file (BinaryIO): 以二进制模式打开的结果文件
+        offset (int): 起始偏移；压缩文件为帧边界处的压缩字节偏移
+        compression (Optional[str]): 压缩格式，None 表示不压缩
+
+    Yields:
+        Tuple[int, bytes]: (读完该行后可以续读的偏移, 行内容)；
+            压缩文件按帧推进，同一帧内各行的偏移都是帧结束位置
+    """
+    if compression is not None:
+        for _, end, data in iter_frames(file, compression, offset):
+            for line in data.splitlines(keepends=True):
+                yield end, line
+        return
+    file.seek(offset)
+    for line in file:
+        if not line.endswith(b"\n"):
+            # 最后一行尚未写完
+            break
+        offset += len(line)
+        yield offset, line
+
+
+class IncrementalStats:
+    """
+    增量统计：在旁路状态文件中保存累加器状态和已处理的字节偏移，
+    每次调用只读取结果文件新追加的完整行并合并，适合在任务运行中反复查看统计
+
+    以下情况会从头重新统计：
+        - 状态文件不存在或无法解析
+        - 统计字段或统计类型发生变化
+        - 结果文件变短，或文件头指纹不一致（文件被重写）
+    未以换行结尾的最后一行视为仍在写入，留到下次读取；
+    .gz / .zst 压缩文件按帧读取，偏移为压缩字节偏移，未写完的最后一帧留到下次读取。
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        numeric_fields: List[str] = None,
+        distribution_fields: List[str] = None,
+        state_path: Optional[str] = None,
+        kind: str = "",
+        group_by: List[str] = None,
+    ):
+        """
+        Args:
+            file_path (str): 结果文件路径（JSONL，可以是 .gz / .zst 压缩文件）
+            numeric_fields (List[str]): 需要计算数值统计的字段路径列表
+            distribution_fields (List[str]): 需要计算分布统计的字段路径列表
+            state_path (str): 状态文件路径，默认为 "<file_path>.stats_state.json"
+            kind (str): 统计类型（如统计类名），不同类型的状态不会混用
+            group_by (List[str]): 分组字段路径列表
+        """
+        self.file_path = file_path
+        self.numeric_fields = list(numeric_fields or [])
+        self.distribution_fields = list(distribution_fields or [])
+        self.state_path = state_path or f"{file_path}.stats_state.json"
+        self.kind = kind
+        self.group_by = list(group_by or [])
+
+    def _load_state(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.state_path):
+            return None
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable stats state {self.state_path}: {e}")
+            return None
+        if (
+            state.get("version") != STATE_VERSION
+            or state.get("kind") != self.kind
+            or state.get("numeric_fields") != self.numeric_fields
+            or state.get("distribution_fields") != self.distribution_fields
+            or state.get("group_by", []) != self.group_by
+        ):
+            return None
+        return state
+
+    def _save_state(self, state: Dict[str, Any]) -> None:
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(state, file, ensure_ascii=False)
+        os.replace(temp_path, self.state_path)
+
+    def update(self, top_k: Optional[int] = None) -> Dict[str, Any]:
+        """
+        读取新追加的行并合并到已保存的状态中
+
+        Args:
+            top_k (int): 只输出结果数最多的 K 个分组
+
+        Returns:
+            Dict[str, Any]: 与 calculate_general_stats 格式相同的统计信息
+        """
+        state = self._load_state()
+        group_capacity = group_capacity_for(top_k) if self.group_by else None
+        if state is not None and state["accumulator"].get("group_capacity") != group_capacity:
+            # 分组容量不同的状态无法复用（有容量限制时已经丢弃了部分分组）
+            state = None
+        with open(self.file_path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            offset = 0
+            accumulator = None
+            if state is not None:
+                offset = state["offset"]
+                head_length = state["fingerprint_length"]
+                if (
+                    offset <= size
+                    and fingerprint_head(file, head_length) == state["fingerprint"]
+                ):
+                    accumulator = StatsAccumulator.from_dict(state["accumulator"])
+                else:
+                    logger.info(f"{self.file_path} was rewritten, recomputing stats from scratch")
+                    offset = 0
+            if accumulator is None:
+                accumulator = StatsAccumulator(
+                    self.numeric_fields, self.distribution_fields, self.group_by, group_capacity
+                )
+
+            new_rows = 0
+            compression = detect_compression(self.file_path)
+            resolver = None
+            if references_input(self.numeric_fields + self.distribution_fields + self.group_by):
+                # compact 结果只保存 input_hash，统计 input 下的字段时需要补回输入
+                resolver = InputResolver(os.path.dirname(os.path.abspath(self.file_path)))
+            for offset, line in iter_complete_lines(file, offset, compression):
+                if not line.strip():
+                    continue
+                try:
+                    result = loads(line)
+                except ValueError as e:
+                    logger.warning(f"Skipping malformed line in {self.file_path}: {e}")
+                    continue
+                if resolver is not None:
+                    resolver.resolve(result)
+                accumulator.add(result)
+                new_rows += 1
+
+            head_length = min(offset, FINGERPRINT_BYTES)
+            fingerprint = fingerprint_head(file, head_length)
+
+        self._save_state(
+            {
+                "version": STATE_VERSION,
+                "kind": self.kind,
+                "numeric_fields": self.numeric_fields,
+                "distribution_fields": self.distribution_fields,
+                "group_by": self.group_by,
+                "offset": offset,
+                "fingerprint": fingerprint,
+                "fingerprint_length": head_length,
+                "accumulator": accumulator.to_dict(),
+            }
+        )
+        logger.info(f"Merged {new_rows} new rows from {self.file_path} (offset {offset})")
+        return accumulator.general_stats(top_k)
@@ -0,0 +1,30 @@
+import importlib
+from typing import Any, Callable, Dict, List, Tuple
+
+
+def lazy_exports(package: str, exports: Dict[str, str]) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """
+    为包生成模块级 __getattr__ / __dir__（PEP 562），导出的名字在第一次访问时才导入对应子模块，
+    例如 `from judgement.stats import JudgementStats` 不会导入 openai 和 tiktoken
+
+    Args:
+        package (str): 包名，即包 __init__ 中的 __name__
+        exports (Dict[str, str]): 导出名 -> 相对模块路径，如 {"JudgementStats": ".stats"}
+
+    Returns:
+        Tuple: (__getattr__, __dir__)
+    """
+    package_globals = importlib.import_module(package).__dict__
+
+    def __getattr__(name: str) -> Any:
+        if name not in exports:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(exports[name], package), name)
+        # 缓存到包的命名空间，之后的访问不再经过 __getattr__
+        package_globals[name] = value
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted(set(package_globals) | set(exports))
+
+    return __getattr__, __dir__
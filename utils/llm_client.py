@@ -2,13 +2,95 @@ import os
 import asyncio
 import logging
 import time
-from typing import Optional
-from openai import AsyncOpenAI
+from typing import TYPE_CHECKING, Dict, Optional
 from utils.logger_config import get_logger
-import dotenv
+from utils.profiling import NullProfiler
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 logger = get_logger(name="openai-llm", log_file="llm.log")
-dotenv.load_dotenv(override=True)
+_env_loaded = False
+
+
+def load_env() -> None:
+    """
+    从 .env 加载环境变量（override=True），只在第一次调用时执行。
+    pipeline 和客户端在初始化时调用，只导入统计等模块时不会导入 dotenv
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    import dotenv
+
+    dotenv.load_dotenv(override=True)
+    _env_loaded = True
+
+
+def extract_usage(naive_response: Optional[dict]) -> Optional[dict]:
+    """
+    从原始响应中提取 token 用量，包括命中提供方 prompt cache 的 token 数
+
+    Args:
+        naive_response (dict): chat completion 响应的 model_dump()
+
+    Returns:
+        Optional[dict]: prompt_tokens / completion_tokens / total_tokens / cached_tokens，
+        响应中没有 usage 时返回 None
+    """
+    if not naive_response or not naive_response.get("usage"):
+        return None
+    usage = naive_response["usage"]
+    prompt_details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0),
+        "cached_tokens": prompt_details.get("cached_tokens") or 0,
+    }
+
+
+def merge_usage(*usages: Optional[dict]) -> Optional[dict]:
+    """
+    合并多次调用的 token 用量
+
+    Args:
+        *usages (dict): extract_usage 返回的用量，None 会被忽略
+
+    Returns:
+        Optional[dict]: 各项之和，全部为 None 时返回 None
+    """
+    usages = [usage for usage in usages if usage]
+    if not usages:
+        return None
+    return {
+        key: sum(usage.get(key, 0) for usage in usages)
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens")
+    }
+
+
+def summarize_cache_usage(results: list) -> dict:
+    """
+    汇总一组结果中的 prompt token 与缓存命中情况
+
+    Args:
+        results (list): 带有 "usage" 字段的结果列表
+
+    Returns:
+        dict: prompt_tokens / cached_tokens / cache_hit_rate
+    """
+    prompt_tokens = 0
+    cached_tokens = 0
+    for result in results:
+        usage = result.get("usage") if isinstance(result, dict) else None
+        if usage:
+            prompt_tokens += usage.get("prompt_tokens", 0)
+            cached_tokens += usage.get("cached_tokens", 0)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "cache_hit_rate": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+    }
 
 
 class RateLimiter:
@@ -23,17 +105,41 @@ class RateLimiter:
         self.interval = 60.0 / max_per_minute
         self.lock = asyncio.Lock()
         self.last = 0
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
 
     async def acquire(self):
         """
         获取令牌，如果需要则等待
         """
+        start = time.monotonic()
         async with self.lock:
             now = time.monotonic()
             wait_time = self.interval - (now - self.last)
             if wait_time > 0:
                 await asyncio.sleep(wait_time)
             self.last = time.monotonic()
+        waited = self.last - start
+        self.acquired += 1
+        self.wait_seconds += waited
+        if waited > 0.001:
+            self.throttled += 1
+
+    def stats(self) -> Dict[str, float]:
+        """
+        速率限制器的等待统计
+
+        Returns:
+            Dict[str, float]: requests、throttled（需要等待的请求数）、
+                saturation（需要等待的请求占比）和 avg_wait_ms
+        """
+        return {
+            "requests": self.acquired,
+            "throttled": self.throttled,
+            "saturation": self.throttled / self.acquired if self.acquired else 0.0,
+            "avg_wait_ms": self.wait_seconds * 1000 / self.acquired if self.acquired else 0.0,
+        }
 
 
 class OpenAIClient:
@@ -41,8 +147,15 @@ class OpenAIClient:
     OpenAI API 客户端封装类
     """
     
-    def __init__(self, config: dict = None):
-        """初始化 OpenAI 客户端"""
+    def __init__(self, config: dict = None, async_client: "AsyncOpenAI" = None):
+        """
+        初始化 OpenAI 客户端
+
+        Args:
+            config (dict): 配置字典，包含 model 字段
+            async_client (AsyncOpenAI): 复用已有的 AsyncOpenAI 实例（共享连接池），默认新建
+        """
+        load_env()
         if config and 'model' in config:
             model_config = config['model']
             api_key = model_config.get("api_key")
@@ -50,6 +163,7 @@ class OpenAIClient:
             self.model_name = model_config.get("model_name", "gpt-4o-2024-11-20")
             self.max_tokens = model_config.get("max_tokens", 5042)
             self.temperature = model_config.get("temperature", 1.0)
+            self.n = model_config.get("n", 1)
             rate_limit = model_config.get("rate_limit", 200)
         else:
             api_key = os.environ.get("OPENAI_API_KEY")
@@ -57,50 +171,67 @@ class OpenAIClient:
             self.model_name = os.environ.get("OPENAI_MODEL", "gpt-4o-2024-11-20")
             self.max_tokens = 5042
             self.temperature = 1.0
+            self.n = 1
             rate_limit = 200
         
         if not api_key:
             raise ValueError("OPENAI_API_KEY 未设置")
             
-        self.client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=api_base
-        )
+        if async_client is None:
+            from openai import AsyncOpenAI
+
+            async_client = AsyncOpenAI(api_key=api_key, base_url=api_base)
+        self.client = async_client
         
         # 初始化速率限制器
         self.rate_limiter = RateLimiter(max_per_minute=rate_limit)
+        # 由 pipeline 在开启剖析时替换
+        self.profiler = NullProfiler()
         logger.debug("Successfully initialize OpenAIClient")
     
-    async def chat_completion(self, prompt: str, system_prompt: str = None) -> Optional[str]:
+    async def chat_completion(self, prompt: str, system_prompt: str = None, n: Optional[int] = None) -> Optional[str]:
         """
         调用 OpenAI 聊天完成接口
         
         Args:
             prompt (str): 发送给模型的提示
             system_prompt (str): 系统提示词
+            n (Optional[int]): 每次调用的采样数，默认使用配置中的 model.n（默认为 1）；
+                大于 1 时一次请求返回多个回复，提示词 token 只计费一次
             
         Returns:
-            Optional[str]: 模型的回复内容，如果出错则返回 None
+            Optional[str]: 模型的回复内容，如果出错则返回 None；
+                n 大于 1 时回复内容为按 choice 序号排列的列表
         """
-        await self.rate_limiter.acquire()
+        n = n or self.n
+        with self.profiler.stage("rate_limiter_wait"):
+            await self.rate_limiter.acquire()
         try:
             messages = []
             if system_prompt:
                 messages.append({"role": "system", "content": system_prompt})
             messages.append({"role": "user", "content": prompt})
             
+            # n 为 1 时不传该参数，兼容不支持 n 的 OpenAI 兼容服务
+            extra = {"n": n} if n > 1 else {}
             response = await self.client.chat.completions.create(
                 model=self.model_name,
                 temperature=self.temperature,
                 messages=messages,
-                max_tokens=self.max_tokens
+                max_tokens=self.max_tokens,
+                **extra
             )
+            if n > 1:
+                choices = sorted(response.choices, key=lambda choice: choice.index)
+                if len(choices) < n:
+                    logger.warning(f"Requested {n} samples but received {len(choices)}")
+                return [choice.message.content for choice in choices], response.model_dump()
             return response.choices[0].message.content, response.model_dump()
         except Exception as e:
             logger.error(f"API 调用失败: {e}")
             return None
     
-    async def safe_chat_completion(self, prompt: str, system_prompt: str = None, timeout: int = 3600) -> Optional[str]:
+    async def safe_chat_completion(self, prompt: str, system_prompt: str = None, timeout: int = 3600, n: Optional[int] = None) -> Optional[str]:
         """
         带超时保护的聊天完成接口
         
@@ -108,12 +239,13 @@ class OpenAIClient:
             prompt (str): 发送给模型的提示
             system_prompt (str): 系统提示词
             timeout (int): 超时时间（秒）
+            n (Optional[int]): 每次调用的采样数，与 chat_completion 相同
             
         Returns:
             Optional[str]: 模型的回复内容，如果超时或出错则返回 None
         """
         try:
-            return await asyncio.wait_for(self.chat_completion(prompt, system_prompt), timeout=timeout)
+            return await asyncio.wait_for(self.chat_completion(prompt, system_prompt, n), timeout=timeout)
         except asyncio.TimeoutError:
             logger.warning(f"[TIMEOUT] 提示: {prompt[:50]}...")
             return None
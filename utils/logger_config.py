@@ -1,20 +1,208 @@
+import atexit
 import logging
-import sys
+import logging.handlers
 import os
+import queue
+import random
+import sys
+import threading
 from pathlib import Path
+from typing import Dict, List, Optional
+
+LOG_DIR = "./logs"
+
+# 默认配置，可以通过环境变量或 configure_logging 修改
+_defaults = {
+    "max_bytes": int(os.environ.get("AGENT_LOG_MAX_BYTES", 50 * 1024 * 1024)),
+    "backup_count": int(os.environ.get("AGENT_LOG_BACKUP_COUNT", 5)),
+    "debug_sample_rate": float(os.environ.get("AGENT_LOG_DEBUG_SAMPLE_RATE", 1.0)),
+    "queue_size": int(os.environ.get("AGENT_LOG_QUEUE_SIZE", 100_000)),
+    "use_queue": os.environ.get("AGENT_LOG_QUEUE", "1") != "0",
+}
+
+_lock = threading.Lock()
+_queue: Optional[queue.Queue] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_router: Optional["_RoutingHandler"] = None
+_console_handler: Optional[logging.Handler] = None
+_sampling_filters: List["DebugSamplingFilter"] = []
+# logger 名称 -> 它的 QueueHandler，fork 后在子进程中替换为直接写入的 handler
+_queue_handlers: Dict[str, "_NonBlockingQueueHandler"] = {}
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    按比例采样 DEBUG 日志（INFO 及以上级别全部保留），
+    在格式化之前生效，被丢弃的记录不会产生格式化开销
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.sample_rate >= 1.0:
+            return True
+        return random.random() < self.sample_rate
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志而不是阻塞调用方（事件循环）"""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _NonBlockingQueueHandler.dropped += 1
+
+
+class _RoutingHandler(logging.Handler):
+    """在后台线程中按 logger 名称把日志分发到各自的文件和控制台"""
+
+    def __init__(self):
+        super().__init__()
+        self.routes: Dict[str, List[logging.Handler]] = {}
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        for handler in self.routes.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.handle(record)
+
+    def close(self) -> None:
+        for handlers in self.routes.values():
+            for handler in handlers:
+                handler.flush()
+        super().close()
+
+
+def _get_console_handler() -> logging.Handler:
+    global _console_handler
+    if _console_handler is None:
+        _console_handler = logging.StreamHandler(sys.stdout)
+        _console_handler.setFormatter(
+            logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", datefmt="%H:%M:%S")
+        )
+    return _console_handler
+
+
+def _ensure_listener() -> None:
+    global _queue, _listener, _router
+    if _listener is not None:
+        return
+    _queue = queue.Queue(maxsize=_defaults["queue_size"])
+    _router = _RoutingHandler()
+    _listener = logging.handlers.QueueListener(_queue, _router)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """停止后台日志线程并写出队列中剩余的日志"""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        for handlers in _router.routes.values():
+            for handler in handlers:
+                try:
+                    handler.flush()
+                except (ValueError, OSError):
+                    # 退出时控制台流可能已经被关闭（例如 pytest 的输出捕获）
+                    pass
+        if _NonBlockingQueueHandler.dropped:
+            sys.stderr.write(
+                f"logging queue was full, dropped {_NonBlockingQueueHandler.dropped} records\n"
+            )
+
+
+def _use_direct_handlers_after_fork() -> None:
+    """
+    fork 出的子进程（如 ToolExecutor 的进程池）中没有后台日志线程，放入队列的日志不会被写出。
+    子进程中把各 logger 的 QueueHandler 换回直接写文件和控制台的 handler；
+    进程池的子进程以 os._exit 退出、不执行 atexit，直接写入也不会有日志滞留在队列中
+    """
+    global _lock, _queue, _listener, _router
+    # fork 时其他线程可能正持有锁
+    _lock = threading.Lock()
+    _defaults["use_queue"] = False
+    if _listener is None:
+        return
+    for name, queue_handler in _queue_handlers.items():
+        logger = logging.getLogger(name)
+        logger.removeHandler(queue_handler)
+        for handler in _router.routes.get(name, ()):
+            logger.addHandler(handler)
+        for sampling_filter in queue_handler.filters:
+            logger.addFilter(sampling_filter)
+    _queue_handlers.clear()
+    _queue = _listener = _router = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_use_direct_handlers_after_fork)
+
+
+def configure_logging(
+    max_bytes: Optional[int] = None,
+    backup_count: Optional[int] = None,
+    debug_sample_rate: Optional[float] = None,
+    use_queue: Optional[bool] = None,
+) -> None:
+    """
+    修改日志默认配置。debug_sample_rate 对已创建的 logger 立即生效，
+    其余参数只影响之后创建的 logger
+
+    Args:
+        max_bytes (int): 单个日志文件的轮转大小（字节），0 表示不轮转
+        backup_count (int): 保留的历史日志文件数，总大小上限为 max_bytes * (backup_count + 1)
+        debug_sample_rate (float): DEBUG 日志的采样比例（0~1）
+        use_queue (bool): 是否使用后台线程写日志
+    """
+    for key, value in (
+        ("max_bytes", max_bytes),
+        ("backup_count", backup_count),
+        ("debug_sample_rate", debug_sample_rate),
+        ("use_queue", use_queue),
+    ):
+        if value is not None:
+            _defaults[key] = value
+    if debug_sample_rate is not None:
+        for sampling_filter in _sampling_filters:
+            sampling_filter.sample_rate = debug_sample_rate
+
 
 def get_logger(
     name: str = "data_generation",
     log_file: str = "app.log",
-    level: int = logging.INFO
+    level: int = logging.INFO,
+    max_bytes: Optional[int] = None,
+    backup_count: Optional[int] = None,
+    debug_sample_rate: Optional[float] = None,
+    use_queue: Optional[bool] = None,
 ) -> logging.Logger:
     """
-    创建一个简单的 logger：控制台 + 单个日志文件（不轮转）
+    创建 logger：控制台 + 单个日志文件（按大小轮转）
+
+    默认通过 QueueHandler 把日志放入队列，由后台 QueueListener 线程写入文件和控制台，
+    磁盘和控制台 I/O 不会阻塞事件循环；队列满时丢弃日志而不是阻塞。
+    fork 出的子进程中没有后台线程，改为直接写入。
 
     Args:
         name: logger 名称
-        log_file: 日志文件名（默认 app.log）
+        log_file: 日志文件名（默认 app.log），位于 ./logs 目录下
         level: 日志级别
+        max_bytes: 单个日志文件的轮转大小（字节），0 表示不轮转
+        backup_count: 保留的历史日志文件数
+        debug_sample_rate: DEBUG 日志的采样比例（0~1），用于控制逐行调试日志的开销
+        use_queue: 是否使用后台线程写日志
 
     Returns:
         logging.Logger
@@ -24,23 +212,42 @@ def get_logger(
     logger.propagate = False  # 防止日志重复
     if logger.handlers:
         return logger
-    Path(log_file).parent.mkdir(parents=True, exist_ok=True)
-    log_dir = "./logs"
 
-    file_handler = logging.FileHandler(os.path.join(log_dir, log_file), encoding="utf-8")
+    max_bytes = _defaults["max_bytes"] if max_bytes is None else max_bytes
+    backup_count = _defaults["backup_count"] if backup_count is None else backup_count
+    debug_sample_rate = (
+        _defaults["debug_sample_rate"] if debug_sample_rate is None else debug_sample_rate
+    )
+    use_queue = _defaults["use_queue"] if use_queue is None else use_queue
+
+    log_path = os.path.join(LOG_DIR, log_file)
+    Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
     file_formatter = logging.Formatter(
         "%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S"
     )
     file_handler.setFormatter(file_formatter)
-    logger.addHandler(file_handler)
+    handlers = [file_handler, _get_console_handler()]
 
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_formatter = logging.Formatter(
-        "%(asctime)s - %(levelname)s - %(message)s",
-        datefmt="%H:%M:%S"
-    )
-    console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
+    sampling_filter = DebugSamplingFilter(debug_sample_rate)
+    _sampling_filters.append(sampling_filter)
+
+    if not use_queue:
+        for handler in handlers:
+            logger.addHandler(handler)
+        logger.addFilter(sampling_filter)
+        return logger
+
+    with _lock:
+        _ensure_listener()
+        _router.routes[name] = handlers
+        queue_handler = _NonBlockingQueueHandler(_queue)
+        _queue_handlers[name] = queue_handler
+    queue_handler.addFilter(sampling_filter)
+    logger.addHandler(queue_handler)
 
     return logger
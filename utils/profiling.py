@@ -0,0 +1,307 @@
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from utils.logger_config import get_logger
+
+logger = get_logger(name="profiling", log_file="profiling.log")
+
+PROFILING_MODES = ("stages", "cprofile", "sampling")
+
+# 当前任务正在计时的阶段，asyncio 任务各自持有一份上下文，并发任务之间互不影响
+_current_stage: ContextVar[Optional["_StageTimer"]] = ContextVar("current_stage", default=None)
+
+
+class _StageTimer:
+    """单个阶段的计时上下文，嵌套阶段的耗时从外层阶段中扣除，只记一次"""
+
+    __slots__ = ("profiler", "name", "start", "nested", "parent", "token")
+
+    def __init__(self, profiler: "PipelineProfiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+        self.nested = 0.0
+        self.parent = None
+        self.token = None
+
+    def __enter__(self):
+        self.parent = _current_stage.get()
+        self.token = _current_stage.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        _current_stage.reset(self.token)
+        if self.parent is not None:
+            self.parent.nested += elapsed
+        self.profiler.record_stage(self.name, elapsed - self.nested)
+        return False
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """收集 asyncio debug 模式输出的慢回调警告"""
+
+    def __init__(self, limit: int = 100):
+        super().__init__(level=logging.WARNING)
+        self.count = 0
+        self.samples: List[str] = []
+        self.limit = limit
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if message.startswith("Executing"):
+            self.count += 1
+            if len(self.samples) < self.limit:
+                self.samples.append(message)
+
+
+class PipelineProfiler:
+    """
+    Pipeline 热点路径的性能剖析工具（默认关闭）
+
+    - stages: 统计各阶段（提示词加载、客户端创建、速率限制等待、模型调用、提取、分词、保存）的耗时，
+      阶段嵌套时（如 api_call 内的 rate_limiter_wait）外层只统计扣除内层之后的自身耗时
+    - cprofile: 在 stages 基础上用 cProfile 剖析整个运行，输出 profile.prof
+    - sampling: 在 stages 基础上用后台线程对事件循环所在线程采样调用栈
+
+    所有模式都会监控事件循环延迟并开启 asyncio 慢回调检测。运行结束后在实验目录
+    （result.jsonl 旁边）写入：
+        - profile.folded: flamegraph 兼容的 collapsed stack 文件
+          （stages 模式为各阶段的累计微秒数，sampling 模式为采样到的调用栈）
+        - profile.prof: cProfile 结果（仅 cprofile 模式），可以用 snakeviz / flameprof 查看
+        - profile_summary.json: 各阶段耗时、事件循环延迟和慢回调统计
+    """
+
+    enabled = True
+
+    def __init__(
+        self,
+        output_dir: str,
+        mode: str = "stages",
+        sample_interval: float = 0.005,
+        loop_lag_interval: float = 0.1,
+        slow_callback_ms: float = 100,
+    ):
+        """
+        Args:
+            output_dir (str): 剖析结果输出目录
+            mode (str): stages / cprofile / sampling
+            sample_interval (float): 采样间隔（秒），仅 sampling 模式
+            loop_lag_interval (float): 事件循环延迟探测间隔（秒）
+            slow_callback_ms (float): 超过该耗时的回调记为慢回调（毫秒）
+        """
+        if mode not in PROFILING_MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}, expected one of {PROFILING_MODES}")
+        self.output_dir = output_dir
+        self.mode = mode
+        self.sample_interval = sample_interval
+        self.loop_lag_interval = loop_lag_interval
+        self.slow_callback_ms = slow_callback_ms
+        self._reset()
+
+    def _reset(self) -> None:
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.loop_lags: List[float] = []
+        self.samples: Counter = Counter()
+        self._profile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._sampling = threading.Event()
+        self._lag_task: Optional[asyncio.Task] = None
+        self._slow_callbacks: Optional[_SlowCallbackHandler] = None
+        self._loop_debug = False
+        self._started_at = 0.0
+
+    def stage(self, name: str) -> _StageTimer:
+        """
+        阶段计时上下文
+
+        示例：
+            with profiler.stage("prompt_load"):
+                system_prompt, user_prompt = self._render_prompts(input_data)
+        """
+        return _StageTimer(self, name)
+
+    def record_stage(self, name: str, seconds: float) -> None:
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = {"count": 0, "total": 0.0, "max": 0.0}
+        stats["count"] += 1
+        stats["total"] += seconds
+        if seconds > stats["max"]:
+            stats["max"] = seconds
+
+    def start(self) -> None:
+        """开始剖析，需要在事件循环中调用"""
+        self._reset()
+        self._started_at = time.perf_counter()
+        loop = asyncio.get_running_loop()
+
+        # 慢回调检测依赖 asyncio debug 模式
+        self._loop_debug = loop.get_debug()
+        loop.slow_callback_duration = self.slow_callback_ms / 1000
+        loop.set_debug(True)
+        self._slow_callbacks = _SlowCallbackHandler()
+        logging.getLogger("asyncio").addHandler(self._slow_callbacks)
+
+        self._lag_task = loop.create_task(self._monitor_loop_lag())
+
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        elif self.mode == "sampling":
+            target = threading.get_ident()
+            self._sampling.set()
+            self._sampler = threading.Thread(
+                target=self._sample, args=(target,), name="pipeline-sampler", daemon=True
+            )
+            self._sampler.start()
+        logger.info(f"Profiling started in {self.mode} mode")
+
+    async def _monitor_loop_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.loop_lag_interval
+            await asyncio.sleep(self.loop_lag_interval)
+            self.loop_lags.append(max(0.0, loop.time() - expected))
+
+    def _sample(self, target: int) -> None:
+        while self._sampling.is_set():
+            frame = sys._current_frames().get(target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+    def stop(self) -> Dict[str, Any]:
+        """
+        停止剖析并写出结果文件
+
+        Returns:
+            Dict[str, Any]: 剖析摘要
+        """
+        elapsed = time.perf_counter() - self._started_at
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampling.clear()
+            self._sampler.join()
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        try:
+            asyncio.get_running_loop().set_debug(self._loop_debug)
+        except RuntimeError:
+            pass
+        if self._slow_callbacks is not None:
+            logging.getLogger("asyncio").removeHandler(self._slow_callbacks)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._write_folded(os.path.join(self.output_dir, "profile.folded"))
+        if self._profile is not None:
+            self._profile.dump_stats(os.path.join(self.output_dir, "profile.prof"))
+
+        summary = self.summary(elapsed)
+        with open(os.path.join(self.output_dir, "profile_summary.json"), "w", encoding="utf-8") as file:
+            json.dump(summary, file, ensure_ascii=False, indent=2)
+        logger.info(f"Profiling results saved to {self.output_dir}")
+        return summary
+
+    def _write_folded(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            if self.mode == "sampling":
+                for stack, count in self.samples.most_common():
+                    file.write(f"{stack} {count}\n")
+            for name, stats in self.stages.items():
+                file.write(f"pipeline;{name} {int(stats['total'] * 1_000_000)}\n")
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        """汇总各阶段耗时、事件循环延迟和慢回调"""
+        lags = sorted(self.loop_lags)
+        return {
+            "mode": self.mode,
+            "elapsed_seconds": elapsed,
+            "stages": {
+                name: {
+                    "count": stats["count"],
+                    "total_seconds": stats["total"],
+                    "mean_ms": stats["total"] * 1000 / stats["count"],
+                    "max_ms": stats["max"] * 1000,
+                }
+                for name, stats in sorted(
+                    self.stages.items(), key=lambda item: item[1]["total"], reverse=True
+                )
+            },
+            "loop_lag_ms": {
+                "samples": len(lags),
+                "mean": sum(lags) * 1000 / len(lags) if lags else 0.0,
+                "p99": lags[int(len(lags) * 0.99)] * 1000 if lags else 0.0,
+                "max": lags[-1] * 1000 if lags else 0.0,
+            },
+            "slow_callbacks": {
+                "threshold_ms": self.slow_callback_ms,
+                "count": self._slow_callbacks.count if self._slow_callbacks else 0,
+                "samples": self._slow_callbacks.samples[:10] if self._slow_callbacks else [],
+            },
+        }
+
+
+class NullProfiler:
+    """未开启剖析时使用的空实现"""
+
+    enabled = False
+
+    def stage(self, name: str):
+        return nullcontext()
+
+    def record_stage(self, name: str, seconds: float) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> Dict[str, Any]:
+        return {}
+
+
+def create_profiler(profiling_config: Optional[Dict[str, Any]], output_dir: str):
+    """
+    根据配置中的 profiling 字段创建剖析器
+
+    示例配置：
+        profiling:
+          enabled: true
+          mode: sampling   # stages / cprofile / sampling
+          sample_interval: 0.005
+          loop_lag_interval: 0.1
+          slow_callback_ms: 100
+
+    Args:
+        profiling_config (Optional[Dict[str, Any]]): 配置中的 profiling 字段
+        output_dir (str): 剖析结果输出目录（实验目录）
+
+    Returns:
+        PipelineProfiler 或 NullProfiler
+    """
+    profiling_config = profiling_config or {}
+    if not profiling_config.get("enabled", False):
+        return NullProfiler()
+    return PipelineProfiler(
+        output_dir=output_dir,
+        mode=profiling_config.get("mode", "stages"),
+        sample_interval=profiling_config.get("sample_interval", 0.005),
+        loop_lag_interval=profiling_config.get("loop_lag_interval", 0.1),
+        slow_callback_ms=profiling_config.get("slow_callback_ms", 100),
+    )
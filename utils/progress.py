@@ -0,0 +1,306 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from utils.logger_config import get_logger
+
+logger = get_logger(name="progress", log_file="progress.log")
+
+
+class ProgressTracker:
+    """
+    运行进度与吞吐指标的收集器
+
+    由 pipeline 在每个任务开始/结束时更新，并把指标推送给各个 ProgressReporter：
+    rows/sec、在途任务数、错误率、速率限制器饱和度、tokens/min、ETA，
+    以及评判 pipeline 的实时平均分。
+    """
+
+    def __init__(
+        self,
+        total: Optional[int] = None,
+        reporters: Optional[List["ProgressReporter"]] = None,
+        score_field: Optional[str] = None,
+        concurrency_limit: Optional[int] = None,
+        window: int = 1000,
+    ):
+        """
+        Args:
+            total (Optional[int]): 总任务数，未知时为 None
+            reporters (List[ProgressReporter]): 指标输出方式
+            score_field (str): 结果中需要统计实时平均分的字段，如 "model_based_judgement"
+            concurrency_limit (int): 当前并发上限，可以在运行中通过 set_concurrency_limit 调整
+            window (int): 计算近期吞吐时使用的最近完成任务数
+        """
+        self.total = total
+        self.reporters = reporters or []
+        self.score_field = score_field
+        self.concurrency_limit = concurrency_limit
+        self.rate_limiter = None
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.started_at = time.monotonic()
+        self.completed = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.tokens = 0
+        self._score_sums: Dict[str, float] = {}
+        self._score_counts: Dict[str, int] = {}
+
+    def attach_rate_limiter(self, rate_limiter) -> None:
+        """关联速率限制器以统计饱和度"""
+        self.rate_limiter = rate_limiter
+
+    def set_concurrency_limit(self, limit: int) -> None:
+        """运行中调整并发上限（在下一个任务调度时生效）"""
+        if limit < 1:
+            raise ValueError("concurrency limit must be at least 1")
+        logger.info(f"Concurrency limit changed from {self.concurrency_limit} to {limit}")
+        self.concurrency_limit = limit
+
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+        for reporter in self.reporters:
+            reporter.start(self)
+
+    def task_started(self, rows: int = 1) -> None:
+        with self._lock:
+            self.in_flight += rows
+
+    def task_finished(self, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.completed += 1
+            self._recent.append(time.monotonic())
+            if "error" in result:
+                self.errors += 1
+            usage = result.get("usage")
+            if usage:
+                self.tokens += usage.get("total_tokens", 0)
+            scores = result.get(self.score_field) if self.score_field else None
+            if isinstance(scores, dict):
+                for key, value in scores.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        self._score_sums[key] = self._score_sums.get(key, 0.0) + value
+                        self._score_counts[key] = self._score_counts.get(key, 0) + 1
+        for reporter in self.reporters:
+            reporter.update(self)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前指标快照"""
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            recent_rate = 0.0
+            if len(self._recent) >= 2:
+                span = self._recent[-1] - self._recent[0]
+                recent_rate = (len(self._recent) - 1) / span if span > 0 else 0.0
+            rate = recent_rate or self.completed / elapsed
+            remaining = self.total - self.completed if self.total is not None else None
+            snapshot = {
+                "timestamp": datetime.now().isoformat(),
+                "elapsed_seconds": elapsed,
+                "total": self.total,
+                "completed": self.completed,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "concurrency_limit": self.concurrency_limit,
+                "rows_per_sec": self.completed / elapsed,
+                "recent_rows_per_sec": recent_rate,
+                "error_rate": self.errors / self.completed if self.completed else 0.0,
+                "tokens_per_min": self.tokens * 60 / elapsed,
+                "eta_seconds": remaining / rate if remaining is not None and rate > 0 else None,
+                "scores": {
+                    key: self._score_sums[key] / self._score_counts[key]
+                    for key in self._score_sums
+                },
+            }
+        if self.rate_limiter is not None:
+            snapshot["rate_limiter"] = self.rate_limiter.stats()
+        return snapshot
+
+    def close(self) -> None:
+        for reporter in self.reporters:
+            reporter.close(self)
+
+
+class ProgressReporter:
+    """进度输出方式的基类"""
+
+    def start(self, tracker: ProgressTracker) -> None:
+        pass
+
+    def update(self, tracker: ProgressTracker) -> None:
+        pass
+
+    def close(self, tracker: ProgressTracker) -> None:
+        pass
+
+
+class TerminalReporter(ProgressReporter):
+    """终端实时进度条，附带吞吐、在途数、错误率、速率限制饱和度、tokens/min 和平均分"""
+
+    def __init__(self, refresh_interval: float = 0.5, desc: Optional[str] = None):
+        self.refresh_interval = refresh_interval
+        self.desc = desc
+        self._pbar = None
+        self._last_refresh = 0.0
+
+    def start(self, tracker: ProgressTracker) -> None:
+        from tqdm import tqdm
+
+        self._pbar = tqdm(total=tracker.total, desc=self.desc, unit="row")
+
+    def update(self, tracker: ProgressTracker) -> None:
+        self._pbar.update(1)
+        now = time.monotonic()
+        if now - self._last_refresh >= self.refresh_interval:
+            self._last_refresh = now
+            self._pbar.set_postfix(self._postfix(tracker.snapshot()), refresh=False)
+
+    @staticmethod
+    def _postfix(snapshot: Dict[str, Any]) -> Dict[str, str]:
+        postfix = {
+            "in_flight": str(snapshot["in_flight"]),
+            "err": f"{snapshot['error_rate']:.1%}",
+            "tok/min": f"{snapshot['tokens_per_min']:.0f}",
+        }
+        limiter = snapshot.get("rate_limiter")
+        if limiter:
+            postfix["limiter"] = f"{limiter['saturation']:.0%}"
+        for key, value in list(snapshot["scores"].items())[:3]:
+            postfix[key] = f"{value:.2f}"
+        return postfix
+
+    def close(self, tracker: ProgressTracker) -> None:
+        if self._pbar is not None:
+            self._pbar.set_postfix(self._postfix(tracker.snapshot()))
+            self._pbar.close()
+
+
+class JSONSnapshotReporter(ProgressReporter):
+    """定期把指标快照写入 JSON 文件（原子替换），便于外部监控读取"""
+
+    def __init__(self, path: str, interval: float = 5.0):
+        self.path = path
+        self.interval = interval
+        self._last_write = 0.0
+
+    def _write(self, tracker: ProgressTracker) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(tracker.snapshot(), file, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+    def start(self, tracker: ProgressTracker) -> None:
+        self._write(tracker)
+        self._last_write = time.monotonic()
+
+    def update(self, tracker: ProgressTracker) -> None:
+        now = time.monotonic()
+        if now - self._last_write >= self.interval:
+            self._last_write = now
+            self._write(tracker)
+
+    def close(self, tracker: ProgressTracker) -> None:
+        self._write(tracker)
+
+
+class HTTPReporter(ProgressReporter):
+    """
+    本地 HTTP 接口
+
+    - GET /            返回当前指标快照（JSON）
+    - POST /concurrency 请求体 {"limit": 16}，运行中调整并发上限
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8000):
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self, tracker: ProgressTracker) -> None:
+        # http.server 只在开启 HTTP 接口时导入
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._reply(200, tracker.snapshot())
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/concurrency":
+                    self._reply(404, {"error": "not found"})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    limit = json.loads(self.rfile.read(length))["limit"]
+                    if not isinstance(limit, int) or isinstance(limit, bool):
+                        raise ValueError(f"limit must be an integer, got {limit!r}")
+                    tracker.set_concurrency_limit(limit)
+                except (ValueError, KeyError, TypeError) as e:
+                    self._reply(400, {"error": str(e)})
+                    return
+                self._reply(200, {"concurrency_limit": tracker.concurrency_limit})
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="progress-http", daemon=True).start()
+        logger.info(f"Progress endpoint listening on http://{self.host}:{self.port}/")
+
+    def close(self, tracker: ProgressTracker) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def create_reporters(progress_config: Optional[Dict[str, Any]], output_dir: str) -> List[ProgressReporter]:
+    """
+    根据配置中的 progress 字段创建进度输出方式，未配置时只使用终端进度条
+
+    示例配置：
+        progress:
+          terminal: true
+          snapshot: true          # 在实验目录下写 progress.json
+          snapshot_interval: 5
+          http_port: 8000         # 不配置则不启动 HTTP 接口
+
+    Args:
+        progress_config (Optional[Dict[str, Any]]): 配置中的 progress 字段
+        output_dir (str): 实验目录
+
+    Returns:
+        List[ProgressReporter]
+    """
+    progress_config = progress_config or {}
+    reporters: List[ProgressReporter] = []
+    if progress_config.get("terminal", True):
+        reporters.append(TerminalReporter())
+    if progress_config.get("snapshot", False):
+        reporters.append(
+            JSONSnapshotReporter(
+                os.path.join(output_dir, "progress.json"),
+                interval=progress_config.get("snapshot_interval", 5.0),
+            )
+        )
+    if progress_config.get("http_port") is not None:
+        reporters.append(
+            HTTPReporter(
+                host=progress_config.get("http_host", "127.0.0.1"),
+                port=progress_config["http_port"],
+            )
+        )
+    return reporters
@@ -0,0 +1,68 @@
+import hashlib
+import json
+from typing import Any, BinaryIO, Sequence
+
+# 用于识别结果文件是否被重写的文件头字节数
+FINGERPRINT_BYTES = 4096
+
+
+def hash_input(input_data: Any) -> str:
+    """
+    对输入数据计算稳定的哈希值（键排序后的 JSON 的 blake2b 摘要），
+    用于断点续跑、结果去重以及跨实验按输入对齐结果
+
+    Args:
+        input_data (Any): 输入数据，通常是 data_pool 中的一条字典
+
+    Returns:
+        str: 32 位十六进制哈希字符串
+    """
+    payload = json.dumps(input_data, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# 评判输入中随被评模型变化的字段（回答本身和模型信息），跨模型配对时不参与哈希
+MODEL_SPECIFIC_FIELDS = ("answer", "meta_info", "user_prompt_kwargs.model_response")
+
+
+def hash_query(input_data: Any, exclude: Sequence[str] = MODEL_SPECIFIC_FIELDS) -> str:
+    """
+    去掉随被评模型变化的字段后计算输入哈希，不同模型对同一问题的评判结果得到相同的键
+
+    Args:
+        input_data (Any): 评判输入
+        exclude (Sequence[str]): 不参与哈希的字段路径，可以用 "." 指定嵌套字段
+
+    Returns:
+        str: 32 位十六进制哈希字符串
+    """
+    if isinstance(input_data, dict):
+        input_data = dict(input_data)
+        for path in exclude:
+            *parents, key = path.split(".")
+            container = input_data
+            for parent in parents:
+                child = container.get(parent)
+                if not isinstance(child, dict):
+                    break
+                # 只复制被修改的路径，不改动原始输入
+                container[parent] = child = dict(child)
+                container = child
+            else:
+                container.pop(key, None)
+    return hash_input(input_data)
+
+
+def fingerprint_head(file: BinaryIO, length: int) -> str:
+    """
+    计算文件前 length 个字节的摘要，旁路状态/索引文件用它判断结果文件是否被重写
+
+    Args:
+        file (BinaryIO): 以二进制模式打开的文件
+        length (int): 参与摘要的字节数
+
+    Returns:
+        str: 32 位十六进制摘要
+    """
+    file.seek(0)
+    return hashlib.blake2b(file.read(length), digest_size=16).hexdigest()
@@ -0,0 +1,504 @@
+import hashlib
+import mmap
+import os
+import random
+import struct
+from array import array
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from utils.compression import detect_compression, iter_frames
+from utils.logger_config import get_logger
+from utils.records import FINGERPRINT_BYTES, fingerprint_head, hash_input
+from utils.result_store import InputResolver
+from utils.serialization import loads
+
+logger = get_logger(name="result_index", log_file="result_index.log")
+
+INDEX_MAGIC = b"RESIDX01"
+# 索引文件头：magic、已索引的字节偏移、文件头指纹长度、文件头指纹、键函数标识
+_HEADER = struct.Struct("<8sQI16s16s")
+HEADER_SIZE = 64
+# 每行一条定长记录：行起始偏移、行长度、键摘要、标记
+# （压缩文件为所在帧的起始偏移和行在帧内的序号）
+_RECORD = struct.Struct("<QI16sB3x")
+
+FLAG_ERROR = 1
+FLAG_MALFORMED = 2
+_NO_KEY = bytes(16)
+
+KEYS_MAGIC = b"RESKEY01"
+# 键表文件头：magic、槽数、已用槽数、已写入的行数、已写入各行摘要的校验值
+_KEYS_HEADER = struct.Struct("<8sQQQ16s")
+# 每个槽：键摘要、行号 + 1（0 表示空槽）
+_SLOT = struct.Struct("<16sI")
+_INVALID_ROWS = 2 ** 64 - 1
+
+
+def default_record_key(record: Dict[str, Any]) -> Optional[str]:
+    """
+    默认的行键：组合 pipeline 结果使用 key 字段，其余结果使用 input 的哈希
+    （compact 格式的结果直接使用 input_hash）
+
+    Args:
+        record (Dict[str, Any]): 单条结果
+
+    Returns:
+        Optional[str]: 行键，无法确定时返回 None
+    """
+    if "key" in record:
+        return record["key"]
+    if "input" in record:
+        return hash_input(record["input"])
+    return record.get("input_hash")
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(str(key).encode("utf-8"), digest_size=16).digest()
+
+
+class _KeyTable:
+    """
+    键摘要 → 行号的开放寻址哈希表（线性探测），保存在 mmap 映射的旁路文件中，
+    内存中不保存每个键。已用槽数超过容量的 0.7 时翻倍重建。
+
+    文件头记录表中已写入的行数和这些行的校验值，与索引不一致（写入中断、索引重建）时
+    由 ResultIndex 用内存中的行摘要重新构建。
+    """
+
+    INITIAL_CAPACITY = 1024
+    MAX_LOAD = 0.7
+
+    def __init__(self, path: str):
+        self.path = path
+        self.capacity = 0
+        self.count = 0
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._mmap is not None
+
+    def open(self, rows: int, checksum: bytes) -> bool:
+        """打开已有的键表，文件头与 rows / checksum 一致时返回 True"""
+        self.close()
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < _KEYS_HEADER.size:
+            return False
+        self._file = open(self.path, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        magic, capacity, count, table_rows, table_checksum = _KEYS_HEADER.unpack_from(self._mmap)
+        self.capacity, self.count = capacity, count
+        return (
+            magic == KEYS_MAGIC
+            and table_rows == rows
+            and table_checksum == checksum
+            and len(self._mmap) == _KEYS_HEADER.size + capacity * _SLOT.size
+        )
+
+    def create(self, capacity: int = INITIAL_CAPACITY, path: Optional[str] = None) -> None:
+        """创建空表（文件头标记为未写完）"""
+        self.close()
+        with open(path or self.path, "wb") as file:
+            file.write(_KEYS_HEADER.pack(KEYS_MAGIC, capacity, 0, _INVALID_ROWS, bytes(16)))
+            file.truncate(_KEYS_HEADER.size + capacity * _SLOT.size)
+        self._file = open(path or self.path, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self.capacity, self.count = capacity, 0
+
+    def find(self, digest: bytes) -> Tuple[int, Optional[int]]:
+        """返回 (槽位置, 行号)，键不存在时为第一个空槽和 None"""
+        mask = self.capacity - 1
+        slot = int.from_bytes(digest[:8], "little") & mask
+        table = self._mmap
+        while True:
+            position = _KEYS_HEADER.size + slot * _SLOT.size
+            stored, row = _SLOT.unpack_from(table, position)
+            if row == 0:
+                return position, None
+            if stored == digest:
+                return position, row - 1
+            slot = (slot + 1) & mask
+
+    def get(self, digest: bytes) -> Optional[int]:
+        return self.find(digest)[1]
+
+    def store(self, position: int, previous: Optional[int], digest: bytes, row: int) -> None:
+        """写入 find 返回的槽；新键使表过满时先扩容"""
+        if previous is None:
+            if self.count + 1 > self.capacity * self.MAX_LOAD:
+                self.reserve(self.count + 1)
+                position = self.find(digest)[0]
+            self.count += 1
+        _SLOT.pack_into(self._mmap, position, digest, row + 1)
+
+    def put(self, digest: bytes, row: int) -> None:
+        position, previous = self.find(digest)
+        self.store(position, previous, digest, row)
+
+    def items(self) -> Iterator[Tuple[bytes, int]]:
+        """遍历 (键摘要, 行号)"""
+        body = memoryview(self._mmap)[_KEYS_HEADER.size:]
+        try:
+            for digest, row in _SLOT.iter_unpack(body):
+                if row:
+                    yield digest, row - 1
+        finally:
+            body.release()
+
+    def reserve(self, count: int) -> None:
+        """扩容到能容纳 count 个键，批量写入前预留可以避免多次翻倍重建"""
+        capacity = self.capacity
+        while count > capacity * self.MAX_LOAD:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        temp_path = f"{self.path}.tmp"
+        grown = _KeyTable(temp_path)
+        grown.create(capacity)
+        for digest, row in self.items():
+            grown.put(digest, row)
+        grown.close()
+        self.close()
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self.capacity = capacity
+
+    def mark(self, rows: int, checksum: bytes) -> None:
+        """更新文件头；rows 为 _INVALID_ROWS 时表示正在写入"""
+        _KEYS_HEADER.pack_into(self._mmap, 0, KEYS_MAGIC, self.capacity, self.count, rows, checksum)
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ResultIndex:
+    """
+    结果 JSONL 文件的旁路索引（默认为 "<path>.idx"）
+
+    一次遍历记录每行的字节偏移、长度、键摘要和是否出错，之后通过 mmap 直接按行号或键
+    读取单行，不需要解析文件的其余部分。索引是增量的：refresh 只处理新追加的完整行，
+    结果文件被重写（变短或文件头不一致）或键函数变化时自动重建。
+
+    每行在内存中只占 29 字节的定长数组（偏移、长度、标记、键摘要）；键到行号的映射是
+    mmap 映射的开放寻址哈希表（"<index_path>.keys"），不占用 Python 对象内存。
+
+    可用于：
+        - 断点续跑：is_completed(key)
+        - 去重：key in index
+        - 选择性重新评判：error_rows() / get(row)["input"]
+        - 随机抽查：sample(k) / slice(start, stop)
+
+    compact 格式的结果按 input_hash 建立键，读取时从同目录的 inputs.jsonl 补回 input。
+
+    .gz / .zst 压缩的结果文件按帧索引：记录行所在帧的压缩字节偏移和帧内序号，
+    读取单行时只解压该帧（最近读取的一帧会被缓存），未写完的最后一帧留到下次 refresh。
+
+    键函数通过 __module__ 和 __qualname__ 识别，使用不同的 lambda 作为键函数时
+    请指定不同的 index_path。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        key_function: Callable[[Dict[str, Any]], Optional[str]] = default_record_key,
+        index_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            path (str): 结果 JSONL 文件路径，可以是 .gz / .zst 压缩文件
+            key_function (Callable): 由单条结果计算行键的函数，默认为 default_record_key
+            index_path (str): 索引文件路径，默认为 "<path>.idx"
+        """
+        self.path = path
+        self.key_function = key_function
+        self.index_path = index_path or f"{path}.idx"
+        self._key_tag = _digest(
+            f"{getattr(key_function, '__module__', '')}.{getattr(key_function, '__qualname__', '')}"
+        )
+        self.compression = detect_compression(path)
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._frame_offset: Optional[int] = None
+        self._frame_lines: List[bytes] = []
+        self._key_table = _KeyTable(f"{self.index_path}.keys")
+        self._inputs = InputResolver(os.path.dirname(os.path.abspath(path)))
+        # 索引文件与内存中的状态不一致（不存在、失效或需要重建）时整体重写
+        self._needs_rewrite = True
+        self._reset()
+        self._load()
+        self.refresh()
+
+    def _reset(self) -> None:
+        self._offsets = array("Q")
+        self._lengths = array("I")
+        self._flags = bytearray()
+        self._digests = bytearray()
+        # 各行摘要和标记的校验值，用于确认键表与索引一致
+        self._checksum = hashlib.blake2b(digest_size=16)
+        self._key_table_ready = False
+        self._indexed_offset = 0
+        self._fingerprint_length = 0
+        self._fingerprint = hashlib.blake2b(b"", digest_size=16).digest()
+        self._needs_rewrite = True
+
+    def _add(self, offset: int, length: int, digest: bytes, flags: int) -> None:
+        row = len(self._offsets)
+        self._offsets.append(offset)
+        self._lengths.append(length)
+        self._flags.append(flags)
+        self._digests += digest
+        self._checksum.update(digest + bytes((flags,)))
+
+    def _index_keys(self, start: int) -> None:
+        """把 start 之后各行的键写入键表"""
+        keys = self._key_table
+        keys.reserve(keys.count + len(self) - start)
+        digests = self._digests
+        for row in range(start, len(self)):
+            digest = bytes(digests[row * 16:row * 16 + 16])
+            if digest == _NO_KEY:
+                continue
+            position, previous = keys.find(digest)
+            # 同一个键出现多次时保留最新的一行，但成功的行不会被之后出错的行覆盖
+            if previous is None or self._flags[row] == 0 or self._flags[previous] != 0:
+                keys.store(position, previous, digest, row)
+
+    def _keys(self) -> _KeyTable:
+        """打开键表，与索引不一致时用内存中的行摘要重建"""
+        if not self._key_table_ready or not self._key_table.is_open:
+            checksum = self._checksum.digest()
+            if not self._key_table.open(len(self), checksum):
+                logger.info(f"Building key table {self._key_table.path}")
+                self._key_table.create()
+                self._index_keys(0)
+                self._key_table.mark(len(self), checksum)
+            self._key_table_ready = True
+        return self._key_table
+
+    def _head_matches(self, file) -> bool:
+        return bytes.fromhex(fingerprint_head(file, self._fingerprint_length)) == self._fingerprint
+
+    def _load(self) -> None:
+        """读取已有的索引文件，失效时丢弃"""
+        if not os.path.exists(self.index_path) or not os.path.exists(self.path):
+            return
+        with open(self.index_path, "rb") as index_file:
+            header = index_file.read(HEADER_SIZE)
+            body = index_file.read()
+        if len(header) < HEADER_SIZE:
+            return
+        magic, indexed_offset, fingerprint_length, fingerprint, key_tag = _HEADER.unpack_from(header)
+        if magic != INDEX_MAGIC or key_tag != self._key_tag:
+            logger.info(f"Index {self.index_path} is stale, rebuilding")
+            return
+        self._indexed_offset = indexed_offset
+        self._fingerprint_length = fingerprint_length
+        self._fingerprint = fingerprint
+        with open(self.path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < indexed_offset or not self._head_matches(file):
+                logger.info(f"{self.path} was rewritten, rebuilding index")
+                self._reset()
+                return
+        usable = len(body) - len(body) % _RECORD.size
+        for offset, length, digest, flags in _RECORD.iter_unpack(body[:usable]):
+            if offset >= indexed_offset:
+                # 写入记录后、更新文件头前中断留下的记录，会在 refresh 时重新索引
+                self._needs_rewrite = True
+                break
+            self._add(offset, length, digest, flags)
+        else:
+            self._needs_rewrite = False
+
+    def refresh(self) -> int:
+        """
+        索引结果文件中新追加的完整行
+
+        Returns:
+            int: 新索引的行数
+        """
+        if not os.path.exists(self.path):
+            return 0
+        new_records = []
+        with open(self.path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < self._indexed_offset or not self._head_matches(file):
+                logger.info(f"{self.path} was rewritten, rebuilding index")
+                self._reset()
+            keys = self._keys()
+            start = len(self)
+            offset = self._indexed_offset
+            for line_offset, length, offset, line in self._iter_lines(file, offset):
+                if not line.strip():
+                    continue
+                flags = 0
+                digest = _NO_KEY
+                try:
+                    record = loads(line)
+                    if record.get("error"):
+                        flags |= FLAG_ERROR
+                    key = self.key_function(record)
+                    if key is not None:
+                        digest = _digest(key)
+                except (ValueError, AttributeError):
+                    flags |= FLAG_ERROR | FLAG_MALFORMED
+                record_entry = (line_offset, length, digest, flags)
+                if not new_records:
+                    # 写入中断时键表与索引不一致，下次打开时重建
+                    keys.mark(_INVALID_ROWS, bytes(16))
+                self._add(*record_entry)
+                new_records.append(record_entry)
+            self._indexed_offset = offset
+            self._fingerprint_length = min(offset, FINGERPRINT_BYTES)
+            self._fingerprint = bytes.fromhex(fingerprint_head(file, self._fingerprint_length))
+
+        self._write(new_records)
+        if new_records:
+            self._index_keys(start)
+            keys.mark(len(self), self._checksum.digest())
+            logger.info(f"Indexed {len(new_records)} new rows of {self.path}")
+        return len(new_records)
+
+    def _iter_lines(self, file: BinaryIO, offset: int) -> Iterator[Tuple[int, int, int, bytes]]:
+        """产出 (记录偏移, 记录长度, 续读偏移, 行内容)，只包含完整的行"""
+        if self.compression is not None:
+            for start, end, data in iter_frames(file, self.compression, offset):
+                for number, line in enumerate(data.splitlines(keepends=True)):
+                    yield start, number, end, line
+            return
+        file.seek(offset)
+        for line in file:
+            if not line.endswith(b"\n"):
+                # 最后一行尚未写完
+                break
+            yield offset, len(line), offset + len(line), line
+            offset += len(line)
+
+    def _write(self, new_records: List[tuple]) -> None:
+        rewrite = self._needs_rewrite or not os.path.exists(self.index_path)
+        with open(self.index_path, "w+b" if rewrite else "r+b") as index_file:
+            if rewrite:
+                index_file.write(bytes(HEADER_SIZE))
+                new_records = (
+                    (self._offsets[row], self._lengths[row],
+                     bytes(self._digests[row * 16:row * 16 + 16]), self._flags[row])
+                    for row in range(len(self._offsets))
+                )
+            index_file.seek(0, os.SEEK_END)
+            index_file.write(b"".join(_RECORD.pack(*entry) for entry in new_records))
+            index_file.seek(0)
+            index_file.write(
+                _HEADER.pack(
+                    INDEX_MAGIC,
+                    self._indexed_offset,
+                    self._fingerprint_length,
+                    self._fingerprint,
+                    self._key_tag,
+                )
+            )
+        self._needs_rewrite = False
+
+    def _map(self) -> mmap.mmap:
+        if self._mmap is None or len(self._mmap) < self._indexed_offset:
+            self._close_reader()
+            self._file = open(self.path, "rb")
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, key: str) -> bool:
+        return self.row_of(key) is not None
+
+    def row_of(self, key: str) -> Optional[int]:
+        """返回键对应的行号，不存在时返回 None"""
+        return self._keys().get(_digest(key))
+
+    def is_completed(self, key: str) -> bool:
+        """键对应的行是否存在且没有出错"""
+        row = self.row_of(key)
+        return row is not None and self._flags[row] == 0
+
+    @property
+    def completed_count(self) -> int:
+        """没有出错的不同键数量"""
+        return sum(1 for _, row in self._keys().items() if self._flags[row] == 0)
+
+    def _frame(self, offset: int) -> List[bytes]:
+        if offset != self._frame_offset:
+            if self._file is None:
+                self._file = open(self.path, "rb")
+            _, _, data = next(iter_frames(self._file, self.compression, offset))
+            self._frame_lines = data.splitlines()
+            self._frame_offset = offset
+        return self._frame_lines
+
+    def raw(self, row: int) -> bytes:
+        """读取某一行的原始字节（不含换行符）"""
+        offset = self._offsets[row]
+        if self.compression is not None:
+            return self._frame(offset)[self._lengths[row]]
+        return self._map()[offset:offset + self._lengths[row]].rstrip(b"\r\n")
+
+    def get(self, row: int) -> Dict[str, Any]:
+        """按行号读取并解析单行，支持负数下标；compact 结果会从同目录的 inputs.jsonl 补回 input"""
+        return self._inputs.resolve(loads(self.raw(row)))
+
+    def get_by_key(self, key: str) -> Optional[Dict[str, Any]]:
+        """按键读取单行，不存在时返回 None"""
+        row = self.row_of(key)
+        return None if row is None else self.get(row)
+
+    def slice(self, start: int = 0, stop: Optional[int] = None, step: int = 1) -> Iterator[Dict[str, Any]]:
+        """按行号区间读取"""
+        for row in range(*slice(start, stop, step).indices(len(self))):
+            if not self._flags[row] & FLAG_MALFORMED:
+                yield self.get(row)
+
+    def sample(self, k: int, seed: Optional[int] = None, include_errors: bool = False) -> List[Dict[str, Any]]:
+        """
+        随机抽取 k 行
+
+        Args:
+            k (int): 抽取行数
+            seed (Optional[int]): 随机种子
+            include_errors (bool): 是否包含出错的行
+
+        Returns:
+            List[Dict[str, Any]]: 抽取的结果
+        """
+        rows = [
+            row for row in range(len(self))
+            if not self._flags[row] & FLAG_MALFORMED and (include_errors or self._flags[row] == 0)
+        ]
+        chosen = random.Random(seed).sample(rows, min(k, len(rows)))
+        return [self.get(row) for row in sorted(chosen)]
+
+    def error_rows(self) -> List[int]:
+        """出错（不含无法解析）的行号，用于选择性重新评判"""
+        return [row for row in range(len(self)) if self._flags[row] == FLAG_ERROR]
+
+    def _close_reader(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._frame_offset = None
+        self._frame_lines = []
+
+    def close(self) -> None:
+        self._close_reader()
+        self._key_table.close()
+
+    def __enter__(self) -> "ResultIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
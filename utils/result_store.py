@@ -0,0 +1,300 @@
+import gzip
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+from utils.compression import compressed_path, frame_compressor
+from utils.logger_config import get_logger
+from utils.records import hash_input
+from utils.serialization import dumps, dumps_bytes, loads
+
+logger = get_logger(name="result_store", log_file="result_store.log")
+
+RESULT_SCHEMAS = ("full", "compact")
+INPUTS_FILE = "inputs.jsonl"
+RAW_RESPONSES_FILE = "raw_responses.jsonl.gz"
+# 原始响应每写入这么多条刷新一次压缩流，崩溃时最多丢失这部分
+RAW_FLUSH_EVERY = 64
+# 压缩结果每累计这么多条写入一个独立的帧
+FRAME_ROWS = 100
+
+
+def finish_reason_of(naive_response: Any, index: int = 0) -> Optional[str]:
+    """
+    从原始响应中取出 choice 的 finish_reason
+
+    Args:
+        naive_response (Any): chat completion 的原始响应（model_dump 后的字典）
+        index (int): choice 的序号，n 大于 1 时每个采样各有一个 choice
+
+    Returns:
+        Optional[str]: finish_reason，取不到时返回 None
+    """
+    try:
+        for choice in naive_response["choices"]:
+            if choice.get("index", 0) == index:
+                return choice["finish_reason"]
+        return None
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return None
+
+
+class ResultStore:
+    """
+    结果 JSONL 文件的写入器
+
+    - full：按原样写入每条结果（默认，与旧版本一致）
+    - compact：input 替换为 input_hash，输入按哈希只写一次到同目录的 inputs.jsonl；
+      原始响应（naive_response）不写入结果文件，开启 raw_responses 时
+      按 input_hash 写入同目录 gzip 压缩的 raw_responses.jsonl.gz
+
+    compact 结果可以用 load_inputs / attach_inputs 还原 input 字段。
+
+    设置 compression（gzip / zstd）时结果文件加上 .gz / .zst 后缀，行先缓冲在内存中，
+    每 frame_rows 条压缩为一个独立的帧追加写入；缓冲区中最早的行等待超过 flush_interval 秒时
+    由后台定时器写出（写入空闲时也不会一直留在内存中），崩溃时最多丢失一帧；统计模块、ResultIndex 和增量统计都可以直接读取压缩文件。
+    """
+
+    def __init__(
+        self,
+        result_path: str,
+        schema: str = "full",
+        raw_responses: bool = False,
+        compression: Optional[str] = None,
+        frame_rows: int = FRAME_ROWS,
+        flush_interval: float = 5.0,
+    ):
+        """
+        Args:
+            result_path (str): 结果 JSONL 文件路径
+            schema (str): 结果格式，full 或 compact
+            raw_responses (bool): compact 模式下是否把原始响应写入压缩的旁路文件
+            compression (Optional[str]): 结果文件的压缩格式，None、"gzip" 或 "zstd"
+            frame_rows (int): 压缩时每帧的最大行数
+            flush_interval (float): 压缩时缓冲的行最多等待的秒数
+        """
+        if schema not in RESULT_SCHEMAS:
+            raise ValueError(f"Unknown result schema {schema!r}, expected one of {RESULT_SCHEMAS}")
+        self.result_path = compressed_path(result_path, compression)
+        self.schema = schema
+        self.compression = compression
+        self.frame_rows = frame_rows
+        self.flush_interval = flush_interval
+        self.raw_responses = raw_responses and schema == "compact"
+        directory = os.path.dirname(result_path) or "."
+        self.inputs_path = os.path.join(directory, INPUTS_FILE)
+        self.raw_path = os.path.join(directory, RAW_RESPONSES_FILE)
+        self._lock = threading.Lock()
+        self._seen_inputs: Optional[Set[str]] = None
+        self._raw_file = None
+        self._raw_pending = 0
+        self._compress = frame_compressor(compression)
+        self._result_file = None
+        self._buffer: List[bytes] = []
+        self._flush_timer: Optional[threading.Timer] = None
+
+    @property
+    def compact(self) -> bool:
+        return self.schema == "compact"
+
+    def _known_inputs(self) -> Set[str]:
+        # 续跑时沿用已写入的输入，避免重复写入
+        if self._seen_inputs is None:
+            self._seen_inputs = set(load_inputs(self.inputs_path))
+        return self._seen_inputs
+
+    def _to_row(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.compact or "input" not in result:
+            return result
+        input_data = result["input"]
+        input_key = hash_input(input_data)
+        row = {"input_hash": input_key}
+        row.update((key, value) for key, value in result.items() if key != "input")
+        seen = self._known_inputs()
+        if input_key not in seen:
+            seen.add(input_key)
+            with open(self.inputs_path, "a", encoding="utf-8") as file:
+                file.write(
+                    dumps({"input_hash": input_key, "input": input_data}) + "\n"
+                )
+        return row
+
+    def _write_raw(self, input_key: str, naive_response: Any) -> None:
+        if self._raw_file is None:
+            # 追加模式会在已有文件后新增一个 gzip member，gzip 读取时会自动拼接
+            self._raw_file = gzip.open(self.raw_path, "at", encoding="utf-8")
+        self._raw_file.write(
+            dumps({"input_hash": input_key, "naive_response": naive_response}) + "\n"
+        )
+        self._raw_pending += 1
+        if self._raw_pending >= RAW_FLUSH_EVERY:
+            self._raw_file.flush()
+            self._raw_pending = 0
+
+    def _append_line(self, line: bytes) -> None:
+        if self.compression is None:
+            with open(self.result_path, "ab") as file:
+                file.write(line)
+            return
+        self._buffer.append(line)
+        if len(self._buffer) >= self.frame_rows:
+            self._flush_frame()
+        elif self._flush_timer is None:
+            # 缓冲区从空变为非空时开始计时，到期后即使没有新的写入也会写出
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_frame(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._buffer:
+            return
+        if self._result_file is None:
+            self._result_file = open(self.result_path, "ab")
+        self._result_file.write(self._compress(b"".join(self._buffer)))
+        self._result_file.flush()
+        self._buffer.clear()
+
+    def write(self, result: Dict[str, Any], naive_response: Any = None) -> Dict[str, Any]:
+        """
+        追加一条结果
+
+        Args:
+            result (Dict[str, Any]): 单条结果
+            naive_response (Any): 原始响应，仅在 compact 模式开启 raw_responses 时写入旁路文件
+
+        Returns:
+            Dict[str, Any]: 实际写入结果文件的行
+        """
+        with self._lock:
+            row = self._to_row(result)
+            self._append_line(dumps_bytes(row) + b"\n")
+            if self.raw_responses and naive_response is not None and "input_hash" in row:
+                self._write_raw(row["input_hash"], naive_response)
+        return row
+
+    def flush(self) -> None:
+        """把缓冲的压缩结果写为一帧"""
+        with self._lock:
+            self._flush_frame()
+
+    def close(self) -> None:
+        """写入缓冲的压缩结果，关闭结果文件和原始响应旁路文件，可以重复调用"""
+        with self._lock:
+            self._flush_frame()
+            if self._result_file is not None:
+                self._result_file.close()
+                self._result_file = None
+            if self._raw_file is not None:
+                self._raw_file.close()
+                self._raw_file = None
+                self._raw_pending = 0
+
+
+def load_inputs(path: str) -> Dict[str, Any]:
+    """
+    读取 compact 结果的输入文件
+
+    Args:
+        path (str): inputs.jsonl 路径，或其所在目录
+
+    Returns:
+        Dict[str, Any]: input_hash -> input
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, INPUTS_FILE)
+    inputs = {}
+    if not os.path.exists(path):
+        return inputs
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = loads(line)
+            except ValueError:
+                # 崩溃时留下的不完整最后一行
+                continue
+            inputs[record["input_hash"]] = record["input"]
+    return inputs
+
+
+def attach_inputs(results: List[Dict[str, Any]], inputs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    为 compact 结果补回 input 字段（原地修改），full 结果保持不变
+
+    Args:
+        results (List[Dict[str, Any]]): 结果列表
+        inputs (Dict[str, Any]): load_inputs 的返回值
+
+    Returns:
+        List[Dict[str, Any]]: 传入的结果列表
+    """
+    for result in results:
+        if "input" not in result and result.get("input_hash") in inputs:
+            result["input"] = inputs[result["input_hash"]]
+    return results
+
+
+def references_input(field_paths: Iterable[Optional[str]]) -> bool:
+    """字段路径中是否有 input 下的字段（读取 compact 结果时需要从 inputs.jsonl 还原）"""
+    return any(path == "input" or path.startswith("input.") for path in field_paths if path)
+
+
+class InputResolver:
+    """
+    按 input_hash 为 compact 结果补回 input 字段，供统计和索引等只读取结果文件的模块使用
+
+    inputs.jsonl 在第一次遇到 compact 结果时才读取；遇到未知的哈希且文件变大
+    （运行中追加了新输入）时重新读取。
+    """
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory (str): 结果文件所在目录
+        """
+        self.path = os.path.join(directory, INPUTS_FILE)
+        self._inputs: Optional[Dict[str, Any]] = None
+        self._loaded_size = -1
+
+    def _reload(self) -> None:
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size != self._loaded_size:
+            self._inputs = load_inputs(self.path)
+            self._loaded_size = size
+
+    def resolve(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """为单条 compact 结果补回 input（原地修改），full 结果和未知哈希保持不变"""
+        input_key = result.get("input_hash")
+        if input_key is None or "input" in result:
+            return result
+        if self._inputs is None or input_key not in self._inputs:
+            self._reload()
+        if input_key in self._inputs:
+            result["input"] = self._inputs[input_key]
+        return result
+
+
+def iter_raw_responses(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    逐条读取原始响应旁路文件，忽略崩溃时未写完的结尾
+
+    Args:
+        path (str): raw_responses.jsonl.gz 路径，或其所在目录
+
+    Yields:
+        Dict[str, Any]: {"input_hash", "naive_response"}
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, RAW_RESPONSES_FILE)
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                try:
+                    yield loads(line)
+                except ValueError:
+                    continue
+        except (EOFError, OSError) as e:
+            logger.warning(f"{path} ends with an incomplete gzip member: {e}")
@@ -0,0 +1,242 @@
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext
+from typing import Deque, Dict, Optional
+from utils.logger_config import get_logger
+
+logger = get_logger(name="scheduler", log_file="scheduler.log")
+
+
+class _Waiter:
+    """等待调度的请求，granted 在持有调度器锁时被置位"""
+
+    __slots__ = ("loop", "future", "granted")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, future: asyncio.Future):
+        self.loop = loop
+        self.future = future
+        self.granted = False
+
+
+class _JobState:
+    """单个作业的调度状态"""
+
+    def __init__(
+        self,
+        name: str,
+        weight: float,
+        priority: int,
+        max_concurrency: Optional[int],
+        order: int,
+    ):
+        self.name = name
+        self.weight = weight
+        self.priority = priority
+        self.max_concurrency = max_concurrency
+        self.order = order
+        self.in_flight = 0
+        self.completed = 0
+        self.virtual_time = 0.0
+        self.waiters: Deque[_Waiter] = deque()
+
+    def eligible(self) -> bool:
+        if not self.waiters:
+            return False
+        return self.max_concurrency is None or self.in_flight < self.max_concurrency
+
+
+class FairScheduler:
+    """
+    多个 pipeline 共享的请求调度器
+
+    - 全局并发上限：所有作业同时在途的请求数不超过 max_concurrency
+    - 作业优先级：priority 越大越先被调度（严格优先）
+    - 加权公平队列：同一优先级内按 weight 比例分配并发槽位（virtual time 调度）
+    - 单作业并发上限：每个作业可以单独设置 max_concurrency
+
+    调度器内部使用线程锁，并通过 call_soon_threadsafe 唤醒等待者，
+    因此可以在多个线程各自的事件循环之间共享（每个 pipeline.run 都会调用 asyncio.run）。
+
+    示例：
+        scheduler = FairScheduler(max_concurrency=32)
+        scheduler.register_job("distill", weight=1.0)
+        scheduler.register_job("urgent-eval", priority=10, max_concurrency=8)
+        pipeline.run(data_pool, scheduler=scheduler, job_name="urgent-eval")
+    """
+
+    def __init__(self, max_concurrency: int = 10):
+        """
+        Args:
+            max_concurrency (int): 全局最大在途请求数
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, _JobState] = {}
+        self._in_flight = 0
+        self._virtual_time = 0.0
+
+    def register_job(
+        self,
+        job_name: str,
+        weight: float = 1.0,
+        priority: int = 0,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        """
+        注册（或更新）一个作业的调度参数
+
+        Args:
+            job_name (str): 作业名称
+            weight (float): 公平队列权重，同优先级下并发份额与权重成正比
+            priority (int): 优先级，越大越优先
+            max_concurrency (Optional[int]): 该作业的并发上限，None 表示不限制
+        """
+        if weight <= 0:
+            raise ValueError("weight must be positive")
+        with self._lock:
+            job = self._jobs.get(job_name)
+            if job is None:
+                self._jobs[job_name] = _JobState(
+                    job_name, weight, priority, max_concurrency, len(self._jobs)
+                )
+            else:
+                job.weight = weight
+                job.priority = priority
+                job.max_concurrency = max_concurrency
+                self._dispatch_locked()
+        logger.info(
+            f"Registered job {job_name}: weight={weight}, priority={priority}, "
+            f"max_concurrency={max_concurrency}"
+        )
+
+    def _get_job_locked(self, job_name: str) -> _JobState:
+        job = self._jobs.get(job_name)
+        if job is None:
+            # 未注册的作业使用默认参数
+            job = _JobState(job_name, 1.0, 0, None, len(self._jobs))
+            self._jobs[job_name] = job
+        return job
+
+    def _pick_job_locked(self) -> Optional[_JobState]:
+        best = None
+        for job in self._jobs.values():
+            if not job.eligible():
+                continue
+            if best is None or (-job.priority, job.virtual_time, job.order) < (
+                -best.priority,
+                best.virtual_time,
+                best.order,
+            ):
+                best = job
+        return best
+
+    def _dispatch_locked(self) -> None:
+        while self._in_flight < self.max_concurrency:
+            job = self._pick_job_locked()
+            if job is None:
+                return
+            waiter = job.waiters.popleft()
+            waiter.granted = True
+            job.in_flight += 1
+            self._in_flight += 1
+            self._virtual_time = job.virtual_time
+            job.virtual_time += 1.0 / job.weight
+            waiter.loop.call_soon_threadsafe(self._wake, waiter.future)
+
+    @staticmethod
+    def _wake(future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_result(None)
+
+    def _release_locked(self, job: _JobState) -> None:
+        job.in_flight -= 1
+        job.completed += 1
+        self._in_flight -= 1
+        self._dispatch_locked()
+
+    async def acquire(self, job_name: str) -> None:
+        """
+        为作业申请一个并发槽位，必要时排队等待
+
+        Args:
+            job_name (str): 作业名称
+        """
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop, loop.create_future())
+        with self._lock:
+            job = self._get_job_locked(job_name)
+            if not job.waiters and job.in_flight == 0:
+                # 空闲后重新活跃的作业不能积累历史额度
+                job.virtual_time = max(job.virtual_time, self._virtual_time)
+            job.waiters.append(waiter)
+            self._dispatch_locked()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._release_locked(job)
+                else:
+                    job.waiters.remove(waiter)
+            raise
+
+    def release(self, job_name: str) -> None:
+        """
+        归还作业的一个并发槽位
+
+        Args:
+            job_name (str): 作业名称
+        """
+        with self._lock:
+            self._release_locked(self._jobs[job_name])
+
+    @asynccontextmanager
+    async def slot(self, job_name: str):
+        """
+        以上下文管理器的形式占用一个并发槽位
+
+        示例：
+            async with scheduler.slot("urgent-eval"):
+                await client.safe_chat_completion(...)
+        """
+        await self.acquire(job_name)
+        try:
+            yield
+        finally:
+            self.release(job_name)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        返回每个作业当前的调度状态
+
+        Returns:
+            Dict[str, Dict[str, float]]: 作业名称到 in_flight / queued / completed 等指标的映射
+        """
+        with self._lock:
+            return {
+                name: {
+                    "priority": job.priority,
+                    "weight": job.weight,
+                    "in_flight": job.in_flight,
+                    "queued": len(job.waiters),
+                    "completed": job.completed,
+                }
+                for name, job in self._jobs.items()
+            }
+
+
+def job_slot(scheduler: Optional[FairScheduler], job_name: str):
+    """
+    返回作业的并发槽位上下文；未提供调度器时返回空上下文
+
+    Args:
+        scheduler (Optional[FairScheduler]): 共享调度器
+        job_name (str): 作业名称
+    """
+    if scheduler is None:
+        return nullcontext()
+    return scheduler.slot(job_name)
@@ -0,0 +1,240 @@
+"""
+可替换的 JSON 序列化后端
+
+结果文件、轨迹和索引的每一行都要编码/解码一次，行数很多或原始响应很大时 json 模块会成为瓶颈。
+按 orjson > msgspec > json 的顺序自动选择已安装的最快后端，也可以通过环境变量 JSON_BACKEND
+或 set_json_backend 指定。所有后端输出的都是 UTF-8 的紧凑 JSON（与 ensure_ascii=False 一致）：
+
+- 快速后端无法编码的对象（例如超出 64 位的整数）退回到 json 模块编码
+- 快速后端无法解析的内容（json 模块写出的 NaN / Infinity）退回到 json 模块解析
+- 快速后端会把超出 64 位的整数解析为 float（损失精度），含有 19 位以上连续数字的内容
+  直接用 json 模块解析；字符串中的长数字也会命中，只是多一次较慢的解析
+- NaN / Infinity 由 orjson / msgspec 编码为 null
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Union
+
+JSON_BACKENDS = ("orjson", "msgspec", "json")
+# 各 pipeline 写入结果文件的顶层字段及类型，typed_decoder 按此解码
+RESULT_FIELDS: Dict[str, Dict[str, Any]] = {
+    "generation": {
+        "input": Any,
+        "input_hash": Optional[str],
+        "query_hash": Optional[str],
+        "response": Optional[str],
+        "extracted": Any,
+        "naive_response": Optional[dict],
+        "usage": Optional[dict],
+        "finish_reason": Optional[str],
+        "latency_ms": Optional[float],
+        "sample": Optional[dict],
+        "samples": Optional[List[dict]],
+        "near_duplicate": Optional[dict],
+        "skipped": Optional[str],
+        "error": Optional[str],
+        "timestamp": Optional[str],
+    },
+    "judgement": {
+        "input": Any,
+        "input_hash": Optional[str],
+        "query_hash": Optional[str],
+        "model_based_judgement": Optional[dict],
+        "rule_based_judgement": Optional[dict],
+        "pack": Optional[dict],
+        "usage": Optional[dict],
+        "skipped": Optional[str],
+        "error": Optional[str],
+        "timestamp": Optional[str],
+    },
+}
+RESULT_KINDS = tuple(RESULT_FIELDS)
+# 超出 int64 / uint64 范围的整数至少有 19 位数字
+_LONG_DIGITS = re.compile(rb"[0-9]{19}")
+_LONG_DIGITS_STR = re.compile(r"[0-9]{19}")
+
+
+def _json_encode(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _may_have_wide_int(data: Union[bytes, str]) -> bool:
+    pattern = _LONG_DIGITS_STR if isinstance(data, str) else _LONG_DIGITS
+    return pattern.search(data) is not None
+
+
+class Serializer:
+    """单个后端的编码/解码函数"""
+
+    def __init__(self, name: str, encode: Callable[[Any], bytes], decode: Callable[[Union[bytes, str]], Any]):
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+    def __repr__(self) -> str:
+        return f"Serializer({self.name!r})"
+
+
+def _orjson_serializer() -> Serializer:
+    import orjson
+
+    option = orjson.OPT_NON_STR_KEYS
+
+    def encode(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            return _json_encode(obj)
+
+    def decode(data: Union[bytes, str]) -> Any:
+        if _may_have_wide_int(data):
+            return json.loads(data)
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            # NaN / Infinity 等 json 模块能读取的扩展语法，真正不合法的内容仍会抛出 ValueError
+            return json.loads(data)
+
+    return Serializer("orjson", encode, decode)
+
+
+def _msgspec_serializer() -> Serializer:
+    import msgspec
+
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+
+    def encode(obj: Any) -> bytes:
+        try:
+            return encoder.encode(obj)
+        except (TypeError, OverflowError):
+            return _json_encode(obj)
+
+    def decode(data: Union[bytes, str]) -> Any:
+        if _may_have_wide_int(data):
+            return json.loads(data)
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError:
+            return json.loads(data)
+
+    return Serializer("msgspec", encode, decode)
+
+
+def _stdlib_serializer() -> Serializer:
+    return Serializer("json", _json_encode, json.loads)
+
+
+_FACTORIES = {
+    "orjson": _orjson_serializer,
+    "msgspec": _msgspec_serializer,
+    "json": _stdlib_serializer,
+}
+_current: Optional[Serializer] = None
+
+
+def create_serializer(backend: Optional[str] = None) -> Serializer:
+    """
+    创建指定后端的序列化器
+
+    Args:
+        backend (Optional[str]): orjson / msgspec / json，None 表示选择已安装的最快后端
+
+    Returns:
+        Serializer: 序列化器
+    """
+    if backend is not None:
+        if backend not in _FACTORIES:
+            raise ValueError(f"Unknown JSON backend {backend!r}, expected one of {JSON_BACKENDS}")
+        return _FACTORIES[backend]()
+    for name in JSON_BACKENDS:
+        try:
+            return _FACTORIES[name]()
+        except ImportError:
+            continue
+    return _stdlib_serializer()
+
+
+def get_serializer() -> Serializer:
+    """当前使用的序列化器，第一次调用时按 JSON_BACKEND 环境变量或自动选择创建"""
+    global _current
+    if _current is None:
+        _current = create_serializer(os.environ.get("JSON_BACKEND") or None)
+    return _current
+
+
+def set_json_backend(backend: Optional[str]) -> Serializer:
+    """
+    切换全局使用的后端
+
+    Args:
+        backend (Optional[str]): orjson / msgspec / json，None 表示自动选择
+
+    Returns:
+        Serializer: 新的序列化器
+    """
+    global _current
+    _current = create_serializer(backend)
+    return _current
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """编码为 UTF-8 字节（不含换行符）"""
+    return get_serializer().encode(obj)
+
+
+def dumps(obj: Any) -> str:
+    """编码为字符串，与 json.dumps(obj, ensure_ascii=False, separators=(",", ":")) 等价"""
+    return get_serializer().encode(obj).decode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """解码单个 JSON 文档，不合法时抛出 ValueError"""
+    return get_serializer().decode(data)
+
+
+@lru_cache(maxsize=None)
+def result_type(kind: str):
+    """
+    已知结果格式的 msgspec Struct 类型，需要安装 msgspec
+
+    声明 RESULT_FIELDS 中各 pipeline 写入的全部顶层字段，解码后按原样编码回来与原始行一致
+    （未出现的字段为 msgspec.UNSET，编码时省略；显式的 null 保持为 None）。
+    RESULT_FIELDS 之外的字段（例如调用方手动添加的字段）解码时会被丢弃。
+
+    Args:
+        kind (str): generation 或 judgement
+
+    Returns:
+        type: msgspec.Struct 子类
+    """
+    if kind not in RESULT_KINDS:
+        raise ValueError(f"Unknown result kind {kind!r}, expected one of {RESULT_KINDS}")
+    try:
+        import msgspec
+    except ImportError as e:
+        raise ImportError("Typed result decoding requires msgspec, install it with `pip install msgspec`") from e
+
+    fields = [
+        (name, Union[field_type, msgspec.UnsetType], msgspec.UNSET)
+        for name, field_type in RESULT_FIELDS[kind].items()
+    ]
+    return msgspec.defstruct(f"{kind.title()}Result", fields, kw_only=True, module=__name__)
+
+
+def typed_decoder(kind: str) -> Callable[[Union[bytes, str]], Any]:
+    """
+    按已知结果格式解码单行的函数，返回 result_type(kind) 的实例
+
+    Args:
+        kind (str): generation 或 judgement
+
+    Returns:
+        Callable: 输入一行 JSON，返回 Struct 实例
+    """
+    import msgspec
+
+    return msgspec.json.Decoder(result_type(kind)).decode
@@ -0,0 +1,108 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Tuple, Union
+
+ItemSource = Union[Iterable[Any], AsyncIterator[Any]]
+Limit = Union[int, Callable[[], int]]
+
+
+async def aiter_items(items: ItemSource) -> AsyncIterator[Any]:
+    """
+    将同步可迭代对象或异步迭代器统一为异步迭代器
+
+    Args:
+        items: list / generator / async generator 等
+    """
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def aenumerate(items: ItemSource, start: int = 0) -> AsyncIterator[Tuple[int, Any]]:
+    """异步版本的 enumerate，支持同步和异步数据源"""
+    index = start
+    async for item in aiter_items(items):
+        yield index, item
+        index += 1
+
+
+async def _next_item(source: AsyncIterator[Any]) -> Tuple[bool, Any]:
+    """读取异步迭代器的下一条，返回 (是否读到, 数据)"""
+    try:
+        return True, await source.__anext__()
+    except StopAsyncIteration:
+        return False, None
+
+
+async def bounded_as_completed(
+    items: ItemSource,
+    worker: Callable[[Any], Awaitable[Any]],
+    limit: Limit,
+) -> AsyncIterator[Any]:
+    """
+    以有界并发处理数据源，并按完成顺序产出结果
+
+    任务按数据源顺序依次创建，同时在途的任务数不超过 limit。
+    读取数据源与在途任务一起等待，任务完成后立即产出，不会被数据源的下一条数据阻塞；
+    在途任务已满时不再读取数据源（背压），因此数据源可以是无限的异步生成器。
+    调用方提前退出时会取消所有在途任务。
+
+    Args:
+        items: 数据源（同步可迭代对象或异步迭代器）
+        worker: 处理单个数据的协程函数
+        limit: 最大在途任务数，也可以是返回当前上限的函数（每次调度前读取，用于运行中调整并发）
+
+    Yields:
+        worker 的返回值，按完成顺序
+    """
+    current_limit = limit if callable(limit) else (lambda: limit)
+    if current_limit() < 1:
+        raise ValueError("limit must be at least 1")
+    source = aiter_items(items)
+    pending = set()
+    # 正在读取数据源下一条的任务，同一时刻至多一个
+    reading = None
+    exhausted = False
+    try:
+        while True:
+            if reading is None and not exhausted and len(pending) < max(1, current_limit()):
+                reading = asyncio.ensure_future(_next_item(source))
+            if reading is None and not pending:
+                return
+            waiting = pending | {reading} if reading is not None else pending
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if reading in done:
+                found, item = reading.result()
+                reading = None
+                if found:
+                    pending.add(asyncio.ensure_future(worker(item)))
+                else:
+                    exhausted = True
+            for task in done & pending:
+                pending.discard(task)
+                yield task.result()
+    finally:
+        tasks = pending | {reading} if reading is not None else pending
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await source.aclose()
+
+
+def ensure_no_running_loop(method_name: str) -> None:
+    """
+    同步入口在已有事件循环中被调用时给出明确的报错
+
+    Args:
+        method_name (str): 推荐改用的异步方法名
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError(
+        f"run() cannot be called from a running event loop, use `await {method_name}(...)` instead"
+    )
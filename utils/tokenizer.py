@@ -0,0 +1,58 @@
+import threading
+from typing import Any, Dict
+
+DEFAULT_ENCODING = "cl100k_base"
+
+_encodings: Dict[str, Any] = {}
+# 加载失败的编码只尝试一次（例如离线时下载编码失败），之后直接抛出同一个异常
+_failures: Dict[str, BaseException] = {}
+_lock = threading.Lock()
+
+
+def get_tokenizer(encoding: str = DEFAULT_ENCODING):
+    """
+    获取 tiktoken 编码器，tiktoken 在第一次调用时才导入，编码只加载一次；
+    加载失败时记住异常，之后的调用直接抛出，不会每次都重新下载
+
+    Args:
+        encoding (str): 编码名称
+
+    Returns:
+        tiktoken.Encoding: 编码器
+    """
+    tokenizer = _encodings.get(encoding)
+    if tokenizer is not None:
+        return tokenizer
+    with _lock:
+        if encoding in _encodings:
+            return _encodings[encoding]
+        if encoding not in _failures:
+            try:
+                import tiktoken
+
+                _encodings[encoding] = tiktoken.get_encoding(encoding)
+                return _encodings[encoding]
+            except Exception as e:
+                _failures[encoding] = e
+        raise RuntimeError(f"Failed to load the {encoding} tokenizer") from _failures[encoding]
+
+
+def reset_tokenizer_cache() -> None:
+    """清除已加载的编码和记住的加载失败，下次调用 get_tokenizer 时重新加载"""
+    with _lock:
+        _encodings.clear()
+        _failures.clear()
+
+
+def count_tokens(text: str, encoding: str = DEFAULT_ENCODING) -> int:
+    """
+    计算文本的 token 数量
+
+    Args:
+        text (str): 输入文本
+        encoding (str): 编码名称
+
+    Returns:
+        int: token 数量
+    """
+    return len(get_tokenizer(encoding).encode(text))
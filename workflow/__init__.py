@@ -0,0 +1,9 @@
+from typing import TYPE_CHECKING
+from utils.lazy_import import lazy_exports
+
+if TYPE_CHECKING:
+    from .pipeline import GenerateJudgePipeline
+
+__all__ = ['GenerateJudgePipeline']
+
+__getattr__, __dir__ = lazy_exports(__name__, {'GenerateJudgePipeline': '.pipeline'})
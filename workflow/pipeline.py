@@ -0,0 +1,220 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from data_generation import DataGenerationPipeline
+from judgement import JudgementPipeline
+from utils.llm_client import OpenAIClient
+from utils.logger_config import get_logger
+from utils.records import hash_input
+from utils.result_index import ResultIndex
+from utils.result_store import ResultStore
+from utils.scheduler import FairScheduler, job_slot
+from utils.streaming import aenumerate, bounded_as_completed, ensure_no_running_loop
+from utils.tokenizer import get_tokenizer
+
+
+class GenerateJudgePipeline:
+    """
+    生成-评判组合 Pipeline
+
+    每条数据生成并提取完成后立即进入评判阶段，两个阶段的并发分别可调，
+    共享同一个连接池，结果统一写入一个可断点续跑的 jsonl 文件。
+    """
+
+    def __init__(
+        self,
+        generation: DataGenerationPipeline,
+        judgement: JudgementPipeline,
+        to_judge_input: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+        output_path: Optional[str] = None,
+        key_function: Callable[[Dict[str, Any]], str] = hash_input,
+        compression: Optional[str] = None,
+    ):
+        """
+        初始化组合 Pipeline
+
+        Args:
+            generation (DataGenerationPipeline): 生成阶段 pipeline
+            judgement (JudgementPipeline): 评判阶段 pipeline
+            to_judge_input (Callable): 把单条生成结果转换为评判输入（需包含 answer），
+                返回 None 表示跳过评判
+            output_path (str): 组合结果文件路径，默认为生成实验目录下的 fused_result.jsonl
+            key_function (Callable): 计算输入数据唯一键的函数，用于断点续跑，默认为输入哈希
+            compression (str): 输出文件的压缩格式，None、"gzip" 或 "zstd"，
+                压缩时输出路径加上 .gz / .zst 后缀，续跑时直接读取压缩文件
+        """
+        self.logger = get_logger(name="workflow", log_file="workflow.log")
+        self.generation = generation
+        self.judgement = judgement
+        self.to_judge_input = to_judge_input
+        self.key_function = key_function
+        self.result_store = ResultStore(
+            output_path or os.path.join(generation.experiment_dir, "fused_result.jsonl"),
+            compression=compression,
+        )
+        self.output_path = self.result_store.result_path
+        os.makedirs(os.path.dirname(self.output_path) or ".", exist_ok=True)
+
+        # 两个阶段的结果统一由组合 pipeline 落盘
+        self.generation.save_enabled = False
+        self.judgement.save_enabled = False
+
+    def save_record(self, record: Dict[str, Any]) -> None:
+        """
+        持续保存单条组合结果到jsonl文件
+
+        Args:
+            record (Dict[str, Any]): 单条组合结果
+        """
+        self.result_store.write(record)
+
+    def load_index(self) -> ResultIndex:
+        """
+        读取（并增量更新）输出文件的旁路索引，用于断点续跑、按键查看和选择性重跑。
+        生成或评判出错的记录不算完成，崩溃时留下的不完整最后一行会被忽略
+
+        Returns:
+            ResultIndex: 输出文件的索引
+        """
+        return ResultIndex(self.output_path)
+
+    def _create_clients(self):
+        """创建两个阶段的客户端，接口地址和密钥相同时共享同一个连接池"""
+        generation_client = OpenAIClient(self.generation.config_for_client)
+        generation_model = self.generation.config_for_client.get("model", {})
+        judgement_model = self.judgement.config_for_client.get("model", {})
+        same_endpoint = generation_model.get("base_url") == judgement_model.get(
+            "base_url"
+        ) and generation_model.get("api_key") == judgement_model.get("api_key")
+        judgement_client = OpenAIClient(
+            self.judgement.config_for_client,
+            async_client=generation_client.client if same_endpoint else None,
+        )
+        return generation_client, judgement_client
+
+    async def astream(
+        self,
+        data_pool,
+        generation_concurrency: int = 5,
+        judgement_concurrency: int = 5,
+        extract_function: Callable = None,
+        model_judgement_function: Callable = None,
+        rule_functions: Dict[str, Callable] = None,
+        resume: bool = True,
+        scheduler: Optional[FairScheduler] = None,
+        job_name: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        异步生成器接口：每条数据生成完成后立即评判，按完成顺序产出组合结果
+
+        Args:
+            data_pool: 数据池，list / 可迭代对象 / 异步迭代器
+            generation_concurrency (int): 生成阶段并发数
+            judgement_concurrency (int): 评判阶段并发数
+            extract_function (Callable): 生成阶段的提取函数
+            model_judgement_function (Callable): 评判阶段的模型评判函数
+            rule_functions (Dict[str, Callable]): 评判阶段的规则函数字典
+            resume (bool): 是否跳过输出文件中已完成的数据
+            scheduler (FairScheduler): 多个 pipeline 共享的调度器，默认不使用
+            job_name (str): 在调度器中的作业名称，默认为输出文件路径
+
+        Yields:
+            Dict[str, Any]: 单条组合结果，包含 key / input / generation / judgement
+        """
+        index = self.load_index() if resume else None
+        if index is not None and index.completed_count:
+            self.logger.info(f"Resuming, skipping {index.completed_count} completed rows")
+        job_name = job_name or self.output_path
+        # 评判阶段的规则评判需要分词器，与 JudgementPipeline.astream 一样在线程池中预先加载
+        await asyncio.get_running_loop().run_in_executor(None, get_tokenizer)
+        generation_client, judgement_client = self._create_clients()
+
+        generated = self.generation.astream(
+            _aiter_pending(data_pool, index, self.key_function),
+            concurrency_limit=generation_concurrency,
+            extract_function=extract_function,
+            scheduler=scheduler,
+            job_name=job_name,
+            client=generation_client,
+        )
+
+        async def judge_worker(item):
+            i, generation_result = item
+            if "skipped" in generation_result:
+                # 近重复被丢弃或达到上限的生成结果不评判也不写入，续跑时会重新生成
+                return None
+            input_data = generation_result.get("input")
+            record = {
+                "key": self.key_function(input_data),
+                "input": input_data,
+                "generation": _without_input(generation_result),
+                "judgement": None,
+            }
+            if "error" in generation_result:
+                record["error"] = "generation failed"
+            else:
+                judge_input = self.to_judge_input(generation_result)
+                if judge_input is not None:
+                    async with job_slot(scheduler, job_name):
+                        judgement_result = await self.judgement.run_single_task(
+                            i,
+                            judge_input,
+                            model_judgement_function,
+                            rule_functions,
+                            judgement_client,
+                        )
+                    record["judgement"] = _without_input(judgement_result)
+                    if "error" in judgement_result:
+                        record["error"] = "judgement failed"
+            record["timestamp"] = datetime.now().isoformat()
+            self.save_record(record)
+            return record
+
+        judged = bounded_as_completed(aenumerate(generated), judge_worker, judgement_concurrency)
+        try:
+            # 评判阶段直接调用 run_single_task，不经过 judgement.astream，需要在这里启停它的剖析器
+            self.judgement.profiler.start()
+            if self.judgement.profiler.enabled:
+                judgement_client.profiler = self.judgement.profiler
+            async for record in judged:
+                if record is not None:
+                    yield record
+        finally:
+            # 先关闭评判流（取消在途评判和对生成流的读取），生成流空闲后才能关闭
+            await judged.aclose()
+            # 先结束生成阶段（停止它的剖析器），两个剖析器按启动的相反顺序恢复事件循环状态
+            await generated.aclose()
+            self.judgement.profiler.stop()
+            self.result_store.close()
+
+    async def arun(self, data_pool, **kwargs) -> List[Dict[str, Any]]:
+        """异步运行组合 pipeline 并收集全部结果，参数与 astream 相同"""
+        return [record async for record in self.astream(data_pool, **kwargs)]
+
+    def run(self, data_pool, **kwargs) -> List[Dict[str, Any]]:
+        """
+        运行组合 pipeline（arun 的同步封装，不能在已有事件循环中调用），参数与 astream 相同
+        """
+        ensure_no_running_loop("pipeline.arun")
+        self.logger.info("Starting generate-then-judge pipeline")
+        self.logger.info(f"Output path: {self.output_path}")
+        records = asyncio.run(self.arun(data_pool, **kwargs))
+        errors = sum(1 for record in records if record.get("error"))
+        self.logger.info(
+            f"Generate-then-judge pipeline completed: {len(records)} rows, {errors} errors"
+        )
+        return records
+
+
+async def _aiter_pending(data_pool, index: Optional[ResultIndex], key_function: Callable):
+    """跳过已完成的数据"""
+    async for _, input_data in aenumerate(data_pool):
+        if index is not None and index.is_completed(key_function(input_data)):
+            continue
+        yield input_data
+
+
+def _without_input(result: Dict[str, Any]) -> Dict[str, Any]:
+    """去掉各阶段结果中重复的 input 字段"""
+    return {key: value for key, value in result.items() if key != "input"}